@@ -1,6 +1,8 @@
 import os
+import argparse
 from bs4 import BeautifulSoup, Comment
 import copy # Import the copy module
+from page_runner import run_pages, print_summary
 
 # --- Configuration ---
 NEW_LINK_HTML = """
@@ -25,20 +27,107 @@ ANCHOR_HREF = 'about.html'
 NEW_LINK_HREF = 'contact.html'
 # --- End Configuration ---
 
-def update_html_files():
+def find_contact_anchor(soup):
+    """
+    Locates the navbar link the contact link should be inserted after.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+
+    Returns:
+        tuple: (anchor_tag, None) when the link can be inserted, otherwise
+               (None, reason) describing why the page should be skipped.
+    """
+    # Find the specific navigation bar
+    nav_bar = soup.find('nav', class_=NAVBAR_CLASS)
+    if not nav_bar:
+        return None, "No navbar found"
+
+    # Find the "About Us" link *within the navbar*
+    anchor_link = nav_bar.find('a', href=ANCHOR_HREF)
+    if not anchor_link:
+        return None, f"No '{ANCHOR_HREF}' link found *in* navbar"
+
+    # Check if the "Support & Contact" link *already exists in the navbar*
+    if nav_bar.find('a', href=NEW_LINK_HREF):
+        return None, f"Link '{NEW_LINK_HREF}' already exists *in* navbar"
+
+    return anchor_link, None
+
+def insert_contact_link(anchor_link, new_link_tag):
+    """Inserts a copy of the contact link tag after the anchor link."""
+    # Create a deep copy of the tag to insert it
+    # This is crucial so we can use the tag in multiple files
+    tag_to_insert = copy.copy(new_link_tag)
+
+    # Insert the new link tag after the anchor link
+    anchor_link.insert_after(tag_to_insert)
+
+    # Insert a newline *after* the anchor link (which is *before* the new tag)
+    # This keeps the HTML formatting clean
+    anchor_link.insert_after('\n')
+
+def add_contact_link(soup, filename=None, log=print):
+    """
+    Pipeline transform: adds the contact link to the navbar of a parsed page.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    anchor_link, reason = find_contact_anchor(soup)
+    if anchor_link is None:
+        log(f"INFO: Skipped {filename} ({reason})")
+        return False
+
+    new_link_tag = BeautifulSoup(NEW_LINK_HTML, 'html.parser').a
+    insert_contact_link(anchor_link, new_link_tag)
+    log(f"SUCCESS: Added contact link to {filename}")
+    return True
+
+def add_contact_to_file(file_path, log=print):
+    """
+    Adds the contact link to the navbar of a single HTML file.
+
+    Args:
+        file_path (str): Path to the HTML file.
+        log (callable): Receives progress messages.
+
+    Returns:
+        str: 'updated' or 'skipped'.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    soup = BeautifulSoup(content, 'html.parser')
+
+    anchor_link, reason = find_contact_anchor(soup)
+
+    if anchor_link is None:
+        log(f"INFO: Skipped {file_path} ({reason})")
+        return 'skipped'
+
+    # --- If we get here, we need to add the link ---
+    insert_contact_link(anchor_link, BeautifulSoup(NEW_LINK_HTML, 'html.parser').a)
+
+    # Write the modified content back to the file
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(str(soup))
+
+    log(f"SUCCESS: Updated {file_path}")
+    return 'updated'
+
+def update_html_files(workers=None):
     """
     Walks through the target directory and updates HTML files
     to include the new contact link in the navbar.
-    """
-    total_files = 0
-    updated_files = 0
-    skipped_files = 0
 
-    # Parse the new link HTML *once* and extract the <a> tag
+    Args:
+        workers (int): Number of worker processes (default: one per CPU).
+    """
+    # Parse the new link HTML *once* to make sure the snippet is usable
     try:
         new_link_soup = BeautifulSoup(NEW_LINK_HTML, 'html.parser')
-        new_link_tag = new_link_soup.a
-        if not new_link_tag:
+        if not new_link_soup.a:
             print("CRITICAL ERROR: Could not parse NEW_LINK_HTML. The snippet might be invalid.")
             return
     except Exception as e:
@@ -50,72 +139,23 @@ def update_html_files():
     print("---")
 
     # Walk through the target directory
+    html_files = []
     for root, dirs, files in os.walk(TARGET_DIRECTORY):
         for file in files:
             if file.endswith('.html'):
-                total_files += 1
-                file_path = os.path.join(root, file)
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    soup = BeautifulSoup(content, 'html.parser')
-                    
-                    # Find the specific navigation bar
-                    nav_bar = soup.find('nav', class_=NAVBAR_CLASS)
-                    
-                    if not nav_bar:
-                        print(f"INFO: Skipped {file_path} (No navbar found)")
-                        skipped_files += 1
-                        continue
-                        
-                    # Find the "About Us" link *within the navbar*
-                    anchor_link = nav_bar.find('a', href=ANCHOR_HREF)
-                    
-                    if not anchor_link:
-                        print(f"INFO: Skipped {file_path} (No '{ANCHOR_HREF}' link found *in* navbar)")
-                        skipped_files += 1
-                        continue
-                        
-                    # Check if the "Support & Contact" link *already exists in the navbar*
-                    if nav_bar.find('a', href=NEW_LINK_HREF):
-                        print(f"INFO: Skipped {file_path} (Link '{NEW_LINK_HREF}' already exists *in* navbar)")
-                        skipped_files += 1
-                        continue
-
-                    # --- If we get here, we need to add the link ---
-                    
-                    # Create a deep copy of the tag to insert it
-                    # This is crucial so we can use the tag in multiple files
-                    tag_to_insert = copy.copy(new_link_tag)
-                    
-                    # Insert the new link tag after the anchor link
-                    anchor_link.insert_after(tag_to_insert)
-                    
-                    # Insert a newline *after* the anchor link (which is *before* the new tag)
-                    # This keeps the HTML formatting clean
-                    anchor_link.insert_after('\n') 
-                    
-                    # Write the modified content back to the file
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(str(soup))
-                        
-                    print(f"SUCCESS: Updated {file_path}")
-                    updated_files += 1
-
-                except Exception as e:
-                    print(f"ERROR: Could not process {file_path}. Reason: {e}")
-                    skipped_files += 1
-
-    print("\n--- Update Complete ---")
-    print(f"Total .html files found: {total_files}")
-    print(f"Files updated:         {updated_files}")
-    print(f"Files skipped:         {skipped_files}")
+                html_files.append(os.path.join(root, file))
+
+    results = run_pages(sorted(html_files), add_contact_to_file, workers)
+    print_summary(results, "Update Complete")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add the Support & Contact link to every navbar')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
     if not os.path.isdir(TARGET_DIRECTORY):
         print(f"ERROR: Target directory '{TARGET_DIRECTORY}' not found.")
         print("Please run this script from the root of your project (e.g., 'GeminiHatake-f2e4e844be00b3cd0391db5fa42bb597707146cc').")
     else:
-        update_html_files()
+        update_html_files(args.workers)
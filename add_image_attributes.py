@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Stamps intrinsic dimensions and lazy loading on every <img> in public/.
+
+Each <img> gets width/height from its image's header (see
+image_dimensions.py), decoding="async", and loading="lazy" unless it is one
+of the page's above-the-fold images listed in EAGER_IMAGES. Attributes a
+tag already has are never overwritten.
+
+The dimension index is built here, once, before the pages are rewritten
+through html_pipeline (where this is registered as 'image_attributes').
+Remote images only get dimensions once their headers have been fetched
+with --fetch-remote; after that they are served from the index.
+"""
+
+import os
+import re
+import glob
+import argparse
+from html_scan import iter_tags, parse_attrs
+from image_dimensions import INDEX_FILENAME, DimensionIndex, site_path
+from page_cache import files_version
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Above-the-fold images that must not be lazy loaded, as CSS selectors per
+# page file name. '*' applies to every page.
+EAGER_IMAGES = {
+    '*': ['img[alt="HatakeSocial Logo"]'],
+    # The landing hero
+    'index.html': ['section:first-of-type img'],
+}
+# Bump this whenever the stamped attributes change, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+# Tailwind sizing classes (optionally behind variants such as md: or dark:).
+_WIDTH_CLASS = re.compile(r'^(?:[\w-]+:)*(?:min-|max-)?w-')
+_HEIGHT_CLASS = re.compile(r'^(?:[\w-]+:)*(?:min-|max-)?h-')
+
+# Dimension index, loaded once per process by the page transform.
+_index = None
+
+def dimension_index():
+    """Returns the process's DimensionIndex for public/."""
+    global _index
+    if _index is None:
+        _index = DimensionIndex(PUBLIC_DIR)
+    return _index
+
+def eager_selectors(filename):
+    """Returns the selectors of the images a page loads eagerly."""
+    return EAGER_IMAGES.get('*', []) + EAGER_IMAGES.get(filename, [])
+
+def sized_on_one_axis(img):
+    """
+    Checks whether the tag's classes size only one axis (e.g. class="h-16").
+    width/height attributes would then fix the other axis to the intrinsic
+    size and stretch the image, so such images are not given dimensions.
+    """
+    classes = img.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    has_width = any(_WIDTH_CLASS.match(name) for name in classes)
+    has_height = any(_HEIGHT_CLASS.match(name) for name in classes)
+    return has_width != has_height
+
+def image_size(src, index):
+    """Returns the (width, height) of an <img> src from the index, or None."""
+    if not src or '${' in src:
+        return None
+    path = site_path(src)
+    if path is None:
+        return index.lookup_url(src) if src.startswith(('http://', 'https://')) else None
+    return index.lookup(os.path.join(index.base_dir, path))
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the dimension index."""
+    return files_version(TRANSFORM_VERSION, [os.path.join(PUBLIC_DIR, INDEX_FILENAME)])
+
+def add_image_attributes(soup, filename=None, log=print):
+    """
+    Adds width/height, decoding="async" and loading="lazy" to the page's images.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    index = dimension_index()
+    eager = {id(img) for selector in eager_selectors(filename) for img in soup.select(selector)}
+
+    modified = 0
+    for img in soup.find_all('img'):
+        before = dict(img.attrs)
+        if not img.has_attr('width') and not img.has_attr('height') and not sized_on_one_axis(img):
+            size = image_size(img.get('src'), index)
+            if size:
+                img['width'], img['height'] = str(size[0]), str(size[1])
+        if not img.has_attr('decoding'):
+            img['decoding'] = 'async'
+        if id(img) not in eager and not img.has_attr('loading'):
+            img['loading'] = 'lazy'
+        if img.attrs != before:
+            modified += 1
+
+    if modified:
+        log(f"Stamped loading attributes on {modified} image(s) in {filename}")
+    return bool(modified)
+
+def index_page_images(pages, index, fetch_remote=False):
+    """
+    Adds every image the pages reference to the dimension index.
+
+    The pages are only token-scanned (no DOM), and each image is looked up
+    once however many pages use it.
+
+    Returns:
+        int: Number of distinct image URLs with known dimensions.
+    """
+    sources = set()
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            content = f.read()
+        for token in iter_tags(content):
+            if token.kind == 'start' and token.name == 'img':
+                sources.add(parse_attrs(token.attrs_text).get('src'))
+
+    known = 0
+    for src in sorted(filter(None, sources)):
+        if site_path(src) is None and src.startswith(('http://', 'https://')):
+            known += index.lookup_url(src, fetch=fetch_remote) is not None
+        else:
+            known += image_size(src, index) is not None
+    return known
+
+def main():
+    parser = argparse.ArgumentParser(description='Add width/height and lazy loading to every <img> in public/')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    parser.add_argument('--fetch-remote', action='store_true',
+                        help='Read the headers of remote images not in the index yet')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    from html_pipeline import run_pipeline
+
+    pages = sorted(glob.glob(os.path.join(PUBLIC_DIR, '*.html')))
+    index = dimension_index()
+    known = index_page_images(pages, index, args.fetch_remote)
+    print(f"Dimension index: {known} image URL(s) with known dimensions")
+    # New dimensions can change pages the cache considers done
+    changed = index.dirty
+    index.save()
+
+    run_pipeline(PUBLIC_DIR, only=['image_attributes'], workers=args.workers,
+                 use_cache=not (changed or args.no_cache))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -1,74 +1,88 @@
 import os
 import re
+import argparse
+from page_runner import run_pages
+from page_cache import PageCache
+from html_splice import insert_snippet
+from patch_markers import PATCH_MARKERS
 
 # Configuration
 TARGET_DIR = 'public'
 SCRIPT_TAG = '\n    <!-- Internal Analytics -->\n    <script src="js/simple-analytics.js"></script>'
-# Regex to find Firebase script tags (matches generic firebase app/auth/firestore/etc include lines)
-FIREBASE_REGEX = re.compile(r'<script src="https://www\.gstatic\.com/firebasejs/[^"]+"></script>', re.IGNORECASE)
+# Matches if the page already loads the analytics script (see patch_markers.py)
+ANALYTICS_MARKER = PATCH_MARKERS.pattern('analytics', for_bytes=True)
+# Regex to find Firebase script srcs (matches generic firebase app/auth/firestore/etc includes)
+FIREBASE_SRC_REGEX = re.compile(r'^https://www\.gstatic\.com/firebasejs/', re.IGNORECASE)
+# Bump this whenever SCRIPT_TAG or the insertion logic changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '3'
 
-def process_html_files():
+def process_html_files(workers=None, use_cache=True):
     print(f"Scanning directory: {TARGET_DIR}...")
-    count = 0
-    updated_count = 0
     
     if not os.path.exists(TARGET_DIR):
         print(f"Error: Directory '{TARGET_DIR}' not found.")
         return
 
+    html_files = []
     for root, dirs, files in os.walk(TARGET_DIR):
         for file in files:
             if file.endswith(".html"):
-                file_path = os.path.join(root, file)
-                if add_script_to_file(file_path):
-                    updated_count += 1
-                count += 1
+                html_files.append(os.path.join(root, file))
+
+    # Pages unchanged since the last successful run are skipped entirely
+    cache = PageCache('analytics', TRANSFORM_VERSION, TARGET_DIR, markers=PATCH_MARKERS) if use_cache else None
+    results = run_pages(sorted(html_files), add_script_to_file, workers, cache=cache,
+                        skip_if_patched='analytics')
+    updated_count = sum(1 for result in results if result.status == 'updated')
+    cached_count = sum(1 for result in results if result.status == 'cached')
     
     print("-" * 40)
     print(f"Scan complete.")
-    print(f"Total HTML files matched: {count}")
+    print(f"Total HTML files matched: {len(results)}")
+    print(f"Files unchanged since last run: {cached_count}")
     print(f"Files updated: {updated_count}")
 
-def add_script_to_file(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+def choose_analytics_insertion(anchors):
+    """Returns (offset, snippet, description) for the analytics script, or None."""
+    if anchors.last_script_end is not None:
+        # Insert after the LAST Firebase script found in the file
+        return anchors.last_script_end, SCRIPT_TAG, "Inserted after Firebase"
+    if anchors.body_end is not None:
+        # Fallback: No Firebase scripts found? Insert before </body>
+        return anchors.body_end, SCRIPT_TAG + "\n", "Inserted before body end"
+    return None
+
+def add_script_to_file(file_path, log=print):
+    # Patched in streaming mode: one token pass over the mapped page, no DOM
+    chosen = []
 
-        # 1. Check if script is already present
-        if "js/simple-analytics.js" in content:
-            print(f"[SKIP] {file_path} (Already present)")
-            return False
+    def choose_insertion(anchors):
+        insertion = choose_analytics_insertion(anchors)
+        if insertion is None:
+            return None
+        chosen.append(insertion[2])
+        return insertion[:2]
 
-        # 2. Find all Firebase script occurrences
-        matches = list(FIREBASE_REGEX.finditer(content))
-        
-        new_content = ""
-        
-        if matches:
-            # Insert after the LAST Firebase script found in the file
-            last_match = matches[-1]
-            end_pos = last_match.end()
-            
-            new_content = content[:end_pos] + SCRIPT_TAG + content[end_pos:]
-            print(f"[UPDATE] {file_path} (Inserted after Firebase)")
-        
-        else:
-            # Fallback: No Firebase scripts found? Insert before </body>
-            if "</body>" in content:
-                new_content = content.replace("</body>", SCRIPT_TAG + "\n</body>")
-                print(f"[UPDATE] {file_path} (Inserted before body end)")
-            else:
-                print(f"[WARN] {file_path} (No Firebase scripts or body tag found, skipping)")
-                return False
+    result = insert_snippet(file_path, choose_insertion, marker=ANALYTICS_MARKER, script_src=FIREBASE_SRC_REGEX)
 
-        # 3. Write changes back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-            return True
+    # 1. Check if script is already present
+    if result == 'present':
+        log(f"[SKIP] {file_path} (Already present)")
+        return False
 
-    except Exception as e:
-        print(f"[ERROR] processing {file_path}: {e}")
+    if result == 'no-anchor':
+        log(f"[WARN] {file_path} (No Firebase scripts or body tag found, skipping)")
         return False
 
+    log(f"[UPDATE] {file_path} ({chosen[0]})")
+    return True
+
 if __name__ == "__main__":
-    process_html_files()
+    parser = argparse.ArgumentParser(description='Add the internal analytics script to every page')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    args = parser.parse_args()
+
+    process_html_files(args.workers, not args.no_cache)
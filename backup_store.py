@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Content-addressed backup store for the page rewriters.
+
+Instead of copying every page into a new directory on each run, files are
+stored once by content hash and each run only writes a small manifest:
+
+    .backups/
+      objects/ab/cdef0123...     one blob per distinct file content
+      runs/<run id>.json         {relative path: {hash, size, mode}} per run
+      index.json                 stat cache: path -> size, mtime, hash
+
+A page that has not changed since it was last backed up is neither re-read
+(its size and mtime match the stat cache) nor re-written (its blob already
+exists), so a backup costs time and disk in proportion to the pages that
+changed. The store lives in a dot-directory, which Firebase Hosting never
+deploys.
+
+Usage:
+    python backup_store.py list
+    python backup_store.py restore <run id> [--file about.html ...]
+    python backup_store.py prune --keep 10 [--older-than 30]
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+
+BACKUP_DIRNAME = '.backups'
+
+def _write_json(path, data):
+    """Writes JSON atomically."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+class BackupStore:
+    def __init__(self, store_dir=BACKUP_DIRNAME, base_dir=None):
+        """
+        Args:
+            store_dir (str): Directory holding the blobs and run manifests.
+            base_dir (str): Directory that backed-up paths are stored
+                relative to (default: the store's parent directory).
+        """
+        self.store_dir = os.path.abspath(store_dir)
+        self.base_dir = os.path.abspath(base_dir or os.path.dirname(self.store_dir))
+        self.objects_dir = os.path.join(self.store_dir, 'objects')
+        self.runs_dir = os.path.join(self.store_dir, 'runs')
+        self.index_file = os.path.join(self.store_dir, 'index.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.base_dir).replace(os.sep, '/')
+
+    def _store_blob(self, file_path):
+        """Hashes a file and stores its content if the blob is new."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix='.tmp.')
+            os.close(fd)
+            try:
+                shutil.copyfile(file_path, temp_path)
+                os.replace(temp_path, blob_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        return digest
+
+    def backup(self, file_paths, label=None):
+        """
+        Records the current content of a set of files as a new run.
+
+        Args:
+            file_paths (iterable): Files to back up.
+            label (str): Free-form description stored with the run.
+
+        Returns:
+            str: The run id.
+        """
+        os.makedirs(self.runs_dir, exist_ok=True)
+        index = _read_json(self.index_file, {})
+        files = {}
+        for file_path in file_paths:
+            key = self._key(file_path)
+            stat = os.stat(file_path)
+            cached = index.get(key)
+            if (cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns
+                    and os.path.exists(self._blob_path(cached['hash']))):
+                digest = cached['hash']
+            else:
+                digest = self._store_blob(file_path)
+                index[key] = {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            files[key] = {'hash': digest, 'size': stat.st_size, 'mode': stat.st_mode & 0o7777}
+
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        _write_json(os.path.join(self.runs_dir, f'{run_id}.json'), {
+            'id': run_id,
+            'created': time.time(),
+            'label': label,
+            'files': files,
+        })
+        _write_json(self.index_file, index)
+        return run_id
+
+    def runs(self):
+        """Returns every run manifest, oldest first."""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        manifests = [_read_json(os.path.join(self.runs_dir, name), None)
+                     for name in os.listdir(self.runs_dir) if name.endswith('.json')]
+        return sorted((manifest for manifest in manifests if manifest), key=lambda manifest: manifest['created'])
+
+    def get_run(self, run_id):
+        """Returns a run manifest. Raises KeyError if it does not exist."""
+        manifest = _read_json(os.path.join(self.runs_dir, f'{run_id}.json'), None)
+        if manifest is None:
+            raise KeyError(f"No backup run '{run_id}' in {self.store_dir}")
+        return manifest
+
+    def restore(self, run_id, only=None, dry_run=False):
+        """
+        Restores the files of a run to their recorded content.
+
+        The current content of the files about to be overwritten is backed
+        up first (as a 'pre-restore' run), so a restore can be undone.
+
+        Args:
+            run_id (str): The run to restore.
+            only (list): If given, restore only these relative paths.
+            dry_run (bool): Only report which files would change.
+
+        Returns:
+            list: Relative paths of the files that were (or would be) restored.
+        """
+        manifest = self.get_run(run_id)
+        index = _read_json(self.index_file, {})
+        targets = []
+        for key, entry in sorted(manifest['files'].items()):
+            if only and key not in only:
+                continue
+            file_path = os.path.join(self.base_dir, key)
+            cached = index.get(key)
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                if (cached and cached['hash'] == entry['hash'] and cached['size'] == stat.st_size
+                        and cached['mtime_ns'] == stat.st_mtime_ns):
+                    continue  # Already at the recorded content
+            targets.append((key, file_path, entry))
+
+        if dry_run or not targets:
+            return [key for key, _, _ in targets]
+
+        existing = [file_path for _, file_path, _ in targets if os.path.exists(file_path)]
+        if existing:
+            self.backup(existing, label=f'pre-restore of {run_id}')
+
+        for key, file_path, entry in targets:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.restore.')
+            os.close(fd)
+            try:
+                shutil.copyfile(self._blob_path(entry['hash']), temp_path)
+                os.chmod(temp_path, entry['mode'])
+                os.replace(temp_path, file_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            stat = os.stat(file_path)
+            index[key] = {'hash': entry['hash'], 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+        _write_json(self.index_file, index)
+        return [key for key, _, _ in targets]
+
+    def prune(self, keep=None, older_than_days=None):
+        """
+        Deletes old runs and the blobs no remaining run references.
+
+        Args:
+            keep (int): Keep at least the newest `keep` runs.
+            older_than_days (float): Only delete runs older than this. With
+                neither argument nothing is deleted but unreferenced blobs.
+
+        Returns:
+            tuple: (number of runs removed, number of blobs removed)
+        """
+        runs = self.runs()
+        removable = runs[:-keep] if keep else list(runs)
+        if older_than_days is not None:
+            cutoff = time.time() - older_than_days * 86400
+            removable = [run for run in removable if run['created'] < cutoff]
+        elif keep is None:
+            removable = []
+
+        for run in removable:
+            os.remove(os.path.join(self.runs_dir, f"{run['id']}.json"))
+
+        referenced = {entry['hash'] for run in self.runs() for entry in run['files'].values()}
+        removed_blobs = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    if prefix + name not in referenced:
+                        os.remove(os.path.join(prefix_dir, name))
+                        removed_blobs += 1
+                if not os.listdir(prefix_dir):
+                    os.rmdir(prefix_dir)
+
+        index = _read_json(self.index_file, {})
+        pruned_index = {key: entry for key, entry in index.items() if entry['hash'] in referenced}
+        if pruned_index != index:
+            _write_json(self.index_file, pruned_index)
+        return len(removable), removed_blobs
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect, restore and prune page backups')
+    parser.add_argument('--store', default=BACKUP_DIRNAME,
+                        help=f'Backup store directory (default: {BACKUP_DIRNAME})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='List backup runs')
+
+    restore_parser = commands.add_parser('restore', help='Restore the files of a run')
+    restore_parser.add_argument('run_id')
+    restore_parser.add_argument('--file', nargs='+', metavar='PATH', help='Only restore these paths')
+    restore_parser.add_argument('--dry-run', action='store_true', help='Only list the files that would change')
+
+    prune_parser = commands.add_parser('prune', help='Delete old runs and unreferenced blobs')
+    prune_parser.add_argument('--keep', type=int, help='Number of newest runs to keep')
+    prune_parser.add_argument('--older-than', type=float, metavar='DAYS', help='Only delete runs older than DAYS')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.store):
+        print(f"ERROR: Backup store '{args.store}' not found.")
+        return False
+    store = BackupStore(args.store)
+
+    if args.command == 'list':
+        for run in store.runs():
+            created = datetime.fromtimestamp(run['created']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{run['id']}  {created}  {len(run['files']):4} files  {run['label'] or ''}")
+        return True
+
+    if args.command == 'restore':
+        try:
+            restored = store.restore(args.run_id, args.file, args.dry_run)
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}")
+            return False
+        verb = 'Would restore' if args.dry_run else 'Restored'
+        for key in restored:
+            print(f"  {key}")
+        print(f"{verb} {len(restored)} file(s) from run {args.run_id}")
+        return True
+
+    removed_runs, removed_blobs = store.prune(args.keep, args.older_than)
+    print(f"Removed {removed_runs} run(s) and {removed_blobs} unreferenced blob(s)")
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
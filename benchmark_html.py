@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the HTML maintenance scripts over a synthetic page corpus.
+
+A corpus of N pages is generated with the same layout as public/*.html
+(head scripts including duplicate / mixed-version Firebase includes, the
+sidebar, a main-content wrapper with duplicated headers, nested content and
+trailing page scripts). Each transform runs over a fresh copy of the corpus
+in its own process, so peak RSS is measured per transform, and the best of
+--repeat runs is reported as pages/s and MB/s.
+
+Results are written as JSON. Passing a previous results file with
+--baseline flags transforms whose throughput dropped or whose peak RSS grew
+by more than --threshold, and exits with status 1 if any did.
+
+Usage:
+    python benchmark_html.py --pages 200 --size-kb 40 --depth 8 --scripts 12
+    python benchmark_html.py --baseline benchmark_results.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import importlib
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Benchmarked transforms. Format: name -> (module, function). Each function
+# takes a page path and rewrites it in place. Modules are looked up in the
+# project root and in public/.
+TRANSFORMS = {
+    'standardize_html_file': ('finalize_and_fix_scripts', 'standardize_html_file'),
+    'fix_search_and_auth': ('fix_search_and_auth', 'process_html_file'),
+    'fix_firebase_conflicts': ('fix_firebase_conflicts', 'fix_firebase_conflicts'),
+}
+
+DEFAULT_OUTPUT = 'benchmark_results.json'
+# --- End Configuration ---
+
+# Script includes found in the real pages, including the duplicate and
+# mixed-version Firebase modules fix_firebase_conflicts has to clean up.
+HEAD_SCRIPTS = [
+    'https://cdn.tailwindcss.com',
+    'https://www.gstatic.com/firebasejs/8.10.1/firebase-app.js',
+    'https://www.gstatic.com/firebasejs/8.10.1/firebase-auth.js',
+    'https://www.gstatic.com/firebasejs/8.10.1/firebase-firestore.js',
+    'https://www.gstatic.com/firebasejs/8.10.1/firebase-storage.js',
+    'https://www.gstatic.com/firebasejs/8.10.1/firebase-functions.js',
+    '/__/firebase/9.6.1/firebase-app-compat.js',
+    '/__/firebase/9.6.1/firebase-auth-compat.js',
+    '/__/firebase/init.js',
+    'https://cdn.jsdelivr.net/npm/toastify-js',
+]
+BODY_SCRIPTS = ['js/auth.js', 'js/darkmode.js', 'js/messenger.js', 'js/card-modal.js', 'js/simple-analytics.js']
+
+SIDEBAR_LINKS = ['app.html', 'messages.html', 'community.html', 'articles.html', 'deck.html',
+                 'my_collection.html', 'marketplace.html', 'trades.html', 'events.html', 'settings.html']
+
+WORDS = ('card deck trade collection price set rarity foil mint condition seller buyer '
+         'offer binder booster draft commander graded listing shipping').split()
+
+def _header(index):
+    return f"""<header class="bg-white dark:bg-gray-800 shadow-sm h-16 flex items-center px-6" data-copy="{index}">
+<div class="flex-1"><input type="text" placeholder="Search for cards, users, and decks..." class="w-full px-4 py-2"/></div>
+<div id="user-actions" class="flex items-center space-x-4"><button id="loginButton" class="btn-primary">Login</button></div>
+</header>
+"""
+
+def _nested_block(rng, depth):
+    """Returns one content card nested `depth` divs deep."""
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 40)))
+    inner = f'<p class="text-gray-700 dark:text-gray-300">{text}</p>\n<a href="card-view.html?id={rng.randint(1, 99999)}">View</a>'
+    for level in range(depth):
+        inner = f'<div class="p-{level % 6} rounded-lg shadow" data-level="{level}">\n{inner}\n</div>'
+    return inner + '\n'
+
+def generate_page(rng, title, size_kb, depth, scripts):
+    """
+    Generates one page with the public/*.html layout.
+
+    Args:
+        rng (random.Random): Seeded generator, so corpora are reproducible.
+        title (str): Page title.
+        size_kb (int): Approximate page size in KiB.
+        depth (int): Nesting depth of the content cards.
+        scripts (int): Number of <script src> includes (head + body).
+    """
+    head_count = min(scripts, len(HEAD_SCRIPTS))
+    head_scripts = ''.join(f'<script src="{src}"></script>\n' for src in HEAD_SCRIPTS[:head_count])
+    body_scripts = ''.join(f'<script src="{BODY_SCRIPTS[i % len(BODY_SCRIPTS)]}?v={i}"></script>\n'
+                           for i in range(scripts - head_count))
+    sidebar = ''.join(f'<a class="flex items-center px-4 py-2" href="{href}"><i class="fas fa-home w-6"></i><span class="ml-3">{href[:-5]}</span></a>\n'
+                      for href in SIDEBAR_LINKS)
+
+    top = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8"/>
+<meta content="width=device-width, initial-scale=1.0" name="viewport"/>
+<title>{title} - HatakeSocial</title>
+<link href="css/style.css" rel="stylesheet"/>
+{head_scripts}</head>
+<body class="bg-gray-100 dark:bg-gray-900">
+<div class="flex h-screen">
+<aside id="sidebar" class="w-64 bg-white dark:bg-gray-800 fixed inset-y-0 left-0 z-50">
+<nav class="flex-1 px-4 py-6 space-y-2">
+{sidebar}</nav>
+</aside>
+<div id="main-content-wrapper" class="flex-1 flex flex-col overflow-hidden">
+{_header(1)}{_header(2)}<main class="flex-1 p-6">
+"""
+    bottom = f"""</main>
+</div>
+</div>
+<script>
+    document.addEventListener('DOMContentLoaded', () => {{ if (window.innerWidth < 1024) {{ /* </div> */ }} }});
+</script>
+{body_scripts}</body>
+</html>
+"""
+    blocks = []
+    size = len(top) + len(bottom)
+    while size < size_kb * 1024:
+        block = _nested_block(rng, depth)
+        blocks.append(block)
+        size += len(block)
+    return top + ''.join(blocks) + bottom
+
+def build_corpus(directory, pages, size_kb, depth, scripts, seed=0):
+    """
+    Writes a synthetic corpus of pages to a directory.
+
+    Returns:
+        list: Paths of the generated pages.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(pages):
+        path = os.path.join(directory, f'page_{index:05d}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generate_page(rng, f'Page {index}', size_kb, depth, scripts))
+        paths.append(path)
+    return paths
+
+def _load_transform(name):
+    for directory in (PUBLIC_DIR, ROOT_DIR):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+    module_name, func_name = TRANSFORMS[name]
+    return getattr(importlib.import_module(module_name), func_name)
+
+def _peak_rss_kb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run_benchmark(name, corpus_dir, repeat):
+    """
+    Times one transform over fresh copies of the corpus. Runs in a child
+    process so the reported peak RSS belongs to this transform alone.
+
+    Returns:
+        dict: The transform's timings and memory use.
+    """
+    func = _load_transform(name)
+    baseline_rss = _peak_rss_kb()
+    pages = sorted(os.listdir(corpus_dir))
+    total_bytes = sum(os.path.getsize(os.path.join(corpus_dir, page)) for page in pages)
+
+    timings = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='benchmark_html.')
+        try:
+            copy_dir = os.path.join(work_dir, 'pages')
+            shutil.copytree(corpus_dir, copy_dir)
+            previous_dir = os.getcwd()
+            # Some scripts resolve paths relative to the working directory
+            os.chdir(copy_dir)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    for page in pages:
+                        func(page)
+                    timings.append(time.perf_counter() - start)
+            finally:
+                os.chdir(previous_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    best = min(timings)
+    peak_rss = _peak_rss_kb()
+    return {
+        'pages': len(pages),
+        'bytes': total_bytes,
+        'seconds': timings,
+        'best_seconds': best,
+        'pages_per_second': len(pages) / best if best else None,
+        'mb_per_second': total_bytes / (1024 * 1024) / best if best else None,
+        'peak_rss_kb': peak_rss,
+        'rss_growth_kb': peak_rss - baseline_rss,
+    }
+
+def compare_results(current, baseline, threshold):
+    """
+    Compares two result sets.
+
+    Returns:
+        list: Human-readable regression descriptions (empty if none).
+    """
+    regressions = []
+    for name, result in current['transforms'].items():
+        previous = baseline.get('transforms', {}).get(name)
+        if not previous:
+            continue
+        if previous.get('pages_per_second') and result['pages_per_second'] < previous['pages_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: {result['pages_per_second']:.1f} pages/s "
+                               f"(was {previous['pages_per_second']:.1f})")
+        if previous.get('rss_growth_kb') and result['rss_growth_kb'] > previous['rss_growth_kb'] * (1 + threshold):
+            regressions.append(f"{name}: RSS growth {result['rss_growth_kb']} KiB "
+                               f"(was {previous['rss_growth_kb']} KiB)")
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    print(f"\n--- Benchmark ({results['corpus']['pages']} pages, "
+          f"{results['corpus']['bytes'] / (1024 * 1024):.1f} MB) ---")
+    print(f"  {'transform':26} {'pages/s':>10} {'MB/s':>8} {'best s':>8} {'peak RSS':>12}")
+    for name, result in results['transforms'].items():
+        print(f"  {name:26} {result['pages_per_second']:10.1f} {result['mb_per_second']:8.2f} "
+              f"{result['best_seconds']:8.3f} {result['peak_rss_kb'] / 1024:9.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the HTML maintenance scripts on a synthetic corpus')
+    parser.add_argument('--pages', '-n', type=int, default=100, help='Number of pages (default: 100)')
+    parser.add_argument('--size-kb', type=int, default=40, help='Approximate page size in KiB (default: 40)')
+    parser.add_argument('--depth', type=int, default=6, help='Nesting depth of the content (default: 6)')
+    parser.add_argument('--scripts', type=int, default=12, help='Script includes per page (default: 12)')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus random seed (default: 0)')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='Runs per transform; the best is kept (default: 3)')
+    parser.add_argument('--only', nargs='+', choices=sorted(TRANSFORMS), help='Only benchmark these transforms')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help=f'Results file (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown / RSS growth flagged as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    corpus = {'pages': args.pages, 'size_kb': args.size_kb, 'depth': args.depth,
+              'scripts': args.scripts, 'seed': args.seed}
+    names = args.only or list(TRANSFORMS)
+
+    # Read the baseline before anything is written: --output may be the same file
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: Could not read baseline '{args.baseline}': {e}")
+            return False
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_corpus.') as corpus_dir:
+        paths = build_corpus(corpus_dir, args.pages, args.size_kb, args.depth, args.scripts, args.seed)
+        corpus['bytes'] = sum(os.path.getsize(path) for path in paths)
+        print(f"Built corpus: {len(paths)} pages, {corpus['bytes'] / (1024 * 1024):.1f} MB")
+
+        transforms = {}
+        for name in names:
+            print(f"Running {name}...")
+            # A fresh process per transform keeps the peak RSS numbers separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                transforms[name] = executor.submit(run_benchmark, name, corpus_dir, args.repeat).result()
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': corpus,
+        'transforms': transforms,
+    }
+    print_results(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        if baseline.get('corpus') != corpus:
+            print("WARNING: Baseline was measured on a different corpus; comparison may be misleading.")
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print("\n❌ Regressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return False
+        print("\n✅ No regressions against the baseline.")
+    return True
+
+if __name__ == '__main__':
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped, column-oriented local card catalog.
+
+searchScryDex and getScryDexCard (functions/index.js) call the ScryDex API
+on every request, and public/js/price-cache.js only caches the results in
+one browser's localStorage. This catalog is built from ScryDex/JustTCG
+dumps (see card_index.iter_dump) and answers the same requests from disk:
+
+    catalog = CardCatalog()
+    catalog.search('set:M11 bolt', 'mtg', page=1, limit=100)
+    # -> {'success': True, 'data': [<card objects>], 'has_more': False}
+    catalog.get_card('m11-146', 'mtg')
+    # -> {'data': <card object>}
+
+The store is a directory of flat binary columns, one row per printing,
+rows sorted by normalized name (then game, set and collector number):
+
+- String columns (api_id, name_key, card = the dump's card JSON) are a
+  .dat file of UTF-8 bytes and an .off file of uint64 offsets.
+- Low-cardinality columns (game, set, rarity, collector number) are
+  dictionary-encoded (.codes, values in catalog.json), and each has a
+  secondary index: the ascending row ids of every value (.ids + .ids.off),
+  so a filter reads one slice of row ids.
+- Name prefix index: every word of every name, sorted, with its row
+  (words.dat/.off + words.rows). A search term is a binary search for the
+  range of words it starts, and an exact name (!"...") is a binary search
+  on name_key, since the rows are sorted by it.
+- api_id.rows: the rows sorted by api_id, for getScryDexCard.
+
+Every file is opened with mmap and read through memoryviews, so opening
+the catalog reads only catalog.json; a query touches the index slices it
+needs and decodes the card JSON of the returned page only.
+
+Supported query syntax (the subset of ScryDex's the app sends):
+bare words and "phrases" (names with words starting with each term),
+!"Exact Name", name:, set: / expansion.id: / expansion.code:, rarity:,
+number: / localId:.
+"""
+
+import os
+import re
+import sys
+import mmap
+import json
+import time
+import shutil
+import argparse
+from array import array
+from bisect import bisect_left
+from card_index import catalog_card, iter_dump, normalize_name, normalize_number
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(ROOT_DIR, '.card_catalog')
+
+# searchScryDex's default page size
+DEFAULT_LIMIT = 100
+# Bump this whenever the file layout changes; older stores must be rebuilt.
+CATALOG_VERSION = '1'
+# --- End Configuration ---
+
+MANIFEST_FILENAME = 'catalog.json'
+STRING_COLUMNS = ['api_id', 'name_key', 'card']
+# Query fields -> catalog column
+QUERY_FIELDS = {
+    'name': 'name',
+    'set': 'set', 'set.id': 'set', 'expansion.id': 'set', 'expansion.code': 'set',
+    'rarity': 'rarity',
+    'number': 'number', 'localid': 'number', 'collector_number': 'number',
+}
+_TOKEN_RE = re.compile(r'(!)?(?:([\w.]+):)?(?:"([^"]*)"|(\S+))')
+
+def _dict_value(column, value):
+    # Values match case-insensitively: set codes are stored upper-case, the rest lower-case
+    if column == 'number':
+        return normalize_number(value)
+    value = (value or '').strip()
+    return value.upper() if column == 'set' else value.lower()
+
+def _write_strings(directory, column, values):
+    offsets = array('Q', [0])
+    with open(os.path.join(directory, f'{column}.dat'), 'wb') as f:
+        for value in values:
+            data = value.encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    with open(os.path.join(directory, f'{column}.off'), 'wb') as f:
+        offsets.tofile(f)
+
+def _write_dict_column(directory, column, values):
+    """Writes a dictionary-encoded column and its value -> rows index; returns the dictionary."""
+    dictionary = sorted(set(values))
+    code_of = {value: code for code, value in enumerate(dictionary)}
+    codes = array('I', (code_of[value] for value in values))
+    rows_of = [array('I') for _ in dictionary]
+    for row, code in enumerate(codes):
+        rows_of[code].append(row)
+    offsets = array('Q', [0])
+    with open(os.path.join(directory, f'{column}.ids'), 'wb') as f:
+        for rows in rows_of:
+            rows.tofile(f)
+            offsets.append(offsets[-1] + len(rows))
+    with open(os.path.join(directory, f'{column}.ids.off'), 'wb') as f:
+        offsets.tofile(f)
+    with open(os.path.join(directory, f'{column}.codes'), 'wb') as f:
+        codes.tofile(f)
+    return dictionary
+
+def build_catalog(dumps, directory=STORE_DIR):
+    """
+    Builds the catalog from dumps, replacing any previous store.
+
+    Args:
+        dumps (list): (dump path, game) pairs; game names the game of cards
+            that do not carry one (ScryDex dumps are per game).
+        directory (str): Store directory.
+
+    Returns:
+        int: Number of printings in the catalog.
+    """
+    # A later dump replaces a card with the same game and id
+    cards = {}
+    for dump_path, game in dumps:
+        for raw in iter_dump(dump_path):
+            record = catalog_card(raw, game)
+            if record.api_id and record.name:
+                cards[(record.game, record.api_id)] = (record, raw)
+
+    rows = sorted(
+        ((normalize_name(record.name), record.game, record.set, normalize_number(record.collector_number),
+          record, raw) for record, raw in cards.values()),
+        key=lambda row: row[:4])
+
+    temp_dir = directory + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    _write_strings(temp_dir, 'api_id', (row[4].api_id for row in rows))
+    _write_strings(temp_dir, 'name_key', (row[0] for row in rows))
+    _write_strings(temp_dir, 'card', (json.dumps(row[5], ensure_ascii=False, separators=(',', ':')) for row in rows))
+    dictionaries = {
+        'game': _write_dict_column(temp_dir, 'game', [_dict_value('game', row[1]) for row in rows]),
+        'set': _write_dict_column(temp_dir, 'set', [_dict_value('set', row[2]) for row in rows]),
+        'rarity': _write_dict_column(temp_dir, 'rarity', [_dict_value('rarity', row[4].rarity) for row in rows]),
+        'number': _write_dict_column(temp_dir, 'number', [row[3] for row in rows]),
+    }
+
+    words = sorted({(word, row) for row, (name_key, *_) in enumerate(rows) for word in name_key.split()})
+    _write_strings(temp_dir, 'words', (word for word, _ in words))
+    with open(os.path.join(temp_dir, 'words.rows'), 'wb') as f:
+        array('I', (row for _, row in words)).tofile(f)
+    with open(os.path.join(temp_dir, 'api_id.rows'), 'wb') as f:
+        array('I', sorted(range(len(rows)), key=lambda row: rows[row][4].api_id)).tofile(f)
+
+    with open(os.path.join(temp_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'version': CATALOG_VERSION, 'byteorder': sys.byteorder, 'rows': len(rows),
+                   'dictionaries': dictionaries, 'built': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
+                  f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temp_dir, directory)
+    return len(rows)
+
+class _StringColumn:
+    """Read-only view of a string column: catalog[i] decodes row i."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return str(self.data[self.offsets[row]:self.offsets[row + 1]], 'utf-8')
+
+    def bisect(self, value, right=False):
+        """Returns the insertion point of value in this (sorted) column."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < value or (right and self[mid] == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+class CardCatalog:
+    """
+    Query API over a built catalog (see build_catalog).
+
+    Raises:
+        FileNotFoundError: If the store has not been built.
+        ValueError: If it was built by an incompatible version.
+    """
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != CATALOG_VERSION or self.manifest.get('byteorder') != sys.byteorder:
+            raise ValueError(f"Catalog in '{directory}' is from another version; rebuild it")
+        self.rows = self.manifest['rows']
+        self._maps = {}
+        self.columns = {column: self._strings(column) for column in STRING_COLUMNS + ['words']}
+        self.word_rows = self._ints('words.rows', 'I')
+        self.api_id_rows = self._ints('api_id.rows', 'I')
+        self.dictionaries = self.manifest['dictionaries']
+        self._code_of = {column: {value: code for code, value in enumerate(values)}
+                         for column, values in self.dictionaries.items()}
+
+    def _buffer(self, filename):
+        if filename not in self._maps:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap cannot map an empty file
+                self._maps[filename] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        return memoryview(self._maps[filename])
+
+    def _ints(self, filename, typecode):
+        return self._buffer(filename).cast(typecode)
+
+    def _strings(self, column):
+        return _StringColumn(self._ints(f'{column}.off', 'Q'), self._buffer(f'{column}.dat'))
+
+    def rows_with(self, column, value):
+        """Returns the ascending rows whose dictionary column has this value (secondary index)."""
+        code = self._code_of[column].get(_dict_value(column, value))
+        if code is None:
+            return []
+        offsets = self._ints(f'{column}.ids.off', 'Q')
+        return self._ints(f'{column}.ids', 'I')[offsets[code]:offsets[code + 1]]
+
+    def rows_named(self, name):
+        """Returns the range of rows whose normalized name is exactly this one."""
+        key = normalize_name(name)
+        names = self.columns['name_key']
+        return range(names.bisect(key), names.bisect(key, right=True))
+
+    def rows_with_word(self, prefix):
+        """Returns the set of rows with a name word starting with prefix (name prefix index)."""
+        words = self.columns['words']
+        start = words.bisect(prefix)
+        # U+FFFF sorts after every character a normalized name contains
+        end = words.bisect(prefix + '\uffff')
+        return frozenset(self.word_rows[start:end])
+
+    def query_rows(self, query, game=None, stop=None):
+        """
+        Returns the ascending rows matching a ScryDex-style query, only the
+        first `stop` of them if given.
+
+        Raises:
+            ValueError: For an unsupported field or an empty query.
+        """
+        filters = [self.rows_with('game', game)] if game else []
+        for negate_exact, field, quoted, bare in _TOKEN_RE.findall(query):
+            value = quoted or bare
+            column = QUERY_FIELDS.get(field.lower()) if field else 'name'
+            if column is None:
+                raise ValueError(f"Unsupported query field '{field}'")
+            if column == 'name' and negate_exact:
+                filters.append(self.rows_named(value))
+            elif column == 'name':
+                filters.extend(self.rows_with_word(word) for word in normalize_name(value).split())
+            else:
+                filters.append(self.rows_with(column, value))
+        if not filters:
+            raise ValueError('The query has no name, set, rarity or number term')
+
+        # Walk the smallest candidate list in row order and probe the others
+        filters.sort(key=len)
+        smallest, others = filters[0], filters[1:]
+        if isinstance(smallest, frozenset):
+            smallest = sorted(smallest)
+        rows = []
+        for row in smallest:
+            if all(_contains(candidates, row) for candidates in others):
+                rows.append(row)
+                if len(rows) == stop:
+                    break
+        return rows
+
+    def card(self, row):
+        """Returns the card object of a row, as the dump had it."""
+        return json.loads(self.columns['card'][row])
+
+    def search(self, query, game=None, page=1, limit=DEFAULT_LIMIT):
+        """
+        Answers a searchScryDex request from the catalog.
+
+        Returns:
+            dict: {'success': True, 'data': [...], 'has_more': bool}, or
+                {'success': False, 'error': ...} like the callable.
+        """
+        if not query or not game:
+            return {'success': False, 'error': 'The function must be called with "query" and "game" arguments.'}
+        start = (max(page, 1) - 1) * limit
+        try:
+            # One row past the page tells whether there are more
+            rows = self.query_rows(query, game, stop=start + limit + 1)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        return {'success': True, 'data': [self.card(row) for row in rows[start:start + limit]],
+                'has_more': start + limit < len(rows)}
+
+    def get_card(self, card_id, game=None):
+        """
+        Answers a getScryDexCard request from the catalog.
+
+        Returns:
+            dict: {'data': card object}, or None if the catalog does not have the card.
+        """
+        api_ids = self.columns['api_id']
+        lo, hi = 0, len(self.api_id_rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if api_ids[self.api_id_rows[mid]] < card_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        game_rows = self.rows_with('game', game) if game else None
+        for row in self.api_id_rows[lo:]:
+            if api_ids[row] != card_id:
+                break
+            if game_rows is None or _contains(game_rows, row):
+                return {'data': self.card(row)}
+        return None
+
+def _contains(rows, row):
+    """Checks whether a row set, or an ascending row sequence (range, list or memoryview), contains a row."""
+    if isinstance(rows, (range, frozenset)):
+        return row in rows
+    index = bisect_left(rows, row)
+    return index < len(rows) and rows[index] == row
+
+def _parse_dump_arg(value):
+    game, separator, path = value.partition('=')
+    return (path, game) if separator else (value, None)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the local card catalog')
+    parser.add_argument('--directory', '-d', default=STORE_DIR, help='Store directory (default: .card_catalog)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Build the catalog from dumps')
+    build.add_argument('dumps', nargs='+', metavar='[GAME=]DUMP',
+                       help='ScryDex/JustTCG dump, prefixed with the game of its cards, e.g. mtg=mtg.json')
+    search = commands.add_parser('search', help='Run a searchScryDex query')
+    search.add_argument('query')
+    search.add_argument('--game', required=True)
+    search.add_argument('--page', type=int, default=1)
+    search.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    get = commands.add_parser('get', help='Look up a card by id, like getScryDexCard')
+    get.add_argument('card_id')
+    get.add_argument('--game')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        try:
+            count = build_catalog([_parse_dump_arg(value) for value in args.dumps], args.directory)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            return False
+        print(f"Built catalog of {count} printing(s) in '{args.directory}' in {time.perf_counter() - start:.1f}s")
+        return True
+
+    try:
+        catalog = CardCatalog(args.directory)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return False
+    start = time.perf_counter()
+    if args.command == 'search':
+        result = catalog.search(args.query, args.game, args.page, args.limit)
+    else:
+        result = catalog.get_card(args.card_id, args.game)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"({elapsed * 1000:.2f} ms)", file=sys.stderr)
+    return bool(result) and result.get('success', True)
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
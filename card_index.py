@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Offline fuzzy card-name index for bulk collection imports.
+
+Resolving an imported row used to take one searchScryDex round-trip per
+card name, so a 5,000-card CSV meant 5,000 calls. This index is built from
+a local catalog dump (the card objects searchScryDex returns, or JustTCG's)
+and resolves rows in memory:
+
+1. Printing key: normalized name + set code + collector number, i.e. what a
+   ManaBox 'M11-146' card number carries. An exact hit is a match.
+2. Set code + collector number alone, accepted if the name is close enough
+   (typos, 'Æther' vs 'Aether', DFC back faces).
+3. Otherwise fuzzy name search: the name's trigrams are looked up in
+   posting lists (name ids sharing each trigram), the names with the
+   highest trigram (Dice) similarity are verified with a bounded edit
+   distance, and the printings of the best names are ranked, preferring
+   the row's set.
+
+A row whose best candidate scores at least ACCEPT_SCORE, and is the only
+printing left after the set filter, is 'matched'. Rows with several equally
+good printings, or only weak candidates, are 'ambiguous' and keep their
+ranked candidates; only those need the API. Rows with no candidate are
+'unmatched'.
+
+Dumps are JSON (a list of cards, or an API response with a "data" list)
+or JSON Lines, one card per line. Each card is reduced to a CatalogCard
+the way public/js/modules/api.js cleans search results.
+"""
+
+import os
+import re
+import json
+import time
+import math
+import heapq
+import argparse
+import unicodedata
+from array import array
+from collections import Counter, namedtuple
+
+# --- Configuration ---
+# Lowest score (0..1, 1 = same normalized name) a match is accepted with
+ACCEPT_SCORE = 0.85
+# Lowest score a name is kept as a candidate with
+CANDIDATE_SCORE = 0.6
+# Lowest trigram (Dice) similarity a name is considered with
+MIN_DICE = 0.4
+# Names with the highest trigram similarity that are verified by edit distance
+VERIFY_LIMIT = 10
+# Candidates kept per row
+CANDIDATE_LIMIT = 5
+# --- End Configuration ---
+
+CatalogCard = namedtuple('CatalogCard', 'api_id game name set set_name collector_number rarity')
+Candidate = namedtuple('Candidate', 'score card')
+Resolution = namedtuple('Resolution', 'status candidates')
+
+_FOLD = str.maketrans({'æ': 'ae', 'œ': 'oe', 'ß': 'ss', 'ø': 'o', 'ł': 'l', '&': ' and '})
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+def normalize_name(name):
+    """Returns the comparison form of a card name: ASCII-folded, lowercase, punctuation as single spaces."""
+    name = unicodedata.normalize('NFKD', name.lower().translate(_FOLD))
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    # Apostrophes join words ("Urza's" -> "urzas")
+    name = name.replace("'", '').replace('’', '')
+    return _NON_WORD_RE.sub(' ', name).strip()
+
+def normalize_number(number):
+    """Returns the comparison form of a collector number ('007' and '7' are the same card)."""
+    number = str(number or '').strip().lower()
+    return number.lstrip('0') or number
+
+def trigrams(text):
+    """Returns the set of trigrams of a normalized name, padded so short names have some."""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit):
+    """Returns the Levenshtein distance of two strings, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def name_score(query, name):
+    """Returns 1 - normalized edit distance of two normalized names (0 if too different to matter)."""
+    longest = max(len(query), len(name)) or 1
+    limit = int(longest * (1 - CANDIDATE_SCORE))
+    distance = edit_distance(query, name, limit)
+    return 0.0 if distance > limit else 1 - distance / longest
+
+def catalog_card(card, game=None):
+    """Reduces a ScryDex or JustTCG card object to a CatalogCard (as api.js cleans search results)."""
+    expansion = card.get('expansion') or card.get('set') or {}
+    if not isinstance(expansion, dict):
+        expansion = {'id': expansion}
+    return CatalogCard(
+        api_id=str(card.get('id') or card.get('api_id') or ''),
+        game=card.get('game') or game or '',
+        name=card.get('name') or card.get('Name') or '',
+        set=str(expansion.get('code') or expansion.get('id') or card.get('set_code') or '').upper(),
+        set_name=expansion.get('name') or card.get('set_name') or '',
+        collector_number=str(card.get('number') or card.get('collector_number') or card.get('localId') or ''),
+        rarity=card.get('rarity') or '',
+    )
+
+def iter_dump(dump_path):
+    """
+    Yields the card objects of a catalog dump: JSON (a list, or
+    {"data": [...]}), or JSON Lines if the file ends in .jsonl/.ndjson.
+    """
+    with open(dump_path, 'r', encoding='utf-8') as f:
+        if dump_path.endswith(('.jsonl', '.ndjson')):
+            yield from (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+            yield from (data.get('data', []) if isinstance(data, dict) else data)
+
+def read_dump(dump_path, game=None):
+    """Yields the CatalogCards of a catalog dump (see iter_dump), skipping cards without an id or name."""
+    for card in iter_dump(dump_path):
+        record = catalog_card(card, game)
+        if record.api_id and record.name:
+            yield record
+
+class CardNameIndex:
+    """
+    Trigram index over the card names of a catalog.
+
+    Attributes:
+        cards (list): CatalogCard for every printing.
+        names (list): The distinct normalized names; a name id is a position here.
+        name_ids (dict): normalized name -> name id.
+        printings (list): name id -> indices into cards.
+        gram_counts (array): name id -> number of trigrams of the name.
+        postings (dict): trigram -> array of name ids containing it.
+        by_key (dict): (normalized name, set code, number) -> card index.
+        by_set_number (dict): (set code, number) -> card indices.
+    """
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.names = []
+        self.name_ids = {}
+        self.printings = []
+        self.gram_counts = array('H')
+        self.postings = {}
+        self.by_key = {}
+        self.by_set_number = {}
+        for card in cards:
+            self.add(card)
+
+    @classmethod
+    def from_dump(cls, dump_path, game=None):
+        return cls(read_dump(dump_path, game))
+
+    def add(self, card):
+        """Adds one printing to the index."""
+        index = len(self.cards)
+        self.cards.append(card)
+        name = normalize_name(card.name)
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            self.printings.append([])
+            grams = trigrams(name)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, array('I')).append(name_id)
+        self.printings[name_id].append(index)
+        set_number = (card.set.upper(), normalize_number(card.collector_number))
+        self.by_key[(name,) + set_number] = index
+        self.by_set_number.setdefault(set_number, []).append(index)
+
+    def similar_names(self, name, limit=VERIFY_LIMIT):
+        """
+        Returns (score, name id) for the names closest to a normalized name,
+        best first: the limit names with the highest trigram (Dice)
+        similarity, verified by edit distance.
+        """
+        exact = self.name_ids.get(name)
+        if exact is not None:
+            return [(1.0, exact)]
+        grams = trigrams(name)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        # Dice >= MIN_DICE needs at least this many shared trigrams, which
+        # rules out most names before any similarity is computed
+        needed = math.ceil(MIN_DICE * len(grams) / (2 - MIN_DICE))
+        gram_counts = self.gram_counts
+        closest = heapq.nlargest(limit, ((2 * count / (len(grams) + gram_counts[name_id]), name_id)
+                                         for name_id, count in shared.items() if count >= needed))
+        scored = []
+        for dice, name_id in closest:
+            if dice < MIN_DICE:
+                break
+            score = name_score(name, self.names[name_id])
+            if score:
+                scored.append((score, name_id))
+        scored.sort(key=lambda item: -item[0])
+        return scored
+
+    def resolve(self, name, set_code='', number='', set_name=''):
+        """
+        Resolves one imported row to a printing.
+
+        Returns:
+            Resolution: status 'matched', 'ambiguous' or 'unmatched', and the
+                ranked Candidates (at most CANDIDATE_LIMIT).
+        """
+        query = normalize_name(name)
+        set_code = (set_code or '').upper()
+        number = normalize_number(number)
+
+        index = self.by_key.get((query, set_code, number))
+        if index is not None:
+            return Resolution('matched', [Candidate(1.0, self.cards[index])])
+
+        if set_code and number:
+            same_printing = [
+                Candidate(name_score(query, normalize_name(self.cards[index].name)), self.cards[index])
+                for index in self.by_set_number.get((set_code, number), [])
+            ]
+            same_printing = sorted((c for c in same_printing if c.score >= ACCEPT_SCORE), key=lambda c: -c.score)
+            if same_printing:
+                return Resolution('matched', same_printing[:1])
+
+        candidates = []
+        for score, name_id in self.similar_names(query):
+            printings = [self.cards[index] for index in self.printings[name_id]]
+            # The row's set narrows a name down to its printings there
+            in_set = [card for card in printings
+                      if (set_code and card.set == set_code)
+                      or (set_name and card.set_name.lower() == set_name.lower())]
+            in_set_number = [card for card in in_set if number and normalize_number(card.collector_number) == number]
+            for card in in_set_number or in_set or printings:
+                candidates.append(Candidate(score, card))
+            if len(candidates) >= CANDIDATE_LIMIT:
+                break
+        candidates = candidates[:CANDIDATE_LIMIT]
+        if not candidates:
+            return Resolution('unmatched', [])
+        best = candidates[0]
+        runner_up = candidates[1] if len(candidates) > 1 else None
+        if best.score >= ACCEPT_SCORE and (runner_up is None or runner_up.score < best.score):
+            return Resolution('matched', candidates[:1])
+        return Resolution('ambiguous', candidates)
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve card names against a local catalog dump')
+    parser.add_argument('dump', help='Catalog dump: JSON list, {"data": [...]} or JSON Lines of cards')
+    parser.add_argument('--game', help='Game of the dump, for cards that do not name it')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--query', '-q', nargs='+', metavar='NAME', help='Print the ranked candidates for these names')
+    group.add_argument('--csv', help='Resolve every row of a collection CSV export and print the totals')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.dump):
+        print(f"ERROR: Catalog dump '{args.dump}' not found.")
+        return False
+
+    start = time.perf_counter()
+    index = CardNameIndex.from_dump(args.dump, args.game)
+    print(f"Indexed {len(index.cards)} printing(s) of {len(index.names)} name(s) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    if args.query:
+        for name in args.query:
+            resolution = index.resolve(name)
+            print(f"\n{name!r}: {resolution.status}")
+            for candidate in resolution.candidates:
+                card = candidate.card
+                print(f"  {candidate.score:.2f}  {card.name} ({card.set} {card.collector_number}) [{card.api_id}]")
+        return True
+
+    from collection_import import ImportReport, read_chunks
+    report = ImportReport()
+    statuses = Counter()
+    start = time.perf_counter()
+    try:
+        for chunk in read_chunks(args.csv, report):
+            for card in chunk.values():
+                statuses[index.resolve(card['name'], card['set'], card['collector_number'],
+                                       card['set_name']).status] += 1
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return False
+    elapsed = time.perf_counter() - start
+    resolved = sum(statuses.values())
+    print("-" * 40)
+    for status in ('matched', 'ambiguous', 'unmatched'):
+        print(f"{status.capitalize() + ':':<12}{statuses[status]}")
+    if resolved:
+        print(f"Per row:    {elapsed / resolved * 1e6:.0f} µs (CSV parsing included)")
+    print(f"API lookups needed: {statuses['ambiguous'] + statuses['unmatched']} instead of {resolved}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Vectorized collection valuation behind getCollectionPriceAnalytics.
+
+getCollectionPriceAnalytics awaits getCardPriceHistory for every card of a
+collection, one after the other, and adds the totals up in JS: thousands
+of Firestore reads and seconds of latency for a large collection, on every
+dashboard load. This module values a whole collection against the
+price_history.py arrays in one pass: every price the analytics need (today
+and PERIODS days ago, for every series) comes out of one window of the
+store, and the collection is a set of arrays (series column, quantity,
+set) that index into it. Totals, deltas and per-set breakdowns are sums
+over those arrays, and top movers are one sort per period.
+
+Collection cards are matched to price series the way the callable does:
+the card ID is api_id, cardId or id; foil cards use the foil variants and
+the other cards the normal ones (FOIL_VARIANTS, NORMAL_VARIANTS), in the
+card's condition and then in NM. A card with no series keeps its
+prices.usd, unchanged over every period.
+
+The nightly run materializes every user's analytics as one document,
+users/{uid}/analytics/collectionPrices, which getCollectionPriceAnalytics
+returns while it is fresh instead of recomputing:
+
+    {"totalValue": ..., "processedCards": ..., "pricedThrough": "2025-01-31",
+     "periods": {"30": {"valueChange": ..., "percentChange": ...,
+                        "topGainers": [...], "topLosers": [...]}, ...},
+     "sets": [{"set": ..., "setName": ..., "quantity": ..., "value": ...,
+               "changes": {"30": ..., ...}}, ...],
+     "timestamp": ...}
+
+The per-card list is left out of the document, which Firestore limits to
+1 MiB. Collections are read from JSON Lines, one document per line, either
+as exported ({"path": "users/<uid>/collection/<id>", "data": {...}}) or as
+bare documents of one user (--user). The output is the same kind of
+Firestore write batches as collection_import.py writes.
+
+The nightly run goes after dailyPriceCollection (06:00 UTC), e.g. from
+cron, with firestore_batches.py moving the data in and out of Firestore:
+
+    python firestore_batches.py export daily --since "$(date -u -d yesterday +%F)" -o snapshots.jsonl
+    python price_history.py ingest snapshots.jsonl
+    python firestore_batches.py export collection -o collections.jsonl
+    python collection_analytics.py collections.jsonl
+    python firestore_batches.py apply collection_analytics.jsonl
+
+The document's timestamp is when the user's collection was read for it:
+the earliest readTime of the user's exported documents (the time of the run
+for bare documents). A write to a card that counts toward a collection's
+value records an invalidatedAt time next to it
+(invalidateCollectionAnalytics in functions/index.js), and the callable
+recomputes while the document is older than that, so an edit made after the
+export is never hidden by the run that applies afterwards.
+"""
+
+import os
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from price_history import PriceHistory, STORE_DIR
+from collection_import import BATCH_LIMIT, CONDITION_TABLE, normalize_key
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_FILE = os.path.join(ROOT_DIR, 'collection_analytics.jsonl')
+
+# Periods of the deltas and top movers, in days (the dashboards ask for 30 and 180)
+PERIODS = (7, 30, 90, 180)
+DEFAULT_DAYS = 30
+# Gainers and losers listed per period
+TOP_MOVERS = 5
+# Price variants tried for foil and for normal cards, in order
+FOIL_VARIANTS = ['holofoil', 'foil', 'reverseHolofoil', 'default']
+NORMAL_VARIANTS = ['default', 'normal', 'unlimited', '1stEditionNormal']
+# Collection condition -> the condition code of the price snapshots
+CONDITION_CODES = {
+    'Mint': 'NM',
+    'Near Mint': 'NM',
+    'Lightly Played': 'LP',
+    'Moderately Played': 'MP',
+    'Heavily Played': 'HP',
+    'Damaged': 'DM',
+}
+# Where each user's analytics are materialized, under users/{uid}/
+ANALYTICS_DOC = 'analytics/collectionPrices'
+# --- End Configuration ---
+
+def card_id(doc):
+    """Returns a collection document's card ID, as getCollectionPriceAnalytics reads it."""
+    return doc.get('api_id') or doc.get('cardId') or doc.get('id')
+
+def series_column(index, doc):
+    """Returns the price-history column of a collection document, or -1 if it has none."""
+    api_id = card_id(doc)
+    condition, _ = CONDITION_TABLE.get(normalize_key(doc.get('condition') or ''), (None, False))
+    code = CONDITION_CODES.get(condition, 'NM')
+    variants = FOIL_VARIANTS if doc.get('is_foil') else NORMAL_VARIANTS
+    for condition_code in dict.fromkeys([code, 'NM']):
+        for variant in variants:
+            column = index.get((api_id, variant, condition_code))
+            if column is not None:
+                return column
+    return -1
+
+def _fallback_price(doc):
+    try:
+        return float((doc.get('prices') or {}).get('usd'))
+    except (TypeError, ValueError):
+        return np.nan
+
+class PricePoints:
+    """
+    The latest market price of every series and its price PERIODS days
+    before, read from one window of the store.
+
+    A price is the last one recorded on or before the day. A series that
+    starts within a period is compared with its first price, as
+    getCardPriceHistory's oldest entry was.
+
+    Attributes:
+        end (numpy.datetime64): The day the prices are for.
+        current (numpy.ndarray): Latest price per column, NaN if none.
+        previous (numpy.ndarray): (len(periods), columns) earlier prices.
+        currency (numpy.ndarray): Currency per column.
+
+    Every array has one more entry than there are series, with no price,
+    so that column -1 reads as unpriced.
+    """
+
+    def __init__(self, store, end=None, periods=PERIODS):
+        self.periods = tuple(periods)
+        dates = store.dates(end, max(self.periods) + 1)
+        self.end = dates[-1]
+        # The extra row (column -1) is all NaN, for cards without a series
+        market = store.window(np.append(np.arange(len(store.series)), -1), dates, 'market')
+
+        # Forward and backward fill by carrying the index of the last/next recorded day
+        recorded = ~np.isnan(market)
+        positions = np.arange(len(dates))
+        last = np.maximum.accumulate(np.where(recorded, positions, 0), axis=1)
+        following = np.minimum.accumulate(np.where(recorded, positions, len(dates) - 1)[:, ::-1], axis=1)[:, ::-1]
+        rows = np.arange(len(market))[:, None]
+        filled = market[rows, last]
+        first = market[rows, following]
+
+        self.current = filled[:, -1]
+        back = np.array([len(dates) - 1 - period for period in self.periods])
+        self.previous = np.where(np.isnan(filled[:, back]), first[:, back], filled[:, back]).T
+        self.currency = np.array([series[3] for series in store.series] + ['USD'], dtype=object)
+
+def analyze(docs, store, points, days=DEFAULT_DAYS, include_cards=True):
+    """
+    Values a collection and its changes over every period.
+
+    Args:
+        docs (list): Collection documents (users/{uid}/collection).
+        store (PriceHistory): The price-history store the points come from.
+        points (PricePoints): Prices of the store's series.
+        days (int): Period of the top-level deltas and movers; one of points.periods.
+        include_cards (bool): Whether to list every priced card, as the callable does.
+
+    Returns:
+        dict: getCollectionPriceAnalytics' result, plus 'periods' (the
+            deltas and movers of every period) and 'sets'.
+
+    Raises:
+        ValueError: If days is not one of the computed periods.
+    """
+    if days not in points.periods:
+        raise ValueError(f'No prices for a {days}-day period (computed: {", ".join(map(str, points.periods))})')
+    docs = [doc for doc in docs if card_id(doc)]
+    columns = np.array([series_column(store.index, doc) for doc in docs], dtype=np.int64)
+    quantity = np.array([max(int(doc.get('quantity') or 1), 1) for doc in docs], dtype=np.float64)
+    fallback = np.array([_fallback_price(doc) for doc in docs], dtype=np.float64)
+
+    current = points.current[columns]
+    has_series = ~np.isnan(current)
+    current = np.where(has_series, current, fallback)
+    priced = ~np.isnan(current)
+    previous = points.previous[:, columns]
+    previous = np.where(np.isnan(previous), current, previous)
+    currency = np.where(has_series, points.currency[columns], 'USD')
+
+    # Row 0 is today's value, row 1 + p the value PERIODS[p] days ago
+    values = np.where(priced, np.vstack([current, previous]) * quantity, 0.0)
+    totals = values.sum(axis=1)
+    change = current - previous
+    percent = np.where(previous > 0, change / np.where(previous > 0, previous, 1) * 100, 0.0)
+
+    sets = [str(doc.get('set') or doc.get('set_name') or '') for doc in docs]
+    set_keys, set_index = np.unique(np.array(sets, dtype=object), return_inverse=True)
+    set_values = np.zeros((len(values), len(set_keys)))
+    np.add.at(set_values, (slice(None), set_index), values)
+    set_quantity = np.bincount(set_index, weights=np.where(priced, quantity, 0), minlength=len(set_keys))
+    set_names = {}
+    for key, doc in zip(sets, docs):
+        set_names.setdefault(key, doc.get('set_name') or key)
+
+    def card(i, p):
+        doc = docs[i]
+        return {
+            'cardId': card_id(doc),
+            'name': doc.get('name') or doc.get('cardName'),
+            'currentPrice': round(float(current[i]), 2),
+            'previousPrice': round(float(previous[p, i]), 2),
+            'priceChange': round(float(change[p, i]), 2),
+            'percentChange': round(float(percent[p, i]), 2),
+            'currency': currency[i],
+            'imageUrl': doc.get('imageUrl') or (doc.get('image_uris') or {}).get('normal')
+                        or (doc.get('image_uris') or {}).get('small'),
+        }
+
+    periods = {}
+    for p, period in enumerate(points.periods):
+        gainers = np.flatnonzero(priced & (change[p] > 0))
+        losers = np.flatnonzero(priced & (change[p] < 0))
+        gainers = gainers[np.argsort(-percent[p, gainers], kind='stable')][:TOP_MOVERS]
+        losers = losers[np.argsort(percent[p, losers], kind='stable')][:TOP_MOVERS]
+        value_change = totals[0] - totals[1 + p]
+        periods[str(period)] = {
+            'valueChange': round(float(value_change), 2),
+            'percentChange': round(float(value_change / totals[1 + p] * 100), 2) if totals[1 + p] > 0 else 0,
+            'topGainers': [card(i, p) for i in gainers],
+            'topLosers': [card(i, p) for i in losers],
+        }
+
+    order = np.argsort(-set_values[0], kind='stable')
+    result = {
+        'success': True,
+        'totalValue': round(float(totals[0]), 2),
+        **periods[str(days)],
+        'period': f'{days} days',
+        'processedCards': int(priced.sum()),
+        'pricedThrough': str(points.end),
+        'periods': periods,
+        'sets': [
+            {
+                'set': str(set_keys[s]),
+                'setName': set_names[set_keys[s]],
+                'quantity': int(set_quantity[s]),
+                'value': round(float(set_values[0, s]), 2),
+                'changes': {str(period): round(float(set_values[0, s] - set_values[1 + p, s]), 2)
+                            for p, period in enumerate(points.periods)},
+            }
+            for s in order if set_quantity[s]
+        ],
+        'timestamp': _utc_timestamp(datetime.now(timezone.utc)),
+    }
+    if include_cards:
+        p = points.periods.index(days)
+        result['cards'] = [card(i, p) for i in np.flatnonzero(priced)]
+    return result
+
+def _utc_timestamp(value):
+    return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def read_collections(path, user_id=None):
+    """
+    Reads collection documents from JSON Lines.
+
+    Returns:
+        tuple: (user ID -> list of collection documents,
+                user ID -> earliest readTime of its exported documents)
+
+    Raises:
+        ValueError: If a bare document is found and no user_id was given.
+    """
+    collections = defaultdict(list)
+    read_times = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            parts = str(record.get('path', '')).split('/')
+            if len(parts) == 4 and parts[0] == 'users' and parts[2] == 'collection':
+                collections[parts[1]].append(record.get('data') or {})
+                if record.get('readTime'):
+                    read_time = datetime.fromisoformat(record['readTime'])
+                    read_times[parts[1]] = min(read_times.get(parts[1], read_time), read_time)
+            elif user_id:
+                collections[user_id].append(record)
+            else:
+                raise ValueError(f'{path}:{line_number}: not a users/<uid>/collection document; pass --user')
+    return collections, read_times
+
+def materialize(collections, store, output_path, end=None, batch_limit=BATCH_LIMIT, read_times=None):
+    """
+    Writes every user's analytics document as Firestore write batches.
+
+    Args:
+        read_times (dict): user ID -> when its collection was read, the
+            timestamp of its document (default: now).
+
+    Returns:
+        int: Number of users written.
+    """
+    points = PricePoints(store, end)
+    ops = []
+    for user_id, docs in collections.items():
+        data = analyze(docs, store, points, include_cards=False)
+        if read_times and user_id in read_times:
+            data['timestamp'] = _utc_timestamp(read_times[user_id])
+        ops.append({'op': 'set', 'path': f'users/{user_id}/{ANALYTICS_DOC}', 'data': data})
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for count, start in enumerate(range(0, len(ops), batch_limit)):
+            f.write(json.dumps({'batch': count, 'ops': ops[start:start + batch_limit]}) + '\n')
+    return len(ops)
+
+def main():
+    parser = argparse.ArgumentParser(description='Value collections against the price-history store')
+    parser.add_argument('collections', help='JSON Lines of collection documents')
+    parser.add_argument('--user', help='User ID of bare collection documents')
+    parser.add_argument('--store', default=STORE_DIR, help='Price-history directory (default: .price_history)')
+    parser.add_argument('--end', help='Value as of this date (YYYY-MM-DD; default: the last stored day)')
+    parser.add_argument('--output', '-o', default=OUTPUT_FILE,
+                        help='Write batches of analytics documents (default: collection_analytics.jsonl)')
+    parser.add_argument('--print', dest='print_user', metavar='UID',
+                        help="Print one user's analytics, like getCollectionPriceAnalytics, instead of writing")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='Period of the printed analytics')
+    args = parser.parse_args()
+
+    try:
+        store = PriceHistory(args.store)
+        collections, read_times = read_collections(args.collections, args.user)
+        if args.print_user:
+            points = PricePoints(store, args.end, sorted(set(PERIODS) | {args.days}))
+            result = analyze(collections.get(args.print_user, []), store, points, args.days)
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+            return True
+        if store.start is None:
+            print(f"ERROR: The price-history store '{args.store}' is empty.")
+            return False
+        users = materialize(collections, store, args.output, args.end, read_times=read_times)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return False
+
+    print("-" * 40)
+    print(f"Users: {users}")
+    print(f"Cards: {sum(len(docs) for docs in collections.values())}")
+    print(f"Prices through: {store.start + store.days - 1 if args.end is None else args.end}")
+    print(f"Wrote: {args.output}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Streaming importer for collection CSV exports (ManaBox, TCGplayer, ...).
+
+The browser import (public/js/modules/csv.js) reads the whole file, splits
+it on newlines and keeps every row in memory, which freezes the tab on a
+100k-row export. This importer reads the CSV with the csv module, CHUNK_ROWS
+rows at a time, so memory stays bounded by one chunk whatever the file size.
+
+The columns are found from the header row, with the same aliases as csv.js
+(HEADER_ALIASES). ManaBox's own schema, as in test-manabox.csv, is:
+
+    Name,Quantity,Set Name,Card Number,Condition,Language,Foil
+
+Condition, language and foil values go through lookup tables built once at
+import time (CONDITIONS, LANGUAGES, FOIL_VALUES): every spelling the
+exports use ('NM', 'near_mint', 'Near Mint Foil', 'en', 'jp', 'foil',
+'etched', ...) maps straight to the app's value. A card number of the form
+'M11-146' carries the set code when the file has no set code column.
+
+Rows for the same printing (name, set, number, condition, language, foil)
+are merged, and each printing becomes one document of
+users/{uid}/collection with an ID derived from those fields, so importing
+the same file twice does not duplicate cards. The output is a JSON Lines
+file of Firestore write batches, each within Firestore's limit of
+BATCH_LIMIT writes per batch:
+
+    {"batch": 0, "ops": [{"op": "set", "path": "users/<uid>/collection/<id>", "data": {...}}, ...]}
+
+A printing that shows up again in a later chunk is written as an
+"increment" of its quantity. Rows that cannot be imported (no name, bad
+quantity) are reported with their line number.
+"""
+
+import re
+import csv
+import json
+import time
+import hashlib
+import argparse
+from itertools import islice
+
+# --- Configuration ---
+# Rows read and normalized at a time
+CHUNK_ROWS = 5000
+# Firestore commits at most 500 writes per batch
+BATCH_LIMIT = 500
+# Keep each batch well under Firestore's 10 MiB request size
+BATCH_MAX_BYTES = 8 * 1024 * 1024
+
+# Header names for each field, matched as substrings of the lowercased header (as in csv.js)
+HEADER_ALIASES = {
+    'name': ['name', 'card'],
+    'quantity': ['quantity', 'qty', 'count'],
+    'set_name': ['set name', 'edition name'],
+    'set': ['set code', 'set'],
+    'collector_number': ['card number', 'collector number'],
+    'condition': ['condition'],
+    'language': ['language'],
+    'is_foil': ['foil', 'printing'],
+}
+
+# Canonical condition -> the spellings used by the exports
+CONDITIONS = {
+    'Mint': ['mint', 'm'],
+    'Near Mint': ['near mint', 'nm', 'nm-m', 'near mint-mint'],
+    'Lightly Played': ['lightly played', 'light played', 'lp', 'excellent', 'ex', 'slightly played', 'sp'],
+    'Moderately Played': ['moderately played', 'mp', 'played', 'pl', 'good', 'gd'],
+    'Heavily Played': ['heavily played', 'hp'],
+    'Damaged': ['damaged', 'dmg', 'poor', 'po'],
+}
+DEFAULT_CONDITION = 'Near Mint'
+
+# Canonical language -> the codes and names used by the exports
+LANGUAGES = {
+    'English': ['english', 'en'],
+    'Japanese': ['japanese', 'ja', 'jp'],
+    'German': ['german', 'de'],
+    'French': ['french', 'fr'],
+    'Italian': ['italian', 'it'],
+    'Spanish': ['spanish', 'es'],
+    'Portuguese': ['portuguese', 'pt'],
+    'Russian': ['russian', 'ru'],
+    'Korean': ['korean', 'ko', 'kr'],
+    'Chinese Simplified': ['chinese simplified', 'simplified chinese', 'zhs', 'zh-hans', 'cs'],
+    'Chinese Traditional': ['chinese traditional', 'traditional chinese', 'zht', 'zh-hant', 'ct'],
+}
+DEFAULT_LANGUAGE = 'English'
+
+# Foil column values that mean foil (anything else is non-foil)
+FOIL_VALUES = ['true', 'yes', 'y', '1', 'foil', 'etched', 'etched foil', 'holo', 'holofoil', 'reverse holofoil']
+# --- End Configuration ---
+
+_SPACES_RE = re.compile(r'[\s_]+')
+_SET_NUMBER_RE = re.compile(r'^([A-Za-z0-9]{2,6})-(\S+)$')
+
+def normalize_key(value):
+    """Returns the lookup key of a CSV value: lowercased, with '_' and runs of whitespace as one space."""
+    return _SPACES_RE.sub(' ', value.strip().lower())
+
+def _condition_table():
+    # TCGplayer puts the printing in the condition ('Near Mint Foil')
+    table = {}
+    for condition, spellings in CONDITIONS.items():
+        for spelling in spellings + [condition.lower()]:
+            table[spelling] = (condition, False)
+            table[f'{spelling} foil'] = (condition, True)
+            table[f'{spelling} holofoil'] = (condition, True)
+    table[''] = (DEFAULT_CONDITION, False)
+    return table
+
+def _language_table():
+    table = {spelling: language for language, spellings in LANGUAGES.items()
+             for spelling in spellings + [language.lower()]}
+    table[''] = DEFAULT_LANGUAGE
+    return table
+
+CONDITION_TABLE = _condition_table()
+LANGUAGE_TABLE = _language_table()
+FOIL_TABLE = frozenset(FOIL_VALUES)
+
+class ImportReport:
+    """
+    Counters for one import.
+
+    Attributes:
+        rows (int): Data rows read.
+        printings (int): Distinct printings written.
+        rejected (list): (line number, reason) for every row left out.
+        unknown (dict): field -> {raw value: count} for values no lookup table knows;
+            they are imported as they are.
+        resolved (dict): Resolution status -> printings, with a catalog index.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.printings = 0
+        self.rejected = []
+        self.unknown = {'condition': {}, 'language': {}}
+        self.resolved = {}
+
+    def note_unknown(self, field, value):
+        counts = self.unknown[field]
+        counts[value] = counts.get(value, 0) + 1
+
+def map_headers(header_row):
+    """
+    Returns the column index of each field (-1 when absent).
+
+    Raises:
+        ValueError: If there is no name column.
+    """
+    headers = [normalize_key(header.replace('"', '')) for header in header_row]
+    columns = {}
+    for field, aliases in HEADER_ALIASES.items():
+        free = [(index, header) for index, header in enumerate(headers) if index not in columns.values()]
+        # 'name' is a substring of 'set name', so exact matches win over substrings
+        exact = [index for alias in aliases for index, header in free if header == alias]
+        partial = [index for alias in aliases for index, header in free if alias in header]
+        columns[field] = (exact or partial or [-1])[0]
+    if columns['name'] == -1:
+        raise ValueError('Could not find a "Name" or "Card" column in the CSV.')
+    return columns
+
+def normalize_row(row, columns, report):
+    """
+    Returns a row as collection fields. Values the lookup tables do not
+    know are kept as they are and counted in the report.
+
+    Raises:
+        ValueError: With the reason the row is rejected.
+    """
+    def cell(field):
+        index = columns[field]
+        return row[index].strip() if 0 <= index < len(row) else ''
+
+    name = cell('name')
+    if not name:
+        raise ValueError('no card name')
+    quantity_raw = cell('quantity')
+    try:
+        quantity = int(quantity_raw) if quantity_raw else 1
+    except ValueError:
+        raise ValueError(f'quantity {quantity_raw!r} is not a whole number')
+    if quantity < 1:
+        raise ValueError(f'quantity {quantity} is below 1')
+
+    set_code = cell('set')
+    number = cell('collector_number')
+    if not set_code:
+        match = _SET_NUMBER_RE.match(number)
+        if match:
+            set_code, number = match.groups()
+
+    condition_raw = cell('condition')
+    condition, condition_foil = CONDITION_TABLE.get(normalize_key(condition_raw), (None, False))
+    if condition is None:
+        condition = condition_raw
+        report.note_unknown('condition', condition_raw)
+    language_raw = cell('language')
+    language = LANGUAGE_TABLE.get(normalize_key(language_raw))
+    if language is None:
+        language = language_raw
+        report.note_unknown('language', language_raw)
+
+    return {
+        'name': name,
+        'quantity': quantity,
+        'set_name': cell('set_name'),
+        'set': set_code.upper(),
+        'collector_number': number,
+        'condition': condition,
+        'language': language,
+        'is_foil': condition_foil or normalize_key(cell('is_foil')) in FOIL_TABLE,
+    }
+
+def printing_id(card):
+    """Returns the document ID of a printing: a hash of the fields that tell printings apart."""
+    key = '\x1f'.join([card['name'].lower(), card['set'], card['collector_number'].lower(),
+                       card['condition'], card['language'], '1' if card['is_foil'] else '0'])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def read_chunks(csv_path, report, chunk_rows=CHUNK_ROWS):
+    """
+    Reads a CSV export chunk by chunk.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        report (ImportReport): Receives the row counts and rejected rows.
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        dict: printing ID -> card fields for one chunk, with the quantities
+            of repeated printings in that chunk added up.
+
+    Raises:
+        ValueError: If the file has no header row or no name column.
+    """
+    # utf-8-sig drops the BOM some exporters write
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError('The CSV file is empty.')
+        columns = map_headers(header)
+        # line_num is read as each row is produced, since a chunk is read ahead
+        numbered = ((reader.line_num, row) for row in reader)
+        while True:
+            rows = list(islice(numbered, chunk_rows))
+            if not rows:
+                return
+            chunk = {}
+            for line, row in rows:
+                if not any(cell.strip() for cell in row):
+                    continue
+                report.rows += 1
+                try:
+                    card = normalize_row(row, columns, report)
+                except ValueError as e:
+                    report.rejected.append((line, str(e)))
+                    continue
+                doc_id = printing_id(card)
+                if doc_id in chunk:
+                    chunk[doc_id]['quantity'] += card['quantity']
+                else:
+                    chunk[doc_id] = card
+            yield chunk
+
+def write_batches(chunks, user_id, report, batch_limit=BATCH_LIMIT, max_bytes=BATCH_MAX_BYTES):
+    """
+    Turns the chunks into Firestore write batches.
+
+    A printing's first occurrence is a 'set' of its document; later
+    occurrences (in later chunks) are an 'increment' of its quantity.
+
+    Yields:
+        dict: {'batch': n, 'ops': [...]} with at most batch_limit ops.
+    """
+    written = set()
+    ops, size, count = [], 0, 0
+    for chunk in chunks:
+        for doc_id, card in chunk.items():
+            path = f'users/{user_id}/collection/{doc_id}'
+            if doc_id in written:
+                op = {'op': 'increment', 'path': path, 'field': 'quantity', 'by': card['quantity']}
+            else:
+                written.add(doc_id)
+                op = {'op': 'set', 'path': path, 'data': dict(card, source='csv-import')}
+            op_size = len(json.dumps(op))
+            if ops and (len(ops) == batch_limit or size + op_size > max_bytes):
+                yield {'batch': count, 'ops': ops}
+                ops, size, count = [], 0, count + 1
+            ops.append(op)
+            size += op_size
+    report.printings = len(written)
+    if ops:
+        yield {'batch': count, 'ops': ops}
+
+def resolve_chunks(chunks, index, report):
+    """
+    Resolves the printings of each chunk against a card_index.CardNameIndex.
+
+    Matched cards get their api_id and game. The others get needs_lookup,
+    and the ambiguous ones the api_ids of their ranked candidates, so only
+    they go to the searchScryDex API.
+
+    Yields:
+        dict: The chunks, with the cards updated in place.
+    """
+    for chunk in chunks:
+        for card in chunk.values():
+            resolution = index.resolve(card['name'], card['set'], card['collector_number'], card['set_name'])
+            report.resolved[resolution.status] = report.resolved.get(resolution.status, 0) + 1
+            if resolution.status == 'matched':
+                match = resolution.candidates[0].card
+                card['api_id'] = match.api_id
+                if match.game:
+                    card['game'] = match.game
+            else:
+                card['needs_lookup'] = True
+                if resolution.candidates:
+                    card['candidates'] = [candidate.card.api_id for candidate in resolution.candidates]
+        yield chunk
+
+def import_csv(csv_path, user_id, output_path, chunk_rows=CHUNK_ROWS, index=None):
+    """
+    Streams a CSV export into a JSON Lines file of write batches.
+
+    Args:
+        index (card_index.CardNameIndex): If given, resolve every printing
+            against this local catalog index (see resolve_chunks).
+
+    Returns:
+        tuple: (ImportReport, number of batches written)
+    """
+    report = ImportReport()
+    batches = 0
+    chunks = read_chunks(csv_path, report, chunk_rows)
+    if index is not None:
+        chunks = resolve_chunks(chunks, index, report)
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for batch in write_batches(chunks, user_id, report):
+            out.write(json.dumps(batch, ensure_ascii=False, separators=(',', ':')) + '\n')
+            batches += 1
+    return report, batches
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a collection CSV export into Firestore write batches')
+    parser.add_argument('csv_file', help='ManaBox/TCGplayer-style CSV export')
+    parser.add_argument('--user', required=True, help='UID of the user whose collection receives the cards')
+    parser.add_argument('--output', '-o', default='collection_import.jsonl',
+                        help='JSON Lines file of write batches (default: collection_import.jsonl)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help=f'Rows read at a time (default: {CHUNK_ROWS})')
+    parser.add_argument('--catalog', metavar='DUMP',
+                        help='Resolve the cards against this local catalog dump (see card_index.py)')
+    parser.add_argument('--game', help='With --catalog, the game of dump cards that do not name it')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        index = None
+        if args.catalog:
+            from card_index import CardNameIndex
+            index = CardNameIndex.from_dump(args.catalog, args.game)
+        report, batches = import_csv(args.csv_file, args.user, args.output, args.chunk_rows, index)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return False
+    elapsed = time.perf_counter() - start
+
+    for line, reason in report.rejected[:20]:
+        print(f"⚠️  Line {line}: {reason}")
+    if len(report.rejected) > 20:
+        print(f"⚠️  ... and {len(report.rejected) - 20} more rejected row(s)")
+    for field, counts in report.unknown.items():
+        if counts:
+            values = ', '.join(f"{value!r} x{count}" for value, count in sorted(counts.items()))
+            print(f"NOTE: Unknown {field} value(s), imported as they are: {values}")
+
+    print("-" * 40)
+    print(f"Rows read:        {report.rows} ({report.rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    print(f"Rows rejected:    {len(report.rejected)}")
+    print(f"Printings:        {report.printings}")
+    if report.resolved:
+        print(f"Resolved locally: {report.resolved.get('matched', 0)} "
+              f"(ambiguous: {report.resolved.get('ambiguous', 0)}, unmatched: {report.resolved.get('unmatched', 0)})")
+    print(f"Write batches:    {batches} (at most {BATCH_LIMIT} writes each) -> {args.output}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Critical-CSS inlining for the pages in public/.
+
+Each page's above-the-fold shell (the header and sidebar injected from the
+templates, see SHELL_SELECTORS) is cut out of the page together with the
+layout elements around it. The rules of the page's local stylesheets that
+match that shell are inlined into a <style data-critical-css> element in
+<head>, and the stylesheets themselves are switched to asynchronous loading:
+
+    <link rel="preload" as="style" href="css/style.css"
+          onload="this.onload=null;this.rel='stylesheet'">
+    <noscript><link rel="stylesheet" href="css/style.css"></noscript>
+
+Most pages share the same shell, so the critical CSS is cached per shell:
+the cache key is the hash of the shell markup and of the stylesheets, and
+each entry is one file in public/.critical_css/ (never deployed). Workers
+of a parallel run only ever add whole files, so they never conflict.
+
+Remote stylesheets (Font Awesome, Google Fonts, ...) are left blocking:
+their rules cannot be inspected without fetching them.
+
+The transform runs as part of html_pipeline.py, or on its own with
+`python critical_css.py` (--no-cache clears the cache and re-checks every
+page).
+"""
+
+import os
+import re
+import copy
+import glob
+import hashlib
+import argparse
+import tempfile
+from bs4 import BeautifulSoup, Tag
+from css_rules import filter_rules
+from image_dimensions import site_path
+from page_cache import hash_file, files_version
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+CACHE_DIRNAME = '.critical_css'
+
+# Above-the-fold elements whose matching rules are inlined.
+SHELL_SELECTORS = ['header', '#sidebar', 'aside']
+# Layout elements kept without their content, so rules sizing them apply.
+SHALLOW_ELEMENTS = ('main',)
+# Classes added to <html> at runtime (darkmode.js), so their variants are inlined.
+ROOT_CLASSES = ['dark']
+# Bump this whenever the extraction or the inlined markup changes, so every
+# cache entry is recomputed and cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+ASYNC_ONLOAD = "this.onload=null;this.rel='stylesheet'"
+# Pseudo-elements and state pseudo-classes, which never match a static
+# document; they are dropped before matching so `.btn:hover` counts as `.btn`.
+_DYNAMIC_PSEUDO_RE = re.compile(
+    r'::?(?:-[\w-]+|before|after|first-line|first-letter|placeholder|selection|marker|backdrop'
+    r'|hover|focus|focus-within|focus-visible|active|visited|link|checked|disabled|enabled'
+    r'|invalid|valid|target|indeterminate|required|optional|read-only|read-write'
+    r'|placeholder-shown|autofill)(?![\w-])(?:\([^)]*\))?'
+)
+
+def _rel(link):
+    rel = link.get('rel') or []
+    return rel.split() if isinstance(rel, str) else rel
+
+def local_stylesheets(soup, public_dir=PUBLIC_DIR):
+    """
+    Returns the page's local stylesheet links, blocking or already made
+    asynchronous, in document order.
+
+    Returns:
+        list: (link tag, path of the stylesheet on disk) pairs.
+    """
+    links = []
+    for link in soup.find_all('link', href=True):
+        rel = _rel(link)
+        deferred = 'preload' in rel and link.get('as') == 'style' and link.get('onload') == ASYNC_ONLOAD
+        if 'stylesheet' not in rel and not deferred:
+            continue
+        if link.find_parent('noscript'):
+            continue
+        path = site_path(link['href'])
+        if path is None:
+            continue
+        file_path = os.path.join(public_dir, path)
+        if os.path.isfile(file_path):
+            links.append((link, file_path))
+    return links
+
+def shell_markup(soup):
+    """
+    Returns the markup of the page's above-the-fold shell: the shell
+    elements, their ancestors and the SHALLOW_ELEMENTS (emptied), inside an
+    <html> with the page's attributes and ROOT_CLASSES.
+    """
+    html_attrs = dict(soup.html.attrs) if soup.html else {}
+    classes = html_attrs.get('class') or []
+    classes = classes.split() if isinstance(classes, str) else list(classes)
+    html_attrs['class'] = classes + [name for name in ROOT_CLASSES if name not in classes]
+    html = BeautifulSoup('', 'html.parser').new_tag('html', attrs=html_attrs)
+
+    if soup.body:
+        body = copy.copy(soup.body)
+        shell = [element for selector in SHELL_SELECTORS for element in body.select(selector)]
+        shell_ids = {id(element) for element in shell}
+        ancestor_ids = {id(parent) for element in shell for parent in element.parents}
+
+        def prune(tag):
+            for child in list(tag.children):
+                if not isinstance(child, Tag):
+                    child.extract()
+                elif id(child) in shell_ids:
+                    # Text never changes which rules match, and leaving it
+                    # out lets pages that differ only in labels share an entry
+                    for text in child.find_all(string=True):
+                        text.extract()
+                elif id(child) in ancestor_ids:
+                    prune(child)
+                elif child.name in SHALLOW_ELEMENTS:
+                    child.clear()
+                else:
+                    child.decompose()
+
+        prune(body)
+        html.append(body)
+    return str(html)
+
+def selector_matcher(markup):
+    """
+    Returns keep_selector(selector) -> bool: whether a selector can match the
+    markup. Selectors the matcher cannot parse are kept, to stay safe.
+    """
+    document = BeautifulSoup(markup, 'html.parser')
+    results = {}
+
+    def keep_selector(selector):
+        if selector not in results:
+            static = _DYNAMIC_PSEUDO_RE.sub('', selector).strip()
+            if not static or static[-1] in '>+~':
+                static = (static + ' *').strip()
+            try:
+                results[selector] = document.select_one(static) is not None
+            except Exception:
+                results[selector] = True
+        return results[selector]
+
+    return keep_selector
+
+def critical_css(markup, stylesheets, cache_dir=None):
+    """
+    Returns the rules of the stylesheets that match the shell markup,
+    cached per (markup, stylesheet content) in cache_dir.
+
+    Args:
+        markup (str): The shell markup (see shell_markup).
+        stylesheets (list): Stylesheet paths, in page order.
+        cache_dir (str): Cache directory (default: public/.critical_css).
+    """
+    cache_dir = cache_dir or os.path.join(PUBLIC_DIR, CACHE_DIRNAME)
+    digest = hashlib.sha256(f'{TRANSFORM_VERSION}\n{markup}'.encode('utf-8'))
+    for file_path in stylesheets:
+        digest.update(f'\n{os.path.basename(file_path)}:{hash_file(file_path)}'.encode('utf-8'))
+    cache_file = os.path.join(cache_dir, digest.hexdigest() + '.css')
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    keep_selector = selector_matcher(markup)
+    parts = []
+    for file_path in stylesheets:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            parts.append(filter_rules(f.read(), keep_selector, keep_statements=False))
+    css = ''.join(parts)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix='.tmp.', suffix='.css')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(css)
+        os.replace(temp_path, cache_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return css
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the local stylesheets."""
+    return files_version(TRANSFORM_VERSION, glob.glob(os.path.join(PUBLIC_DIR, '**', '*.css'), recursive=True))
+
+def inline_critical_css(soup, filename=None, log=print):
+    """
+    Inlines the page's critical CSS into <head> and loads its local
+    stylesheets asynchronously.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    if soup.head is None:
+        return False
+    links = local_stylesheets(soup)
+    if not links:
+        return False
+
+    css = critical_css(shell_markup(soup), [file_path for _, file_path in links])
+    modified = False
+
+    style = soup.head.find('style', attrs={'data-critical-css': True})
+    if style is None:
+        style = soup.new_tag('style', attrs={'data-critical-css': ''})
+        style.string = css
+        links[0][0].insert_before(style)
+        modified = True
+    elif style.string != css:
+        style.string = css
+        modified = True
+
+    for link, _ in links:
+        if 'stylesheet' not in _rel(link):
+            continue
+        href = link['href']
+        link['rel'] = 'preload'
+        link['as'] = 'style'
+        link['onload'] = ASYNC_ONLOAD
+        noscript = soup.new_tag('noscript')
+        noscript.append(soup.new_tag('link', attrs={'rel': 'stylesheet', 'href': href}))
+        link.insert_after(noscript)
+        modified = True
+
+    if modified:
+        log(f"Inlined {len(css) / 1024:.1f} KB of critical CSS in {filename}, "
+            f"deferred {len(links)} stylesheet(s)")
+    return modified
+
+def clear_cache(cache_dir=None):
+    """Removes every cached critical-CSS file; returns how many."""
+    cache_dir = cache_dir or os.path.join(PUBLIC_DIR, CACHE_DIRNAME)
+    removed = 0
+    for file_path in glob.glob(os.path.join(cache_dir, '*.css')):
+        os.remove(file_path)
+        removed += 1
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Inline critical CSS and load local stylesheets async on every page in public/')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute the critical CSS and re-check every page, even if unchanged since the last run')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    if args.no_cache:
+        print(f"Cleared {clear_cache()} cached critical-CSS file(s)")
+
+    from html_pipeline import run_pipeline
+    # A changed stylesheet changes transform_version(), so the pages are
+    # re-checked after a rebuild even on a cached run
+    results = run_pipeline(PUBLIC_DIR, only=['critical_css'], workers=args.workers, use_cache=not args.no_cache)
+    return not any(result.status == 'error' for result in results)
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
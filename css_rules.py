@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Minimal CSS rule walker shared by the stylesheet build stages.
+
+Stylesheets are split into top-level blocks by brace depth (no full CSS
+parser), which is enough for the minified and hand-written stylesheets in
+public/css. filter_rules() keeps the rules whose selectors pass a predicate,
+recursing into @media/@supports and keeping only the @keyframes that a kept
+rule still animates with:
+
+    purged = filter_rules(css, lambda selector: 'hidden' in selector)
+"""
+
+import re
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_ANIMATION_RE = re.compile(r'animation(?:-name)?\s*:\s*([\w-]+)')
+_KEYFRAMES_RE = re.compile(r'@(?:-webkit-)?keyframes\s+([\w-]+)')
+# At-rules whose body is declarations, not rules; always kept.
+_DECLARATION_AT_RULES = ('@font-face', '@page')
+_LINE_BREAK_RE = re.compile(r'\s*\n\s*')
+
+def split_top_level(text, separator=','):
+    """Splits on a separator outside parentheses and brackets."""
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return parts
+
+def css_blocks(css):
+    """
+    Yields the top-level (prelude, body) blocks of a comment-free stylesheet;
+    body is None for statements like @charset or @import.
+    """
+    pos, length = 0, len(css)
+    while pos < length:
+        brace = css.find('{', pos)
+        semicolon = css.find(';', pos)
+        if brace == -1:
+            return
+        if css[pos:].lstrip().startswith('@') and semicolon != -1 and semicolon < brace:
+            yield css[pos:semicolon].strip(), None
+            pos = semicolon + 1
+            continue
+        depth, index = 1, brace + 1
+        while index < length and depth:
+            if css[index] == '{':
+                depth += 1
+            elif css[index] == '}':
+                depth -= 1
+            index += 1
+        yield css[pos:brace].strip(), css[brace + 1:index - 1]
+        pos = index
+
+def filter_rules(css, keep_selector, keep_statements=True):
+    """
+    Keeps the rules of a stylesheet whose selectors pass a predicate.
+
+    A rule is kept with its passing selectors only. @media/@supports blocks
+    are filtered recursively and dropped when empty, @font-face/@page are
+    always kept, and @keyframes are kept only if a kept rule animates with
+    them.
+
+    Args:
+        css (str): The stylesheet.
+        keep_selector (callable): keep_selector(selector) -> bool, called
+            with each stripped selector of a rule.
+        keep_statements (bool): Keep top-level statements like @import.
+
+    Returns:
+        str: The filtered (minified) stylesheet.
+    """
+    def block(prelude, body):
+        return f'{prelude}{{{_LINE_BREAK_RE.sub(" ", body.strip())}}}'
+
+    def walk(css):
+        out, keyframes = [], []
+        for prelude, body in css_blocks(css):
+            if body is None:
+                if keep_statements:
+                    out.append(prelude + ';')
+            elif prelude.startswith('@'):
+                if _KEYFRAMES_RE.match(prelude):
+                    keyframes.append((prelude, body))
+                elif prelude.startswith(_DECLARATION_AT_RULES):
+                    out.append(block(prelude, body))
+                else:
+                    inner = walk(body)
+                    if inner:
+                        out.append(f'{prelude}{{{inner}}}')
+            else:
+                selectors = [selector.strip() for selector in split_top_level(prelude)
+                             if selector.strip() and keep_selector(selector.strip())]
+                if selectors:
+                    out.append(block(','.join(selectors), body))
+        animations = set(_ANIMATION_RE.findall(''.join(out)))
+        out.extend(block(prelude, body) for prelude, body in keyframes
+                   if _KEYFRAMES_RE.match(prelude).group(1) in animations)
+        return ''.join(out)
+
+    return walk(COMMENT_RE.sub('', css))
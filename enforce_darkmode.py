@@ -1,5 +1,35 @@
 import os
 from bs4 import BeautifulSoup
+from html_writer import SourceSnapshot, write_minimal
+from script_loading import loads_script
+
+def add_darkmode_script(soup, filename=None, log=print):
+    """
+    Adds the darkmode.js script to the <head> of a parsed page if missing.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    # Check if the script is already present (possibly bundled or fingerprinted)
+    script_exists = loads_script(soup, 'js/darkmode.js')
+    if script_exists:
+        log(f"Dark mode script already exists in {filename}")
+        return False
+
+    # Add the script to the head
+    if soup.head:
+        new_script_tag = soup.new_tag('script', src='js/darkmode.js')
+        soup.head.append(new_script_tag)
+        log(f"Added dark mode script to {filename}")
+        return True
+
+    log(f"Could not find head tag in {filename}")
+    return False
 
 def ensure_darkmode_script(file_path):
     """
@@ -9,29 +39,17 @@ def ensure_darkmode_script(file_path):
     Args:
         file_path (str): The path to the HTML file.
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
         content = f.read()
 
     soup = BeautifulSoup(content, 'html.parser')
+    snapshot = SourceSnapshot(soup, content)
 
-    # Check if the script is already present
-    script_exists = soup.find('script', src='js/darkmode.js')
-    if script_exists:
-        print(f"Dark mode script already exists in {file_path}")
-        return
-
-    # Add the script to the head
-    if soup.head:
-        new_script_tag = soup.new_tag('script', src='js/darkmode.js')
-        soup.head.append(new_script_tag)
-        print(f"Added dark mode script to {file_path}")
-    else:
-        print(f"Could not find head tag in {file_path}")
+    if not add_darkmode_script(soup, file_path):
         return
 
-    # Write the modified HTML back to the file
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(str(soup))
+    # Write back only the changed <head>; the rest of the page keeps its bytes
+    write_minimal(file_path, snapshot)
 
 def main():
     """
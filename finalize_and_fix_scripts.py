@@ -106,32 +106,33 @@ MODALS_HTML = r"""
 # Main Processing Logic
 # ==============================================================================
 
+# Maps an HTML filename to its page-specific JS file.
+PAGE_SCRIPTS = {
+    "index.html": "js/index.js",
+    "admin.html": "js/admin.js",
+    "articles.html": "js/articles.js",
+    "booster.html": "js/booster.js",
+    "bulk_add.html": "js/bulk_add.js",
+    "card-view.html": "js/card-view.js",
+    "community.html": "js/community.js",
+    "contact.html": "js/contact.js",
+    "deck.html": "js/deck.js",
+    "events.html": "js/events.js",
+    "marketplace.html": "js/marketplace.js",
+    "messages.html": "js/messages.js",
+    "my_collection.html": "js/collection.js",
+    "notifications.html": "js/notifications.js",
+    "profile.html": "js/profile.js",
+    "referrals.html": "js/referrals.js",
+    "search.html": "js/search.js",
+    "settings.html": "js/settings.js",
+    "shop.html": "js/shop.js",
+    "trades.html": "js/trades.js",
+}
+
 def get_page_specific_script(filename):
     """Returns the correct page-specific script tag for a given HTML file."""
-    # Maps an HTML filename to its corresponding JS file.
-    script_map = {
-        "index.html": "js/index.js",
-        "admin.html": "js/admin.js",
-        "articles.html": "js/articles.js",
-        "booster.html": "js/booster.js",
-        "bulk_add.html": "js/bulk_add.js",
-        "card-view.html": "js/card-view.js",
-        "community.html": "js/community.js",
-        "contact.html": "js/contact.js",
-        "deck.html": "js/deck.js",
-        "events.html": "js/events.js",
-        "marketplace.html": "js/marketplace.js",
-        "messages.html": "js/messages.js",
-        "my_collection.html": "js/collection.js",
-        "notifications.html": "js/notifications.js",
-        "profile.html": "js/profile.js",
-        "referrals.html": "js/referrals.js",
-        "search.html": "js/search.js",
-        "settings.html": "js/settings.js",
-        "shop.html": "js/shop.js",
-        "trades.html": "js/trades.js",
-    }
-    script_file = script_map.get(filename)
+    script_file = PAGE_SCRIPTS.get(filename)
     if script_file and os.path.exists(script_file):
         return f'<script defer src="{script_file}"></script>'
     return '' # Return empty string if no specific script exists
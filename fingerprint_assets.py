@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Content-hashed (fingerprinted) asset names for immutable caching.
+
+Every asset matched by ASSET_GLOBS gets a copy next to it named after its
+content, e.g. js/auth.js -> js/auth.3f1c2a9b0d.js. The sources keep their
+names, so the maintenance scripts and hand edits keep working on them, and
+relative URLs inside the copies (CSS url(), imports of unhashed files)
+still resolve. Then:
+
+- Scripts are copied with their local imports (static and import()) rewritten
+  to the fingerprinted names. Files are processed dependencies first, so an
+  importer's hash changes whenever anything it imports changes; imports
+  inside a cycle keep their source names.
+- The 'fingerprint' pipeline transform points <script src>, <link href>,
+  <img src> and <source src> at the copies. References to a copy map back
+  to its source, so a later build moves the page to the new copy.
+- The "src" entries of manifest.json (its icons) are rewritten the same way.
+- The mapping is written to public/.fingerprints.json (never deployed):
+
+    {"version": "1", "assets": {"js/auth.js": "js/auth.3f1c2a9b0d.js", ...}}
+
+  firebase.json serves every name of this form (IMMUTABLE_HEADER_REGEX) with
+  Cache-Control: public, max-age=31536000, immutable. The mapping lists
+  exactly the files that header applies to, for checking a deploy.
+
+Copies that no longer match their source are removed. The script bundles
+(js_bundle.py) are already content-hashed; they import the fingerprinted
+modules too, so they are rebuilt after the copies.
+"""
+
+import os
+import re
+import glob
+import json
+import hashlib
+import argparse
+import tempfile
+from image_dimensions import site_path
+from html_splice import default_mode
+from page_cache import files_version
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+FINGERPRINTS_FILENAME = '.fingerprints.json'
+FIREBASE_JSON = os.path.join(ROOT_DIR, 'firebase.json')
+MANIFEST_JSON = os.path.join(PUBLIC_DIR, 'manifest.json')
+
+# Fingerprinted assets, relative to public/.
+ASSET_GLOBS = [
+    'js/**/*.js',
+    'css/**/*.css',
+    'icons/**/*.png',
+    'icons/**/*.svg',
+    'icons/**/*.ico',
+]
+# Directories whose files are already content-hashed.
+EXCLUDED_DIRS = ['js/bundles/']
+HASH_LENGTH = 10
+# The Firebase Hosting header regex that matches every fingerprinted name.
+IMMUTABLE_HEADER_REGEX = r'^/.+\.[0-9a-f]{10}\.(?:js|css|png|svg|ico)$'
+# Bump this whenever the copies change form, so every copy is rewritten.
+FINGERPRINT_VERSION = '1'
+# Bump this whenever the reference rewrite changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+_FINGERPRINT_RE = re.compile(r'^(.*)\.[0-9a-f]{%d}(\.[^./]+)$' % HASH_LENGTH)
+_REFERENCE_ATTRS = (('script', 'src'), ('link', 'href'), ('img', 'src'), ('source', 'src'))
+_MANIFEST_SRC_RE = re.compile(r'("src"\s*:\s*")([^"]+)(")')
+
+def source_asset(path, public_dir=PUBLIC_DIR):
+    """Returns the source of a fingerprinted copy, or the path itself for any other file."""
+    match = _FINGERPRINT_RE.match(path)
+    if match:
+        source = match.group(1) + match.group(2)
+        if os.path.isfile(os.path.join(public_dir, source)):
+            return source
+    return path
+
+def is_fingerprinted(path, public_dir=PUBLIC_DIR):
+    """Checks whether a path (relative to public/) is the fingerprinted copy of an asset."""
+    return source_asset(path, public_dir) != path
+
+def fingerprinted_path(path, content):
+    """Returns the fingerprinted name for an asset with the given content (bytes)."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+def find_assets(public_dir=PUBLIC_DIR):
+    """Returns the sorted source assets (paths relative to public/)."""
+    assets = set()
+    for pattern in ASSET_GLOBS:
+        for file_path in glob.glob(os.path.join(public_dir, pattern), recursive=True):
+            path = os.path.relpath(file_path, public_dir).replace(os.sep, '/')
+            if not path.startswith(tuple(EXCLUDED_DIRS)) and not is_fingerprinted(path, public_dir):
+                assets.add(path)
+    return sorted(assets)
+
+def fingerprints_path(public_dir=PUBLIC_DIR):
+    return os.path.join(public_dir, FINGERPRINTS_FILENAME)
+
+def load_fingerprints(public_dir=PUBLIC_DIR):
+    """Returns the source -> fingerprinted path mapping ({} before the first build)."""
+    try:
+        with open(fingerprints_path(public_dir), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get('assets', {}) if data.get('version') == FINGERPRINT_VERSION else {}
+
+def _write_atomic(path, content):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        default_mode(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _dependency_order(assets, imports):
+    """Orders assets so every file comes after the files it imports (where no cycle prevents it)."""
+    order, done, visiting = [], set(), set()
+    for root in assets:
+        if root in done:
+            continue
+        stack = [(root, iter(imports.get(root, [])))]
+        visiting.add(root)
+        while stack:
+            path, targets = stack[-1]
+            for target in targets:
+                if target not in done and target not in visiting:
+                    visiting.add(target)
+                    stack.append((target, iter(imports.get(target, []))))
+                    break
+            else:
+                stack.pop()
+                visiting.discard(path)
+                done.add(path)
+                order.append(path)
+    return order
+
+def build_fingerprints(public_dir=PUBLIC_DIR):
+    """
+    Writes the fingerprinted copy of every asset and the mapping file, and
+    removes copies that are no longer current.
+
+    Returns:
+        tuple: (mapping, number of copies written, number removed, True if the mapping changed)
+    """
+    from modules import import_targets, rewrite_imports
+
+    assets = find_assets(public_dir)
+    asset_set = set(assets)
+    sources, imports = {}, {}
+    for path in assets:
+        with open(os.path.join(public_dir, path), 'rb') as f:
+            sources[path] = f.read()
+        if path.endswith('.js'):
+            code = sources[path].decode('utf-8')
+            imports[path] = [target for target in import_targets(code, path, public_dir) if target in asset_set]
+
+    mapping, written = {}, 0
+    for path in _dependency_order(assets, imports):
+        content = sources[path]
+        if path.endswith('.js') and imports[path]:
+            content = rewrite_imports(content.decode('utf-8'), path, path, mapping, public_dir).encode('utf-8')
+        hashed = fingerprinted_path(path, content)
+        target = os.path.join(public_dir, hashed)
+        if not os.path.exists(target):
+            _write_atomic(target, content)
+            written += 1
+        elif not os.stat(target).st_mode & 0o044:
+            # Copies written by earlier runs were left 0600 by mkstemp
+            default_mode(target)
+        mapping[path] = hashed
+
+    current = set(mapping.values())
+    removed = 0
+    for pattern in ASSET_GLOBS:
+        for file_path in glob.glob(os.path.join(public_dir, pattern), recursive=True):
+            path = os.path.relpath(file_path, public_dir).replace(os.sep, '/')
+            if is_fingerprinted(path, public_dir) and path not in current and not path.startswith(tuple(EXCLUDED_DIRS)):
+                os.remove(file_path)
+                removed += 1
+
+    changed = mapping != load_fingerprints(public_dir)
+    if changed:
+        with open(fingerprints_path(public_dir), 'w', encoding='utf-8') as f:
+            json.dump({'version': FINGERPRINT_VERSION, 'assets': mapping}, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return mapping, written, removed, changed
+
+def fingerprinted_reference(value, mapping, public_dir=PUBLIC_DIR):
+    """
+    Returns the URL a reference should use: its asset's current copy, or the
+    source for a copy of an asset that is no longer fingerprinted. Returns
+    None if the reference is already right or not a local asset.
+    """
+    path = site_path(value)
+    if path is None:
+        return None
+    source = source_asset(path, public_dir)
+    wanted = mapping.get(source, source)
+    if wanted == path:
+        return None
+    return ('/' if value.startswith('/') else '') + wanted
+
+def rewrite_manifest(mapping, manifest_path=MANIFEST_JSON, public_dir=PUBLIC_DIR):
+    """
+    Points the "src" entries of the web app manifest at the fingerprinted
+    copies, editing the file in place so its formatting is kept.
+
+    Returns:
+        int: Number of entries rewritten.
+    """
+    if not os.path.exists(manifest_path):
+        return 0
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        new_value = fingerprinted_reference(match.group(2), mapping, public_dir)
+        if new_value is None:
+            return match.group(0)
+        count += 1
+        return match.group(1) + new_value + match.group(3)
+
+    new_content = _MANIFEST_SRC_RE.sub(replace, content)
+    if new_content != content:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.write(new_content)
+    return count
+
+def has_immutable_headers(firebase_json=FIREBASE_JSON):
+    """Checks whether firebase.json serves the fingerprinted names as immutable."""
+    try:
+        with open(firebase_json, 'r', encoding='utf-8') as f:
+            hosting = json.load(f).get('hosting', {})
+    except (OSError, ValueError):
+        return False
+    for rule in hosting.get('headers', []):
+        if rule.get('regex') == IMMUTABLE_HEADER_REGEX:
+            return any(header.get('key', '').lower() == 'cache-control' and 'immutable' in header.get('value', '')
+                       for header in rule.get('headers', []))
+    return False
+
+# Fingerprint mapping, loaded once per process by the page transform.
+_fingerprints = None
+
+def fingerprints():
+    """Returns the process's fingerprint mapping."""
+    global _fingerprints
+    if _fingerprints is None:
+        _fingerprints = load_fingerprints()
+    return _fingerprints
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the fingerprint mapping."""
+    return files_version(TRANSFORM_VERSION, [fingerprints_path()])
+
+def fingerprint_references(soup, filename=None, log=print):
+    """
+    Points the page's script, stylesheet, icon and image references at the
+    fingerprinted copies of their assets.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    mapping = fingerprints()
+    if not mapping:
+        return False
+
+    modified = 0
+    for name, attr in _REFERENCE_ATTRS:
+        for tag in soup.find_all(name, attrs={attr: True}):
+            new_value = fingerprinted_reference(tag[attr], mapping)
+            if new_value is not None:
+                tag[attr] = new_value
+                modified += 1
+
+    if modified:
+        log(f"Pointed {modified} reference(s) in {filename} at fingerprinted assets")
+    return bool(modified)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write content-hashed copies of the assets in public/ and reference them')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    parser.add_argument('--no-pages', action='store_true',
+                        help='Only write the copies and the mapping, do not rewrite the pages')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    mapping, written, removed, changed = build_fingerprints()
+    print(f"Fingerprinted {len(mapping)} asset(s): {written} copy(ies) written, {removed} stale copy(ies) removed")
+    print(f"Rewrote {rewrite_manifest(mapping)} manifest.json reference(s)")
+    if not has_immutable_headers():
+        print(f"WARNING: firebase.json has no immutable Cache-Control header for '{IMMUTABLE_HEADER_REGEX}'")
+
+    from js_bundle import build_bundles, load_manifest
+    from html_pipeline import run_pipeline, find_pages
+
+    bundles_changed = False
+    if load_manifest() is not None:
+        # Bundles import the fingerprinted modules, so rebuild them against the new names
+        _, bundles_changed = build_bundles(find_pages(PUBLIC_DIR))
+
+    if not args.no_pages:
+        print()
+        run_pipeline(PUBLIC_DIR, only=['js_bundles', 'modulepreload', 'fingerprint'], workers=args.workers,
+                     use_cache=not (changed or bundles_changed or args.no_cache))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
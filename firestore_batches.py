@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Moves documents between Firestore and the JSON Lines files of the batch tools.
+
+The offline tools read and write Firestore data as JSON Lines instead of
+talking to Firestore themselves: price_history.py and
+collection_analytics.py read documents as exported here, and
+collection_import.py and collection_analytics.py write Firestore write
+batches. This script does both ends:
+
+    # One {"path": ..., "data": {...}, "readTime": ...} line per document of a collection group
+    python firestore_batches.py export collection -o collections.jsonl
+    python firestore_batches.py export daily --since 2025-01-30 -o snapshots.jsonl
+
+    # Commits {"batch": n, "ops": [...]} lines, one Firestore batch per line
+    python firestore_batches.py apply collection_analytics.jsonl
+
+The supported ops are "set" (data), "increment" (field, by) and "delete".
+Timestamps are exported as ISO 8601 strings. readTime is when the document
+was read, which collection_analytics.py stamps on its results.
+
+It needs the `firebase-admin` package (pip install firebase-admin) and
+credentials: --credentials with a service-account key, or the application
+default credentials (GOOGLE_APPLICATION_CREDENTIALS, gcloud auth).
+"""
+
+import json
+import argparse
+from datetime import date, datetime
+
+try:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+except ImportError:
+    firebase_admin = None
+
+# --- Configuration ---
+# Documents fetched per query page while exporting
+PAGE_SIZE = 1000
+# --- End Configuration ---
+
+def client(credentials_path=None):
+    """
+    Returns a Firestore client, initializing the Firebase app once.
+
+    Raises:
+        RuntimeError: If firebase-admin is not installed.
+    """
+    if firebase_admin is None:
+        raise RuntimeError("The 'firebase-admin' package is not installed (pip install firebase-admin).")
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(credentials_path) if credentials_path else credentials.ApplicationDefault()
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'path'):
+        # DocumentReference
+        return value.path
+    return str(value)
+
+def export_group(db, group, output_path, since=None):
+    """
+    Writes every document of a collection group as one JSON line.
+
+    Args:
+        group (str): Collection ID, e.g. 'collection' for users/{uid}/collection.
+        since (str): Only documents whose 'date' field is on or after this
+            date (YYYY-MM-DD), e.g. the daily price snapshots of the last run.
+
+    Returns:
+        int: Number of documents written.
+    """
+    query = db.collection_group(group)
+    if since:
+        query = query.where('date', '>=', since).order_by('date')
+    count = 0
+    last = None
+    with open(output_path, 'w', encoding='utf-8') as f:
+        while True:
+            page = query.limit(PAGE_SIZE)
+            if last is not None:
+                page = page.start_after(last)
+            docs = list(page.stream())
+            for doc in docs:
+                f.write(json.dumps({'path': doc.reference.path, 'data': doc.to_dict(), 'readTime': doc.read_time},
+                                   default=_json_value, ensure_ascii=False) + '\n')
+            count += len(docs)
+            if len(docs) < PAGE_SIZE:
+                return count
+            last = docs[-1]
+
+def apply_batches(db, path):
+    """
+    Commits the write batches of a JSON Lines file, in order.
+
+    Returns:
+        tuple: (batches committed, writes committed)
+
+    Raises:
+        ValueError: If an op is not one of set, increment and delete.
+    """
+    batches = writes = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch = db.batch()
+            ops = json.loads(line)['ops']
+            for op in ops:
+                ref = db.document(op['path'])
+                if op['op'] == 'set':
+                    batch.set(ref, op['data'])
+                elif op['op'] == 'increment':
+                    batch.update(ref, {op['field']: firestore.Increment(op['by'])})
+                elif op['op'] == 'delete':
+                    batch.delete(ref)
+                else:
+                    raise ValueError(f"{path}: unknown op {op['op']!r} for {op['path']}")
+            batch.commit()
+            batches += 1
+            writes += len(ops)
+    return batches, writes
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Firestore collection groups and apply write batches')
+    parser.add_argument('--credentials', help='Service-account key file (default: application default credentials)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='Write a collection group as JSON Lines')
+    export.add_argument('group', help="Collection ID, e.g. 'collection' or 'daily'")
+    export.add_argument('--output', '-o', required=True)
+    export.add_argument('--since', help="Only documents whose 'date' is on or after this date (YYYY-MM-DD)")
+    apply = commands.add_parser('apply', help='Commit write batches from JSON Lines files')
+    apply.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    try:
+        db = client(args.credentials)
+        if args.command == 'export':
+            count = export_group(db, args.group, args.output, args.since)
+            print(f"Exported {count} '{args.group}' document(s) to {args.output}")
+            return True
+        for path in args.files:
+            batches, writes = apply_batches(db, path)
+            print(f"{path}: committed {writes} write(s) in {batches} batch(es)")
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        return False
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
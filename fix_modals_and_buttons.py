@@ -54,29 +54,52 @@ LOGGED_OUT_BUTTONS_HTML = """
 </div>
 """
 
+def add_modals_and_buttons(soup, filename=None, log=print):
+    """
+    Adds the login/register modals and resets the logged-out header buttons.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    body = soup.find('body')
+    if not body:
+        log(f" - Skipping {filename} (no body tag found).")
+        return False
+
+    changed = False
+
+    # --- Add Modals if they don't exist ---
+    if not soup.find('div', id='loginModal'):
+        body.append(BeautifulSoup(MODALS_HTML, 'html.parser'))
+        log(f" - Added modals to {filename}")
+        changed = True
+
+    # --- Fix Header Buttons ---
+    user_actions = soup.find('div', id='user-actions')
+    if user_actions:
+        button_ids = [button.get('id') for button in user_actions.find_all('button')]
+        if button_ids != ['header-login-btn', 'header-register-btn']:
+            user_actions.clear()
+            user_actions.append(BeautifulSoup(LOGGED_OUT_BUTTONS_HTML, 'html.parser'))
+            log(f" - Fixed header buttons in {filename}")
+            changed = True
+
+    return changed
+
 def process_html_file(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
 
         soup = BeautifulSoup(content, 'html.parser')
-        body = soup.find('body')
-        if not body:
-            print(f" - Skipping {file_path} (no body tag found).")
+        if not add_modals_and_buttons(soup, file_path):
             return
 
-        # --- Add Modals if they don't exist ---
-        if not soup.find('div', id='loginModal'):
-            body.append(BeautifulSoup(MODALS_HTML, 'html.parser'))
-            print(f" - Added modals to {file_path}")
-
-        # --- Fix Header Buttons ---
-        user_actions = soup.find('div', id='user-actions')
-        if user_actions:
-            user_actions.clear()
-            user_actions.append(BeautifulSoup(LOGGED_OUT_BUTTONS_HTML, 'html.parser'))
-            print(f" - Fixed header buttons in {file_path}")
-        
         # --- Save the updated file ---
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(str(soup.prettify()))
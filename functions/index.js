@@ -875,6 +875,34 @@ exports.syncCardToMarketplace = functions.firestore
         return null;
     });
 
+/**
+ * Records when a card that counts toward a user's collection value last changed, so
+ * getCollectionPriceAnalytics ignores any materialization (collection_analytics.py) of the
+ * collection as read before then. A timestamp rather than a delete: the nightly run may
+ * still write back totals it computed from an export taken before the change.
+ */
+const ANALYTICS_INVALIDATION_DOC = 'collectionInvalidation';
+const VALUATION_FIELDS = ['api_id', 'cardId', 'id', 'quantity', 'condition', 'is_foil', 'set', 'set_name', 'prices'];
+
+exports.invalidateCollectionAnalytics = functions.firestore
+    .document('users/{userId}/collection/{cardId}')
+    .onWrite(async (change, context) => {
+        const before = change.before.exists ? change.before.data() : null;
+        const after = change.after.exists ? change.after.data() : null;
+        if (before && after && VALUATION_FIELDS.every((field) =>
+            JSON.stringify(before[field]) === JSON.stringify(after[field]))) {
+            return null;
+        }
+        try {
+            await db.collection('users').doc(context.params.userId)
+                .collection('analytics').doc(ANALYTICS_INVALIDATION_DOC)
+                .set({ invalidatedAt: admin.firestore.FieldValue.serverTimestamp() });
+        } catch (error) {
+            console.error(`Failed to invalidate collection analytics of ${context.params.userId}:`, error);
+        }
+        return null;
+    });
+
 // =================================================================================================
 // PRODUCT MANAGEMENT FUNCTIONS
 // =================================================================================================
@@ -1884,6 +1912,35 @@ exports.getCollectionPriceAnalytics = functions.https.onCall(async (data, contex
     console.log(`Processing analytics for user: ${userId}, days: ${days}`);
     
     try {
+        // Serve the nightly materialization (collection_analytics.py) while it is fresh and
+        // no card has changed since the collection was read for it
+        const analyticsRef = db.collection('users').doc(userId).collection('analytics');
+        const [materializedDoc, invalidationDoc] = await db.getAll(
+            analyticsRef.doc('collectionPrices'), analyticsRef.doc(ANALYTICS_INVALIDATION_DOC));
+        if (materializedDoc.exists) {
+            const materialized = materializedDoc.data();
+            const periodData = materialized.periods && materialized.periods[String(days)];
+            const readAt = Date.parse(materialized.timestamp);
+            const invalidatedAt = invalidationDoc.exists && invalidationDoc.data().invalidatedAt
+                ? invalidationDoc.data().invalidatedAt.toMillis() : 0;
+            if (periodData && Date.now() - readAt < 36 * 60 * 60 * 1000 && readAt > invalidatedAt) {
+                console.log(`Using materialized analytics from ${materialized.timestamp}`);
+                return {
+                    success: true,
+                    totalValue: materialized.totalValue,
+                    valueChange: periodData.valueChange,
+                    percentChange: periodData.percentChange,
+                    topGainers: periodData.topGainers,
+                    topLosers: periodData.topLosers,
+                    sets: materialized.sets,
+                    period: `${days} days`,
+                    processedCards: materialized.processedCards,
+                    pricedThrough: materialized.pricedThrough,
+                    timestamp: materialized.timestamp
+                };
+            }
+        }
+
         // Get user's collection
         const collectionRef = db.collection('users').doc(userId).collection('collection');
         const collectionSnapshot = await collectionRef.get();
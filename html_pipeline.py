@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Single-parse HTML maintenance pipeline.
+
+Every page in public/ is read and parsed once, the registered transforms are
+run in order on the shared BeautifulSoup tree, and the page is written once
+if any transform changed it. Only the elements the transforms touched are
+re-serialized (see html_writer.py); the rest of the page keeps its original
+bytes. The standalone fix scripts expose their logic as transforms with the
+signature:
+
+    transform(soup, filename, log) -> bool   # True if the tree was modified
+
+A transform runs on every page unless its module sets TRANSFORM_PAGES, the
+page file names it is limited to (fix_firebase_conflicts only standardizes
+the Firebase SDK of the pages it was written for).
+"""
+
+import os
+import sys
+import glob
+import argparse
+import importlib
+from functools import partial
+from contextlib import nullcontext
+from bs4 import BeautifulSoup
+from page_runner import run_pages, print_summary
+from page_cache import PageCache
+from patch_markers import PATCH_MARKERS
+from maintenance_profile import build_report, merge_cprofile_dumps, print_report, write_report
+from html_writer import SourceSnapshot
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Built-in transforms, in the order they run on each page.
+# Format: (name, module, function). Modules are looked up in the project
+# root and in public/, where the original fix scripts live.
+DEFAULT_TRANSFORMS = [
+    ('firebase_conflicts', 'fix_firebase_conflicts', 'dedupe_firebase_scripts'),
+    ('header', 'update_headers', 'replace_header'),
+    ('modals_and_buttons', 'fix_modals_and_buttons', 'add_modals_and_buttons'),
+    ('mobile_sidebar', 'fix_sidebarmobile', 'fix_sidebar'),
+    ('darkmode', 'enforce_darkmode', 'add_darkmode_script'),
+    ('contact_link', 'add_contact2', 'add_contact_link'),
+    ('tour', 'install_tour', 'add_tour_to_page'),
+    ('script_loading', 'script_loading', 'optimize_scripts'),
+    ('js_bundles', 'js_bundle', 'bundle_scripts'),
+    ('modulepreload', 'modules', 'add_modulepreload'),
+    ('responsive_images', 'image_build', 'add_responsive_images'),
+    ('image_attributes', 'add_image_attributes', 'add_image_attributes'),
+    ('tailwind_css', 'tailwind_purge', 'use_purged_tailwind'),
+    ('critical_css', 'critical_css', 'inline_critical_css'),
+    ('fingerprint', 'fingerprint_assets', 'fingerprint_references'),
+]
+# --- End Configuration ---
+
+# Ordered registry of (name, function) pairs.
+_TRANSFORMS = []
+# Transform name -> the page file names it is limited to
+_PAGE_FILTERS = {}
+
+def register_transform(name, func, pages=None):
+    """
+    Registers a transform to run on every page. Registering an existing
+    name replaces that transform in place, keeping its position.
+
+    Args:
+        name (str): Unique transform name, used by --only / --skip.
+        func (callable): transform(soup, filename, log) -> bool
+        pages (list): If given, run the transform only on these page file names.
+    """
+    if pages is None:
+        _PAGE_FILTERS.pop(name, None)
+    else:
+        _PAGE_FILTERS[name] = frozenset(pages)
+    for index, (existing_name, _) in enumerate(_TRANSFORMS):
+        if existing_name == name:
+            _TRANSFORMS[index] = (name, func)
+            return
+    _TRANSFORMS.append((name, func))
+
+def load_default_transforms():
+    """Imports the built-in fix scripts and registers their transforms."""
+    for plugin_dir in (PUBLIC_DIR, ROOT_DIR):
+        if plugin_dir not in sys.path:
+            sys.path.insert(0, plugin_dir)
+
+    for name, module_name, func_name in DEFAULT_TRANSFORMS:
+        module = importlib.import_module(module_name)
+        register_transform(name, getattr(module, func_name), getattr(module, 'TRANSFORM_PAGES', None))
+
+def registered_transforms(only=None, skip=None):
+    """
+    Returns the registered transforms in run order.
+
+    Args:
+        only (list): If given, keep only these transform names.
+        skip (list): Transform names to leave out.
+
+    Returns:
+        list: (name, function) pairs.
+    """
+    if not _TRANSFORMS:
+        load_default_transforms()
+
+    known = {name for name, _ in _TRANSFORMS}
+    for name in (only or []) + (skip or []):
+        if name not in known:
+            raise ValueError(f"Unknown transform '{name}'. Known: {', '.join(sorted(known))}")
+
+    return [
+        (name, func) for name, func in _TRANSFORMS
+        if (not only or name in only) and name not in (skip or [])
+    ]
+
+def process_page(file_path, transforms, log=print, profile=None, verify=False):
+    """
+    Parses a page once, runs every transform on it, and writes it back once.
+
+    Args:
+        file_path (str): Path to the HTML file.
+        transforms (list): (name, function) pairs to run in order.
+        log (callable): Receives progress messages.
+        profile (PageProfile): If given, times each phase of the page.
+        verify (bool): Re-parse the output to check it (see html_writer).
+
+    Returns:
+        list: Names of the transforms that modified the page.
+    """
+    filename = os.path.basename(file_path)
+
+    def phase(name, transform=None):
+        return profile.phase(name, transform) if profile else nullcontext()
+
+    with phase('read'):
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+
+    with phase('parse'):
+        soup = BeautifulSoup(content, 'html.parser')
+        snapshot = SourceSnapshot(soup, content)
+
+    applied = []
+    for name, func in transforms:
+        if name in _PAGE_FILTERS and filename not in _PAGE_FILTERS[name]:
+            continue
+        with phase('transform', name):
+            if func(soup, filename, log):
+                applied.append(name)
+
+    if applied:
+        with phase('serialize'):
+            output = snapshot.render(verify)
+        if output == content:
+            return []
+        with phase('write'):
+            with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(output)
+
+    return applied
+
+def module_version(module):
+    """
+    Returns a transform module's cache version: its transform_version()
+    hook if it has one (for transforms that read build outputs, so the
+    version changes with them), else its TRANSFORM_VERSION (default '1').
+    """
+    hook = getattr(module, 'transform_version', None)
+    if callable(hook):
+        return str(hook())
+    return getattr(module, 'TRANSFORM_VERSION', '1')
+
+def transform_version(transforms):
+    """
+    Returns the cache version for a transform list: the transform names in
+    order, each with its module's version (see module_version).
+    """
+    return ','.join(f"{name}:{module_version(sys.modules.get(func.__module__))}" for name, func in transforms)
+
+def find_pages(directory=PUBLIC_DIR):
+    """Returns the sorted list of top-level .html files in a directory."""
+    return sorted(glob.glob(os.path.join(directory, '*.html')))
+
+def pipeline_worker(names, file_path, log, profile=None, verify=False):
+    """
+    Page-runner worker: runs the named transforms on one page.
+
+    Transforms are looked up by name so the worker stays picklable.
+
+    Returns:
+        str: 'updated' or 'unchanged'.
+    """
+    transforms = registered_transforms(only=list(names))
+    applied = process_page(file_path, transforms, log, profile, verify)
+    if not applied:
+        return 'unchanged'
+    log(f"UPDATED: {file_path} ({', '.join(applied)})")
+    return 'updated'
+
+def run_pipeline(directory=PUBLIC_DIR, only=None, skip=None, workers=None, use_cache=True,
+                 profile_report=None, cprofile_dir=None, top=10, verify=False):
+    """
+    Runs the selected transforms over every page in a directory.
+
+    Args:
+        directory (str): Directory containing the pages.
+        only (list): If given, run only these transform names.
+        skip (list): Transform names to leave out.
+        workers (int): Number of worker processes (default: one per CPU).
+        use_cache (bool): Skip pages unchanged since the last run with the
+            same transform set.
+        profile_report (str): If given, profile every page and write the
+            JSON timing report to this path.
+        cprofile_dir (str): With profile_report, also write one merged
+            cProfile dump per transform to this directory.
+        top (int): Number of hot spots to print with the profile.
+        verify (bool): Re-parse every written page to check the minimal-diff
+            output (debugging; about three times slower per written page).
+
+    Returns:
+        list: PageResult for every page, in page order.
+    """
+    transforms = registered_transforms(only, skip)
+    names = tuple(name for name, _ in transforms)
+    pages = find_pages(directory)
+
+    print(f"Running {len(transforms)} transform(s) over {len(pages)} page(s) in '{directory}'")
+    print(f"Order: {' -> '.join(names)}")
+    print("-" * 60)
+
+    cache = PageCache('html_pipeline', transform_version(transforms), directory,
+                      markers=PATCH_MARKERS) if use_cache else None
+    results = run_pages(pages, partial(pipeline_worker, names, verify=verify), workers, cache=cache,
+                        profile=bool(profile_report), cprofile_dir=cprofile_dir)
+    print_summary(results, "Pipeline Complete")
+
+    if profile_report:
+        cprofile_files = merge_cprofile_dumps(results, cprofile_dir) if cprofile_dir else {}
+        report = build_report(results)
+        report['cprofile'] = cprofile_files
+        write_report(report, profile_report)
+        print_report(report, top, cprofile_files)
+        print(f"\nProfile report written to {profile_report}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the HTML maintenance transforms in a single pass per page')
+    parser.add_argument('--directory', '-d', default=PUBLIC_DIR,
+                        help='Directory containing the HTML pages (default: public/)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='Run only these transforms (order is still the registry order)')
+    parser.add_argument('--skip', nargs='+', metavar='NAME',
+                        help='Transforms to leave out')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Process every page, even if unchanged since the last run')
+    parser.add_argument('--profile', metavar='REPORT',
+                        help='Time every phase of every page and write a JSON report (implies --no-cache)')
+    parser.add_argument('--cprofile-dir', metavar='DIR',
+                        help='With --profile, write one cProfile dump per transform to DIR')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of hot spots to show with --profile (default: 10)')
+    parser.add_argument('--verify', action='store_true',
+                        help='Re-parse every written page to check the minimal-diff output (debugging)')
+    parser.add_argument('--list', action='store_true',
+                        help='List the registered transforms and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, func in registered_transforms():
+            print(f"{name:20} {func.__module__}.{func.__name__}")
+        return True
+
+    if not os.path.isdir(args.directory):
+        print(f"ERROR: Target directory '{args.directory}' not found.")
+        return False
+
+    if args.cprofile_dir and not args.profile:
+        parser.error('--cprofile-dir requires --profile')
+
+    # Cached pages are not processed, so profiling always runs every page
+    use_cache = not (args.no_cache or args.profile)
+    run_pipeline(args.directory, args.only, args.skip, args.workers, use_cache,
+                 args.profile, args.cprofile_dir, args.top, args.verify)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Linear-time HTML tag scanner.
+
+Walks a page's tags left to right without building a tree, skipping comments
+and the raw text of <script>/<style> elements, and finds the exact
+(start, end) character span of elements by id by tracking the nesting depth
+of their tag name. Every lookup on a page is answered from a single pass, so
+there is no regex backtracking and nested elements are never cut short.
+
+iter_tags also accepts bytes-like content (bytes or an mmap), in which case
+offsets are byte offsets; see html_splice.py.
+"""
+
+import re
+from collections import namedtuple
+
+# Elements that never have a closing tag.
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+])
+
+# Elements whose content is raw text, so '<' inside them is not a tag.
+RAW_TEXT_ELEMENTS = frozenset(['script', 'style'])
+
+# The next markup token: a comment opener, a doctype / processing
+# instruction, or a start/end tag. The attribute group is written as an
+# unrolled loop (plain run, then quoted value + plain run, ...) so it can
+# never backtrack and matching stays linear.
+_TOKEN_RE = re.compile(r'''<!--|<[!?]|<(/?)([A-Za-z][^\s/>]*)([^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*)>''')
+_BYTES_TOKEN_RE = re.compile(_TOKEN_RE.pattern.encode('ascii'))
+_ATTR_RE = re.compile(r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+_RAW_TEXT_END_RE = {name: re.compile(r'</%s\s*>' % name, re.IGNORECASE) for name in RAW_TEXT_ELEMENTS}
+_BYTES_RAW_TEXT_END_RE = {
+    name: re.compile(pattern.pattern.encode('ascii'), re.IGNORECASE)
+    for name, pattern in _RAW_TEXT_END_RE.items()
+}
+
+# One tag found by the scanner. kind is 'start' or 'end'; end is exclusive.
+TagToken = namedtuple('TagToken', ['kind', 'name', 'start', 'end', 'attrs_text', 'self_closing'])
+
+def parse_attrs(attrs_text):
+    """
+    Parses the attribute text of a start tag.
+
+    Returns:
+        dict: Lower-cased attribute names to values ('' for bare attributes).
+    """
+    attrs = {}
+    for match in _ATTR_RE.finditer(attrs_text):
+        name = match.group(1).lower()
+        if name not in attrs:
+            value = next((group for group in match.groups()[1:] if group is not None), '')
+            attrs[name] = value
+    return attrs
+
+def iter_tags(content, start=0):
+    """
+    Yields every start and end tag in the content, in document order.
+
+    Comments, doctypes and processing instructions are skipped, as is the
+    raw text inside <script> and <style> elements.
+
+    Args:
+        content (str, bytes or mmap): The HTML text. For bytes-like content
+            the offsets are byte offsets and names/attributes are decoded
+            as UTF-8.
+        start (int): Offset to start scanning from.
+
+    Yields:
+        TagToken: One token per tag.
+    """
+    if isinstance(content, str):
+        search = _TOKEN_RE.search
+        raw_text_end = _RAW_TEXT_END_RE
+        comment_open, comment_close, tag_close = '<!--', '-->', '>'
+        decode = str
+    else:
+        search = _BYTES_TOKEN_RE.search
+        raw_text_end = _BYTES_RAW_TEXT_END_RE
+        comment_open, comment_close, tag_close = b'<!--', b'-->', b'>'
+        decode = lambda value: value.decode('utf-8', 'replace')
+
+    pos = start
+    length = len(content)
+    while pos < length:
+        match = search(content, pos)
+        if match is None:
+            return
+
+        name = match.group(2)
+        if name is None:
+            token_start = match.start()
+            if match.group(0) == comment_open:
+                close = content.find(comment_close, token_start + 4)
+                pos = length if close == -1 else close + 3
+            else:
+                close = content.find(tag_close, token_start + 2)
+                pos = length if close == -1 else close + 1
+            continue
+
+        attrs_text = decode(match.group(3))
+        name = decode(name).lower()
+        self_closing = attrs_text.endswith('/')
+        pos = match.end()
+        if match.group(1):
+            yield TagToken('end', name, match.start(), pos, attrs_text, self_closing)
+            continue
+
+        yield TagToken('start', name, match.start(), pos, attrs_text, self_closing)
+        if name in RAW_TEXT_ELEMENTS and not self_closing:
+            # Jump straight to the closing tag; its token is yielded next
+            raw_end = raw_text_end[name].search(content, pos)
+            pos = length if raw_end is None else raw_end.start()
+
+def _opens_element(token):
+    return token.kind == 'start' and not token.self_closing and token.name not in VOID_ELEMENTS
+
+class SpanIndex:
+    """
+    Spans of the elements a caller is interested in, found in one pass.
+
+    Attributes:
+        elements (dict): id -> (start, end) of the first element with that id.
+        scripts (dict): src -> list of (start, end) spans of <script> elements.
+        end_tags (dict): tag name -> (start, end) of its first end tag,
+            e.g. 'body' for inserting before </body>.
+    """
+
+    def __init__(self, content, ids=(), script_srcs=(), end_tags=()):
+        """
+        Args:
+            content (str): The HTML text to index.
+            ids (iterable): Element ids to locate.
+            script_srcs (iterable): Exact script src values to locate.
+            end_tags (iterable): Tag names whose first end tag to locate.
+        """
+        self.content = content
+        self.elements = {}
+        self.scripts = {src: [] for src in script_srcs}
+        self.end_tags = {}
+        self._scan(set(ids), set(end_tags))
+
+    def _scan(self, ids, end_tags):
+        depth = {}
+        # Elements found but not yet closed: [element id, tag name, start, depth]
+        open_elements = []
+        pending_script = None
+
+        for token in iter_tags(self.content):
+            if token.kind == 'start':
+                if token.name == 'script' and self.scripts:
+                    src = parse_attrs(token.attrs_text).get('src')
+                    if src in self.scripts:
+                        pending_script = (src, token.start)
+                        if token.self_closing:
+                            self.scripts[src].append((token.start, token.end))
+                            pending_script = None
+
+                if not _opens_element(token):
+                    if ids and 'id' in token.attrs_text:
+                        element_id = parse_attrs(token.attrs_text).get('id')
+                        if element_id in ids and element_id not in self.elements:
+                            self.elements[element_id] = (token.start, token.end)
+                    continue
+
+                depth[token.name] = depth.get(token.name, 0) + 1
+                if ids and 'id' in token.attrs_text:
+                    element_id = parse_attrs(token.attrs_text).get('id')
+                    if element_id in ids and element_id not in self.elements:
+                        self.elements[element_id] = None
+                        open_elements.append([element_id, token.name, token.start, depth[token.name]])
+                continue
+
+            # End tag
+            if token.name in end_tags and token.name not in self.end_tags:
+                self.end_tags[token.name] = (token.start, token.end)
+
+            if token.name == 'script' and pending_script:
+                src, script_start = pending_script
+                self.scripts[src].append((script_start, token.end))
+                pending_script = None
+
+            current_depth = depth.get(token.name, 0)
+            if current_depth == 0:
+                continue  # Stray end tag
+            for element in open_elements:
+                if element[1] == token.name and element[3] == current_depth:
+                    self.elements[element[0]] = (element[2], token.end)
+                    open_elements.remove(element)
+                    break
+            depth[token.name] = current_depth - 1
+
+        # Elements that were never closed run to the end of the document
+        for element_id, _, start, _ in open_elements:
+            self.elements[element_id] = (start, len(self.content))
+
+    def span(self, element_id):
+        """Returns the (start, end) span of an element, or None."""
+        return self.elements.get(element_id)
+
+    def text(self, element_id):
+        """Returns the exact source text of an element, or ''."""
+        span = self.span(element_id)
+        return self.content[span[0]:span[1]] if span else ''
+
+def find_element_span(content, element_id):
+    """
+    Finds an element by id and returns its exact (start, end) span, or None.
+    """
+    return SpanIndex(content, ids=[element_id]).span(element_id)
+
+def apply_edits(content, edits):
+    """
+    Applies non-overlapping edits in a single pass.
+
+    Args:
+        content (str): The original text.
+        edits (list): (start, end, replacement) tuples in original offsets.
+            Insertions use start == end; several insertions at the same
+            offset are applied in list order, before any replacement
+            starting there.
+
+    Returns:
+        str: The edited text.
+    """
+    pieces = []
+    pos = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < pos:
+            raise ValueError(f"Overlapping edit at offset {start}")
+        pieces.append(content[pos:start])
+        pieces.append(replacement)
+        pos = end
+    pieces.append(content[pos:])
+    return ''.join(pieces)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Streaming insertion mode for append-only page patches.
+
+Patches like "add a <link> before </head>" or "add a <script> after the last
+Firebase script" don't need a DOM. The page is memory-mapped, the insertion
+points are found in one token pass over the mapped bytes (html_scan.iter_tags,
+which skips comments and inline script text), and the result is streamed to
+a temporary file next to the page that is atomically renamed over it. A page
+is never left half-written, and no full copy of it is held in memory.
+"""
+
+import os
+import mmap
+import shutil
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+from html_scan import iter_tags, parse_attrs
+
+# Byte offsets of the usual insertion points (None when not found).
+# head_end / body_end / html_end are the start of the first real </head>,
+# </body> and </html>; last_script_end is the end of the last matching
+# </script> (see scan_anchors).
+Anchors = namedtuple('Anchors', ['head_end', 'body_end', 'html_end', 'last_script_end'])
+
+@contextmanager
+def mapped(file_path):
+    """
+    Memory-maps a file read-only.
+
+    Yields:
+        mmap.mmap or bytes: The file's bytes (b'' for an empty file, which
+        cannot be mapped).
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+def scan_anchors(data, script_src=None):
+    """
+    Finds the insertion points of a page in a single token pass.
+
+    Args:
+        data (bytes or mmap): The page bytes.
+        script_src (re.Pattern): Optional str pattern; the end of the last
+            <script> whose src matches it is reported as last_script_end.
+            Without it the scan stops at the first </body>.
+
+    Returns:
+        Anchors: Byte offsets of the insertion points.
+    """
+    found = {'head': None, 'body': None, 'html': None}
+    last_script_end = None
+    in_matching_script = False
+
+    for token in iter_tags(data):
+        if token.kind == 'start':
+            if script_src is not None and token.name == 'script':
+                src = parse_attrs(token.attrs_text).get('src', '')
+                in_matching_script = bool(script_src.search(src))
+            continue
+
+        if token.name == 'script' and in_matching_script:
+            last_script_end = token.end
+            in_matching_script = False
+        elif token.name in found and found[token.name] is None:
+            found[token.name] = token.start
+            if token.name == 'body' and script_src is None:
+                break
+
+    return Anchors(found['head'], found['body'], found['html'], last_script_end)
+
+def write_spliced(file_path, data, insertions):
+    """
+    Streams the page with snippets inserted to a temp file next to it.
+
+    Args:
+        file_path (str): The page being patched.
+        data (bytes or mmap): The page's current bytes.
+        insertions (list): (offset, snippet) pairs; snippet is str (encoded
+            as UTF-8) or bytes. Snippets at the same offset keep list order.
+
+    Returns:
+        str: Path of the temp file; pass it to replace_file once the page
+        is no longer mapped.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.splice.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            pos = 0
+            for offset, snippet in sorted(insertions, key=lambda insertion: insertion[0]):
+                out.write(data[pos:offset])
+                out.write(snippet.encode('utf-8') if isinstance(snippet, str) else snippet)
+                pos = offset
+            out.write(data[pos:])
+        shutil.copymode(file_path, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def default_mode(temp_path):
+    """
+    Gives a mkstemp file the mode a new file would get from open(): 0666
+    less the umask, instead of mkstemp's 0600, which os.replace would keep.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+
+def replace_file(temp_path, file_path):
+    """Atomically renames a temp file over the page."""
+    try:
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def insert_snippet(file_path, choose_insertion, marker=None, script_src=None):
+    """
+    Inserts a snippet into a page unless it is already patched.
+
+    Args:
+        file_path (str): The page to patch.
+        choose_insertion (callable): choose_insertion(anchors) returns an
+            (offset, snippet) pair, or None if the page has no usable anchor.
+        marker (re.Pattern): Bytes pattern; if it matches anywhere in the
+            page, the page counts as already patched.
+        script_src (re.Pattern): Passed through to scan_anchors.
+
+    Returns:
+        str: 'present', 'no-anchor' or 'inserted'.
+    """
+    with mapped(file_path) as data:
+        if marker is not None and marker.search(data):
+            return 'present'
+
+        insertion = choose_insertion(scan_anchors(data, script_src))
+        if insertion is None:
+            return 'no-anchor'
+
+        temp_path = write_spliced(file_path, data, [insertion])
+
+    # The rename happens after the map is closed (required on Windows)
+    replace_file(temp_path, file_path)
+    return 'inserted'
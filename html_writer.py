@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Minimal-diff writer for pages edited through BeautifulSoup.
+
+str(soup) and soup.prettify() re-serialize the whole page: attribute quoting,
+entities, void tags and (for prettify) all whitespace come out in
+BeautifulSoup's format, even where nothing changed. Instead, take a
+SourceSnapshot right after parsing; render() then copies the original source
+text for every element that was not touched and re-serializes only the
+elements that were:
+
+    soup = BeautifulSoup(content, 'html.parser')
+    snapshot = SourceSnapshot(soup, content)
+    ... edit soup ...
+    new_content = snapshot.render()
+
+Element spans come from BeautifulSoup's source positions (html.parser records
+the line and column of every start tag) and the end tags found by
+html_scan.iter_tags. An element is "dirty" if its name, attributes or list of
+children changed; a dirty element's own start tag is kept if only its
+children changed, and untouched children and the text between them are
+copied from the source. Elements whose end could not be located (implicitly
+closed or malformed markup) are re-serialized if their parent is dirty.
+
+With verify=True (a debugging aid: it costs one or two more parses per
+page), the result is checked by re-parsing it: if it does not parse to the
+same tree as str(soup), render() falls back to str(soup).
+"""
+
+from bisect import bisect_left
+
+from bs4 import BeautifulSoup, Tag
+
+from html_scan import iter_tags
+
+def _signature(tag):
+    """The parts of a tag whose change makes it dirty (children by identity)."""
+    attrs = tuple((name, tuple(value) if isinstance(value, list) else value)
+                  for name, value in tag.attrs.items())
+    return tag.name, attrs, tuple(id(child) for child in tag.contents)
+
+class SourceSnapshot:
+    def __init__(self, soup, content):
+        """
+        Records the source span and state of every element of a freshly
+        parsed tree. Must be taken before the tree is modified.
+
+        Args:
+            soup (BeautifulSoup): The tree, parsed with 'html.parser' from content.
+            content (str): The exact text the tree was parsed from.
+        """
+        self.soup = soup
+        self.content = content
+        # Holding the original nodes keeps their id()s from being reused
+        self._nodes = list(soup.descendants)
+        self._original = {id(node) for node in self._nodes} | {id(soup)}
+        self._signatures = {id(soup): _signature(soup)}
+        self._contents = {id(soup): list(soup.contents)}
+        # id -> (start, start tag end, end tag start, end); root spans everything
+        self._spans = {id(soup): (0, 0, len(content), len(content))}
+
+        tags = [node for node in self._nodes if isinstance(node, Tag)]
+        for tag in tags:
+            self._signatures[id(tag)] = _signature(tag)
+            self._contents[id(tag)] = list(tag.contents)
+        self._locate(tags)
+
+    def _locate(self, tags):
+        content = self.content
+        tokens = list(iter_tags(content))
+        token_starts = [token.start for token in tokens]
+        start_tokens = {token.start: token for token in tokens if token.kind == 'start'}
+
+        line_starts = [0]
+        position = content.find('\n')
+        while position != -1:
+            line_starts.append(position + 1)
+            position = content.find('\n', position + 1)
+
+        # Children are located before their parents
+        for tag in reversed(tags):
+            if tag.sourceline is None or tag.sourceline > len(line_starts):
+                continue
+            start = line_starts[tag.sourceline - 1] + tag.sourcepos
+            token = start_tokens.get(start)
+            if token is None or token.name != tag.name.lower():
+                continue
+
+            if token.self_closing or tag.can_be_empty_element and not tag.contents:
+                self._spans[id(tag)] = (start, token.end, token.end, token.end)
+                continue
+
+            # The end tag must be the very next token after the last child element
+            child_tags = [child for child in tag.contents if isinstance(child, Tag)]
+            if child_tags:
+                last_span = self._spans.get(id(child_tags[-1]))
+                if last_span is None:
+                    continue
+                inner_end = last_span[3]
+            else:
+                inner_end = token.end
+
+            index = bisect_left(token_starts, inner_end)
+            if index < len(tokens) and tokens[index].kind == 'end' and tokens[index].name == token.name:
+                self._spans[id(tag)] = (start, token.end, tokens[index].start, tokens[index].end)
+
+    def _dirty_ancestry(self):
+        """Returns the ids of every element that is dirty or contains a dirty element."""
+        tainted = set()
+        for node in [self.soup] + list(self.soup.descendants):
+            if not isinstance(node, Tag):
+                continue
+            node_id = id(node)
+            if node_id in self._original and self._signatures[node_id] == _signature(node):
+                continue
+            while node is not None and id(node) not in tainted:
+                tainted.add(id(node))
+                node = node.parent
+        return tainted
+
+    def _gaps(self, tag):
+        """Maps each run of original text children to its exact source text."""
+        _, position, content_end, _ = self._spans[id(tag)]
+        gaps = {}
+        run = []
+        for child in self._contents[id(tag)]:
+            if not isinstance(child, Tag):
+                run.append(id(child))
+                continue
+            child_span = self._spans.get(id(child))
+            if run and position is not None and child_span is not None:
+                gaps[tuple(run)] = self.content[position:child_span[0]]
+            run = []
+            position = child_span[3] if child_span is not None else None
+        if run and position is not None:
+            gaps[tuple(run)] = self.content[position:content_end]
+        return gaps
+
+    def _render_start_tag(self, tag):
+        rendered = self.soup.new_tag(tag.name, attrs=dict(tag.attrs)).decode()
+        closing = f'</{tag.name}>'
+        return rendered[:-len(closing)] if rendered.endswith(closing) else rendered
+
+    def _emit(self, node, tainted, out):
+        node_id = id(node)
+        span = self._spans.get(node_id)
+        if span is None or node_id not in self._original:
+            out.append(node.decode() if isinstance(node, Tag) else node.output_ready())
+            return
+        start, content_start, content_end, end = span
+        if node_id not in tainted:
+            out.append(self.content[start:end])
+            return
+
+        same_tag = self._signatures[node_id][:2] == _signature(node)[:2]
+        out.append(self.content[start:content_start] if same_tag else self._render_start_tag(node))
+
+        gaps = self._gaps(node)
+        run = []
+        for child in node.contents + [None]:
+            if child is not None and not isinstance(child, Tag):
+                run.append(child)
+                continue
+            if run:
+                key = tuple(id(text) for text in run)
+                if key in gaps:
+                    out.append(gaps[key])
+                else:
+                    out.extend(text.output_ready() for text in run)
+                run = []
+            if child is not None:
+                self._emit(child, tainted, out)
+
+        if same_tag:
+            out.append(self.content[content_end:end])
+        elif end > content_end:
+            out.append(f'</{node.name}>')
+
+    def render(self, verify=False):
+        """
+        Serializes the (possibly edited) tree, keeping untouched source text.
+
+        Args:
+            verify (bool): Re-parse the result and fall back to str(soup) if
+                it does not serialize the same way as the edited tree.
+
+        Returns:
+            str: The new page content.
+        """
+        tainted = self._dirty_ancestry()
+        if not tainted:
+            return self.content
+
+        out = []
+        self._emit(self.soup, tainted, out)
+        rendered = ''.join(out)
+
+        if verify:
+            expected = self.soup.decode()
+            reparsed = BeautifulSoup(rendered, 'html.parser').decode()
+            # Parsing collapses adjacent whitespace strings, so compare both
+            # sides after a parse when the direct comparison fails
+            if reparsed != expected and reparsed != BeautifulSoup(expected, 'html.parser').decode():
+                return expected
+        return rendered
+
+def write_minimal(file_path, snapshot, verify=False):
+    """
+    Writes a page edited through a snapshot's tree, touching only changed spans.
+
+    Args:
+        verify (bool): Check the result by re-parsing it (see render).
+
+    Returns:
+        bool: True if the file was written, False if its content is unchanged.
+    """
+    new_content = snapshot.render(verify)
+    if new_content == snapshot.content:
+        return False
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(new_content)
+    return True
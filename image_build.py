@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Responsive image build stage for public/images.
+
+Every source JPEG in public/images is decoded once, turned upright according
+to its EXIF orientation and written as downscaled width variants in each
+output format (AVIF when Pillow supports it, WebP, and a progressive JPEG
+fallback) into public/images/responsive/. Variants are saved without the
+EXIF block, so camera metadata (GPS position included) is never served.
+
+Images are processed in a process pool (page_runner.run_pages) and recorded
+in a PageCache next to the images, so an image is only rebuilt when its
+content or the variant settings change. The variants of every image are
+listed in a manifest (public/images/.responsive.json, never deployed):
+
+    {
+      "images/IMG_9814.jpg": {
+        "width": 3024, "height": 4032,
+        "variants": {"image/webp": [["images/responsive/IMG_9814-480.webp", 480], ...], ...}
+      }
+    }
+
+The add_responsive_images transform uses the manifest to turn each <img>
+that shows one of these images into a <picture> with srcset/sizes. It is
+registered with html_pipeline, and this script runs it after a build.
+"""
+
+import os
+import json
+import argparse
+import tempfile
+from PIL import Image, ImageOps, features
+from page_runner import run_pages, print_summary
+from page_cache import PageCache, files_version
+from image_dimensions import site_path
+from html_splice import default_mode
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+IMAGES_DIR = os.path.join(PUBLIC_DIR, 'images')
+OUTPUT_DIRNAME = 'responsive'
+VARIANTS_FILENAME = '.responsive.json'
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg')
+# Variant widths in pixels. Images are never upscaled: widths above the
+# source width are dropped and the source width (capped at the largest
+# entry) is always included.
+WIDTHS = (480, 768, 1200, 1920)
+# Output formats, best first: (MIME type, extension, Pillow format, save options).
+# The last one is the <img> fallback every browser understands.
+FORMATS = (
+    ('image/avif', 'avif', 'AVIF', {'quality': 50, 'speed': 6}),
+    ('image/webp', 'webp', 'WEBP', {'quality': 75, 'method': 6}),
+    ('image/jpeg', 'jpg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+# sizes attribute for images whose tag does not set one.
+DEFAULT_SIZES = '100vw'
+# Bump this whenever the variant encoding changes, so every image is rebuilt.
+# The widths and formats are part of the cache version automatically.
+BUILD_VERSION = '2'
+# Bump this whenever the <img> rewrite changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+# EXIF orientations that rotate the image by 90 degrees.
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION = 0x0112
+
+def output_formats():
+    """Returns the FORMATS entries the installed Pillow can encode."""
+    return [entry for entry in FORMATS if entry[2] != 'AVIF' or features.check('avif')]
+
+def build_version():
+    """Returns the cache version for the current widths and formats."""
+    formats = '+'.join(extension for _, extension, _, _ in output_formats())
+    return f"{BUILD_VERSION}:{'+'.join(map(str, WIDTHS))}:{formats}"
+
+def find_images(directory=IMAGES_DIR):
+    """Returns the sorted list of source images directly in a directory."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(SOURCE_EXTENSIONS) and not name.startswith('.')
+    )
+
+def variant_widths(width):
+    """Returns the widths to build for a source image of the given width."""
+    widths = [candidate for candidate in WIDTHS if candidate < width]
+    widths.append(min(width, WIDTHS[-1]))
+    return sorted(set(widths))
+
+def upright_size(image):
+    """Returns an opened image's (width, height) after EXIF rotation, without decoding it."""
+    width, height = image.size
+    if image.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+def variant_path(file_path, width, extension):
+    """Returns the path of one variant of a source image."""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(os.path.dirname(file_path), OUTPUT_DIRNAME, f'{stem}-{width}.{extension}')
+
+def plan_variants(file_path):
+    """
+    Lists the variants of a source image from its header only.
+
+    Returns:
+        tuple: ((width, height), [(mime type, width, path), ...])
+    """
+    with Image.open(file_path) as image:
+        size = upright_size(image)
+    planned = [
+        (mime, width, variant_path(file_path, width, extension))
+        for mime, extension, _, _ in output_formats()
+        for width in variant_widths(size[0])
+    ]
+    return size, planned
+
+def _save_atomic(image, path, image_format, options):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.')
+    os.close(fd)
+    try:
+        image.save(temp_path, image_format, **options)
+        default_mode(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def build_variants(file_path, log=print):
+    """
+    Page-runner worker: writes every variant of one source image.
+
+    The image is decoded once; each width is resized from the upright
+    original and saved in every output format without EXIF data.
+
+    Returns:
+        str: 'updated'.
+    """
+    os.makedirs(os.path.join(os.path.dirname(file_path), OUTPUT_DIRNAME), exist_ok=True)
+    with Image.open(file_path) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+
+    written = 0
+    for width in variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for _, extension, image_format, options in output_formats():
+            path = variant_path(file_path, width, extension)
+            _save_atomic(resized, path, image_format, options)
+            written += os.path.getsize(path)
+
+    log(f"Built {file_path}: {image.width}x{image.height}, "
+        f"{os.path.getsize(file_path) // 1024} KB -> {written // 1024} KB across all variants")
+    return 'updated'
+
+def write_variants_manifest(image_paths, directory=IMAGES_DIR):
+    """
+    Writes the variants manifest for a list of built source images. URLs
+    are relative to the site root, the parent of the image directory.
+
+    Returns:
+        dict: The manifest.
+    """
+    public_dir = os.path.dirname(os.path.abspath(directory))
+
+    def url(path):
+        return os.path.relpath(os.path.abspath(path), public_dir).replace(os.sep, '/')
+
+    manifest = {}
+    for file_path in image_paths:
+        (width, height), planned = plan_variants(file_path)
+        variants = {}
+        for mime, variant_width, path in planned:
+            variants.setdefault(mime, []).append([url(path), variant_width])
+        manifest[url(file_path)] = {'width': width, 'height': height, 'variants': variants}
+
+    manifest_path = os.path.join(directory, VARIANTS_FILENAME)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp.', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        default_mode(temp_path)
+        os.replace(temp_path, manifest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return manifest
+
+# Variants manifest, loaded once per process by the page transform.
+_variants = None
+
+def load_variants(directory=IMAGES_DIR):
+    """Returns the variants manifest ({} if no build has run yet)."""
+    global _variants
+    if _variants is None:
+        try:
+            with open(os.path.join(directory, VARIANTS_FILENAME), 'r', encoding='utf-8') as f:
+                _variants = json.load(f)
+        except FileNotFoundError:
+            _variants = {}
+    return _variants
+
+def _srcset(candidates, root_relative):
+    prefix = '/' if root_relative else ''
+    return ', '.join(f'{prefix}{url} {width}w' for url, width in candidates)
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the variants manifest."""
+    return files_version(TRANSFORM_VERSION, [os.path.join(IMAGES_DIR, VARIANTS_FILENAME)])
+
+def add_responsive_images(soup, filename=None, log=print):
+    """
+    Wraps each <img> of a built image in a <picture> with modern-format
+    <source>s and gives the <img> a srcset of fallback variants.
+
+    Images that already have a srcset or sit in a <picture> are left alone.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    variants = load_variants()
+    if not variants:
+        return False
+
+    fallback_mime = FORMATS[-1][0]
+    modified = 0
+    for img in soup.find_all('img'):
+        if img.has_attr('srcset') or (img.parent is not None and img.parent.name == 'picture'):
+            continue
+        entry = variants.get(site_path(img.get('src')))
+        if entry is None:
+            continue
+
+        root_relative = img['src'].startswith('/')
+        sizes = img.get('sizes') or DEFAULT_SIZES
+        picture = img.wrap(soup.new_tag('picture'))
+        for mime, _, _, _ in FORMATS[:-1]:
+            if mime in entry['variants']:
+                img.insert_before(soup.new_tag('source', attrs={
+                    'type': mime,
+                    'srcset': _srcset(entry['variants'][mime], root_relative),
+                    'sizes': sizes,
+                }))
+
+        fallback = entry['variants'][fallback_mime]
+        img['src'] = ('/' if root_relative else '') + fallback[-1][0]
+        img['srcset'] = _srcset(fallback, root_relative)
+        img['sizes'] = sizes
+        modified += 1
+
+    if modified:
+        log(f"Added responsive variants to {modified} image(s) in {filename}")
+    return bool(modified)
+
+def build_images(directory=IMAGES_DIR, workers=None, use_cache=True):
+    """
+    Builds the variants of every source image and writes the manifest.
+
+    Returns:
+        list: PageResult for every source image.
+    """
+    images = find_images(directory)
+    print(f"Building responsive variants of {len(images)} image(s) in '{directory}'")
+    print(f"Widths: {', '.join(map(str, WIDTHS))}; formats: "
+          f"{', '.join(extension for _, extension, _, _ in output_formats())}")
+    print("-" * 60)
+
+    cache = PageCache('image_build', build_version(), directory) if use_cache else None
+    if cache:
+        # An image whose variants were deleted is rebuilt even if unchanged
+        for file_path in images:
+            if not all(os.path.exists(path) for _, _, path in plan_variants(file_path)[1]):
+                cache.forget(file_path)
+    results = run_pages(images, build_variants, workers, cache=cache)
+    print_summary(results, "Image Build Complete")
+
+    built = [result.path for result in results if result.status in ('updated', 'cached')]
+    manifest = write_variants_manifest(built, directory)
+
+    # What a phone downloads now: the narrowest variant in the best format
+    best_mime, best_extension = output_formats()[0][:2]
+    original = sum(os.path.getsize(path) for path in built)
+    smallest = sum(
+        os.path.getsize(os.path.join(os.path.dirname(directory), min(entry['variants'][best_mime], key=lambda c: c[1])[0]))
+        for entry in manifest.values()
+    )
+    if original:
+        print(f"Originals: {original / 1048576:.1f} MB; narrowest {best_extension} variants: "
+              f"{smallest / 1048576:.1f} MB ({100 - smallest * 100 / original:.0f}% smaller)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Build responsive image variants and add srcset to the pages')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Rebuild every image, even if unchanged since the last run')
+    parser.add_argument('--no-pages', action='store_true',
+                        help='Only build the images, do not rewrite the <img> tags')
+    args = parser.parse_args()
+
+    if not os.path.isdir(IMAGES_DIR):
+        print(f"ERROR: Image directory '{IMAGES_DIR}' not found.")
+        return False
+
+    # Images that failed to build are left out of the manifest, so their
+    # <img> tags are not rewritten and the pages can still be updated
+    results = build_images(IMAGES_DIR, args.workers, not args.no_cache)
+    if not args.no_pages:
+        from html_pipeline import run_pipeline
+        print()
+        # Rebuilt images can change their variant list, so re-check every page then
+        rebuilt = any(result.status == 'updated' for result in results)
+        run_pipeline(only=['responsive_images'], workers=args.workers,
+                     use_cache=not (rebuilt or args.no_cache))
+    return not any(result.status == 'error' for result in results)
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
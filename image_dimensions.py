@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Image dimensions from file headers, with a persistent index.
+
+read_dimensions() reads the intrinsic size of a PNG, GIF, JPEG, WebP or SVG
+from the first bytes of the file, without decoding any pixels. JPEGs are
+reported in their displayed orientation (EXIF orientations 5-8 swap the
+axes), which is what browsers use for the intrinsic size.
+
+DimensionIndex keeps the results in a small JSON file (by default
+`.image_dimensions.json` in public/, which Firebase Hosting never deploys):
+
+    {
+      "files": {"images/logo.png": {"hash": "...", "size": 1234, "mtime_ns": ...}},
+      "dimensions": {"<sha256>": [512, 512]},
+      "remote": {"https://i.imgur.com/op0pjSl.jpeg": [800, 800]}
+    }
+
+Dimensions are keyed by content hash, so renamed or duplicated files are
+never parsed twice, and size and mtime are only used as a fast path to
+avoid re-hashing files that have not been touched. Remote images are only
+looked up when fetching is enabled; their headers are read with an HTTP
+Range request.
+"""
+
+import os
+import json
+import struct
+import tempfile
+import posixpath
+import urllib.request
+from urllib.parse import urlsplit
+
+from page_cache import hash_file
+from html_scan import iter_tags, parse_attrs
+
+INDEX_FILENAME = '.image_dimensions.json'
+
+# Bytes read for a header; JPEGs with a large EXIF block are retried with
+# the larger prefix before giving up.
+HEADER_BYTES = 64 * 1024
+MAX_HEADER_BYTES = 1024 * 1024
+FETCH_TIMEOUT = 10
+
+# JPEG start-of-frame markers (every SOFn except DHT, JPG and DAC).
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_EXIF_ORIENTATION = 0x0112
+
+def _exif_orientation(segment):
+    """Returns the orientation tag of an APP1 Exif segment, or None."""
+    if not segment.startswith(b'Exif\x00\x00') or len(segment) < 14:
+        return None
+    tiff = segment[6:]
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None:
+        return None
+    ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    if ifd_offset + 2 > len(tiff):
+        return None
+    count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+    for index in range(count):
+        entry = ifd_offset + 2 + index * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, _, _ = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+        if tag == _EXIF_ORIENTATION:
+            return struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+    return None
+
+def _jpeg_dimensions(data):
+    orientation = None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):
+            pos += 2  # Markers without a length
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xE1 and orientation is None and pos + 2 + length <= len(data):
+            orientation = _exif_orientation(data[pos + 4:pos + 2 + length])
+        if marker in _JPEG_SOF:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+        pos += 2 + length
+    return None
+
+def _svg_length(value):
+    """Parses an SVG width/height in px (or unitless); None for relative units."""
+    value = value.strip()
+    if value.endswith('px'):
+        value = value[:-2]
+    try:
+        return round(float(value))
+    except ValueError:
+        return None
+
+def _svg_dimensions(data):
+    text = bytes(data).decode('utf-8', 'replace')
+    for token in iter_tags(text):
+        if token.kind != 'start' or token.name != 'svg':
+            continue
+        attrs = parse_attrs(token.attrs_text)
+        width = _svg_length(attrs['width']) if 'width' in attrs else None
+        height = _svg_length(attrs['height']) if 'height' in attrs else None
+        if width and height:
+            return width, height
+        view_box = attrs.get('viewbox', '').replace(',', ' ').split()
+        if len(view_box) == 4:
+            try:
+                return round(float(view_box[2])), round(float(view_box[3]))
+            except ValueError:
+                return None
+        return None
+    return None
+
+def site_path(src):
+    """
+    Maps an image URL from a page to its path relative to the site root.
+
+    Returns:
+        str: e.g. 'images/logo.png', or None for remote or empty URLs.
+    """
+    parts = urlsplit(src or '')
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    return posixpath.normpath(parts.path.lstrip('/'))
+
+def read_dimensions(data):
+    """
+    Reads an image's intrinsic size from the start of its file.
+
+    Args:
+        data (bytes): The first bytes of the image file.
+
+    Returns:
+        tuple: (width, height), or None if the format is unknown or the
+        header is not complete in data.
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'\xff\xd8':
+        return _jpeg_dimensions(data)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    if b'<svg' in data[:HEADER_BYTES]:
+        return _svg_dimensions(data)
+    return None
+
+def read_file_dimensions(file_path):
+    """Reads a local image's size from its header; None if unreadable."""
+    with open(file_path, 'rb') as f:
+        data = f.read(HEADER_BYTES)
+        dimensions = read_dimensions(data)
+        if dimensions is None and data[:2] == b'\xff\xd8':
+            dimensions = read_dimensions(data + f.read(MAX_HEADER_BYTES - HEADER_BYTES))
+    return tuple(dimensions) if dimensions else None
+
+def fetch_dimensions(url):
+    """Reads a remote image's size from a ranged request for its header."""
+    for limit in (HEADER_BYTES, MAX_HEADER_BYTES):
+        request = urllib.request.Request(url, headers={'Range': f'bytes=0-{limit - 1}'})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(limit)
+        dimensions = read_dimensions(data)
+        if dimensions is not None or len(data) < limit:
+            return tuple(dimensions) if dimensions else None
+    return None
+
+class DimensionIndex:
+    def __init__(self, directory='.', index_file=None):
+        """
+        Args:
+            directory (str): Site root; local paths are stored relative to it.
+            index_file (str): Explicit index path (default: in directory).
+        """
+        self.base_dir = os.path.abspath(directory)
+        self.index_file = os.path.abspath(index_file or os.path.join(directory, INDEX_FILENAME))
+        index = self._load()
+        self.files = index.get('files', {})
+        self.dimensions = index.get('dimensions', {})
+        self.remote = index.get('remote', {})
+        self.dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable dimension index {self.index_file}: {e}")
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.base_dir).replace(os.sep, '/')
+
+    def lookup(self, file_path):
+        """
+        Returns a local image's (width, height), reading its header only if
+        its content has not been seen before.
+
+        Returns:
+            tuple: (width, height), or None if the file is missing or unreadable.
+        """
+        key = self._key(file_path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        entry = self.files.get(key)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            digest = entry['hash']
+        else:
+            digest = hash_file(file_path)
+            self.files[key] = {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            self.dirty = True
+
+        if digest not in self.dimensions:
+            try:
+                dimensions = read_file_dimensions(file_path)
+            except OSError:
+                return None
+            self.dimensions[digest] = list(dimensions) if dimensions else None
+            self.dirty = True
+        dimensions = self.dimensions[digest]
+        return tuple(dimensions) if dimensions else None
+
+    def lookup_url(self, url, fetch=False):
+        """
+        Returns a remote image's (width, height) from the index, fetching
+        its header first if fetch is True and it is not indexed yet.
+        """
+        if url not in self.remote and fetch:
+            try:
+                dimensions = fetch_dimensions(url)
+            except (OSError, ValueError) as e:
+                print(f"WARNING: Could not fetch {url}: {e}")
+                return None
+            self.remote[url] = list(dimensions) if dimensions else None
+            self.dirty = True
+        dimensions = self.remote.get(url)
+        return tuple(dimensions) if dimensions else None
+
+    def save(self):
+        """Writes the index atomically, if anything was added."""
+        if not self.dirty:
+            return
+        # Drop files that no longer exist and dimensions no file refers to
+        self.files = {key: entry for key, entry in self.files.items()
+                      if os.path.exists(os.path.join(self.base_dir, key))}
+        referenced = {entry['hash'] for entry in self.files.values()}
+        self.dimensions = {digest: value for digest, value in self.dimensions.items() if digest in referenced}
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_file), prefix='.image_dimensions.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'files': self.files, 'dimensions': self.dimensions, 'remote': self.remote},
+                          f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.index_file)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.dirty = False
@@ -1,5 +1,7 @@
 import os
+import argparse
 from bs4 import BeautifulSoup
+from page_runner import run_pages, print_summary
 
 # --- CONFIGURATION ---
 # The directory where your HTML files are located
@@ -35,68 +37,105 @@ IDS_TO_ADD = {
     ]
 }
 
-def process_html_files():
+def add_tour_to_page(soup, filename, log=print):
+    """
+    Injects the tour scripts and the element IDs the tour steps rely on.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used to pick the tour IDs.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    if filename not in TOUR_PAGES:
+        return False
+
+    made_change = False
+
+    # Check if scripts are already present to avoid duplication
+    if soup.find('script', src=lambda src: src and 'shepherd.min.js' in src):
+        log(f"  - Tour scripts already exist in {filename}. Skipping script injection.")
+    else:
+        body_tag = soup.find('body')
+        if body_tag:
+            # Parse the scripts snippet and append it
+            scripts_soup = BeautifulSoup(SCRIPTS_TO_ADD, 'html.parser')
+            body_tag.append(scripts_soup)
+            log(f"  + Injected tour scripts into {filename}.")
+            made_change = True
+        else:
+            log(f"  - Could not find <body> tag in {filename}. Skipping script injection.")
+
+    # Add necessary IDs for tour steps
+    for selector, new_id in IDS_TO_ADD.get(filename, []):
+        element = soup.select_one(selector)
+        if element and not element.has_attr('id'):
+            element['id'] = new_id
+            log(f"  + Added id='{new_id}' to an element in {filename}.")
+            made_change = True
+        elif element and element.get('id') == new_id:
+            pass # ID already exists, do nothing
+        else:
+            log(f"  - Warning: Could not find selector '{selector}' in {filename}.")
+
+    return made_change
+
+def install_tour_in_file(filepath, log=print):
+    """
+    Injects the tour scripts and element IDs into a single HTML file.
+
+    Args:
+        filepath (str): Path to the HTML file.
+        log (callable): Receives progress messages.
+
+    Returns:
+        str: 'updated' or 'unchanged'.
+    """
+    filename = os.path.basename(filepath)
+    log(f"Processing: {filepath}...")
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Write back to the file only if changes were made
+    if not add_tour_to_page(soup, filename, log):
+        return 'unchanged'
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(str(soup.prettify()))
+    return 'updated'
+
+def process_html_files(workers=None):
     """
     Processes all specified HTML files to inject tour scripts and element IDs.
+
+    Args:
+        workers (int): Number of worker processes (default: one per CPU).
     """
-    modified_files_count = 0
-    
     # Use os.walk to find files, making it more robust
+    tour_files = []
     for root, _, files in os.walk(PUBLIC_DIR):
         for filename in files:
             if filename in TOUR_PAGES:
-                filepath = os.path.join(root, filename)
-                print(f"Processing: {filepath}...")
-                
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-
-                    # Check if scripts are already present to avoid duplication
-                    if 'shepherd.min.js' in content:
-                        print(f"  - Tour scripts already exist in {filename}. Skipping script injection.")
-                        soup = BeautifulSoup(content, 'html.parser')
-                        made_change = False
-                    else:
-                        soup = BeautifulSoup(content, 'html.parser')
-                        body_tag = soup.find('body')
-                        if body_tag:
-                            # Parse the scripts snippet and append it
-                            scripts_soup = BeautifulSoup(SCRIPTS_TO_ADD, 'html.parser')
-                            body_tag.append(scripts_soup)
-                            print(f"  + Injected tour scripts into {filename}.")
-                            made_change = True
-                        else:
-                            print(f"  - Could not find <body> tag in {filename}. Skipping script injection.")
-                            made_change = False
-                    
-                    # Add necessary IDs for tour steps
-                    if filename in IDS_TO_ADD:
-                        id_mappings = IDS_TO_ADD[filename]
-                        for selector, new_id in id_mappings:
-                            element = soup.select_one(selector)
-                            if element and not element.has_attr('id'):
-                                element['id'] = new_id
-                                print(f"  + Added id='{new_id}' to an element in {filename}.")
-                                made_change = True
-                            elif element and element.get('id') == new_id:
-                                pass # ID already exists, do nothing
-                            else:
-                                print(f"  - Warning: Could not find selector '{selector}' in {filename}.")
-
-                    # Write back to the file only if changes were made
-                    if made_change:
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            f.write(str(soup.prettify()))
-                        modified_files_count += 1
-
-                except Exception as e:
-                    print(f"  - ERROR processing {filename}: {e}")
+                tour_files.append(os.path.join(root, filename))
 
+    results = run_pages(sorted(tour_files), install_tour_in_file, workers)
+    print_summary(results, "Tour Installation")
+
+    modified_files_count = sum(1 for result in results if result.status == 'updated')
     print("\n-----------------------------------------")
     print(f"Script finished. Modified {modified_files_count} files.")
     print("Your website is now ready for the guided tour!")
     print("-----------------------------------------")
 
 if __name__ == '__main__':
-    process_html_files()
+    parser = argparse.ArgumentParser(description='Install the guided tour scripts and element IDs')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    process_html_files(args.workers)
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Per-page JavaScript bundles for public/js.
+
+Pages load their local scripts (auth.js, mobile-navigation-fixed.js, the
+page script from finalize_and_fix_scripts.PAGE_SCRIPTS, darkmode.js, ...) as
+separate requests. This script:
+
+1. Finds, on every page, the runs of local classic scripts that can be
+   concatenated without changing when any of them executes: blocking
+   scripts directly next to each other, or `defer` scripts with no other
+   deferred script (remote, module) between them.
+2. Splits a run where two files declare the same top-level let/const/class/
+   function, since concatenated they would clash where separate scripts do
+   not. The longest run prefix shared by COMMON_MIN_PAGES or more pages
+   (never a page script) becomes the common chunk, loaded before each page's
+   own bundle so browsers cache it once.
+3. Minifies each chunk (comments and indentation removed, line breaks kept
+   so automatic semicolon insertion is unaffected) into a content-hashed
+   file in public/js/bundles/. Local import() specifiers are rewritten for
+   the new location (a classic script resolves them against its own URL)
+   and to the fingerprinted modules of fingerprint_assets.py. A chunk is only rebuilt when the hashes of
+   its input files change; the bundle manifest (public/js/bundles/.bundles.json,
+   never deployed) records which bundles stand for which scripts.
+4. Runs the 'js_bundles' pipeline transform, which replaces each run with
+   its bundles:
+
+    <script defer src="js/bundles/common.3f1c2a9b0d.js"
+            data-bundle="js/auth.js js/mobile-navigation-fixed.js"></script>
+
+The data-bundle attribute keeps the source list on the page, so later
+builds (and the transform, when a source changes) start from the original
+scripts again. Module, async and remote scripts are never bundled.
+
+Concatenation has one unavoidable difference: an exception thrown at the
+top level of one file now also stops the files after it in the same bundle.
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import tempfile
+from collections import defaultdict
+from bs4 import BeautifulSoup, Comment, Tag
+from image_dimensions import site_path
+from finalize_and_fix_scripts import PAGE_SCRIPTS
+from fingerprint_assets import source_asset, load_fingerprints
+from js_minify import minify_js
+from modules import rewrite_imports
+from html_splice import default_mode
+from page_cache import files_version
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+BUNDLE_DIR = os.path.join(PUBLIC_DIR, 'js', 'bundles')
+MANIFEST_FILENAME = '.bundles.json'
+
+# A run prefix loaded by at least this many pages becomes the common chunk.
+COMMON_MIN_PAGES = 3
+# Bump this whenever the minifier or the bundle layout changes, so every bundle is rebuilt.
+BUNDLE_VERSION = '3'
+# Bump this whenever the <script> rewrite changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+_JS_TYPES = ('', 'text/javascript', 'application/javascript')
+# Attributes a bundled <script> may have; anything else (id, onload, ...) is kept as is.
+_BUNDLE_ATTRS = {'src', 'defer', 'type', 'data-bundle'}
+_TOP_LEVEL_DECL_RE = re.compile(r'^(?:let|const|class|(?:async\s+)?function\s*\*?)\s*([A-Za-z_$][\w$]*)', re.MULTILINE)
+
+# --- Runs ---
+def top_level_names(file_path):
+    """Returns the names a script declares with unindented let/const/class/function."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return set(_TOP_LEVEL_DECL_RE.findall(f.read()))
+
+def bundle_members(script, public_dir=PUBLIC_DIR):
+    """
+    Returns the local scripts a <script> tag loads (several for a bundle),
+    or None if it cannot be bundled.
+    """
+    if (script.get('type') or '').strip().lower() not in _JS_TYPES or script.has_attr('async'):
+        return None
+    if not set(script.attrs) <= _BUNDLE_ATTRS or not script.get('src'):
+        return None
+    if script.get('data-bundle'):
+        return script['data-bundle'].split()
+    path = site_path(script['src'])
+    if path is None or not path.endswith('.js') or not os.path.isfile(os.path.join(public_dir, path)):
+        return None
+    return [source_asset(path, public_dir)]
+
+def _follows(previous, script):
+    """Checks whether only whitespace and comments separate two sibling tags."""
+    for sibling in script.previous_siblings:
+        if sibling is previous:
+            return True
+        if isinstance(sibling, Comment):
+            continue
+        if isinstance(sibling, Tag) or sibling.strip():
+            return False
+    return False
+
+def script_runs(soup, public_dir=PUBLIC_DIR):
+    """
+    Returns the runs of the page's local scripts that can be replaced by one
+    concatenation, in document order.
+
+    Returns:
+        list: (mode, tags, members) tuples; mode is 'blocking' or 'defer',
+            members the local script paths in execution order.
+    """
+    runs = []
+    open_runs = {}
+    for script in soup.find_all('script'):
+        script_type = (script.get('type') or '').strip().lower()
+        members = bundle_members(script, public_dir)
+        mode = None
+        if members:
+            mode = 'defer' if script.has_attr('defer') else 'blocking'
+
+        # Any other script ends the blocking run; another deferred script
+        # (remote, module, ...) ends the deferred run.
+        blocking = open_runs.get('blocking')
+        if blocking and not (mode == 'blocking' and _follows(blocking[1][-1], script)):
+            del open_runs['blocking']
+        in_defer_queue = script_type == 'module' or (script.get('src') and script.has_attr('defer')
+                                                     and not script.has_attr('async'))
+        if 'defer' in open_runs and in_defer_queue and mode != 'defer':
+            del open_runs['defer']
+
+        if mode is None:
+            continue
+        if mode in open_runs:
+            open_runs[mode][1].append(script)
+            open_runs[mode][2].extend(members)
+        else:
+            run = (mode, [script], list(members))
+            open_runs[mode] = run
+            runs.append(run)
+    return runs
+
+# --- Build ---
+def _run_key(members):
+    return ' '.join(members)
+
+def manifest_path(bundle_dir=BUNDLE_DIR):
+    return os.path.join(bundle_dir, MANIFEST_FILENAME)
+
+def load_manifest(bundle_dir=BUNDLE_DIR):
+    """Returns the bundle manifest, or None if no bundles were built."""
+    try:
+        with open(manifest_path(bundle_dir), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == BUNDLE_VERSION else None
+
+def split_conflicts(members, public_dir=PUBLIC_DIR):
+    """Splits a run wherever a file redeclares a top-level name of the files before it."""
+    segments, declared = [], set()
+    for member in members:
+        names = top_level_names(os.path.join(public_dir, member))
+        if not segments or names & declared:
+            segments.append([])
+            declared = set()
+        segments[-1].append(member)
+        declared |= names
+    return segments
+
+def common_chunk(page_segments, public_dir=PUBLIC_DIR):
+    """
+    Picks the run prefix worth sharing across pages: the one saving the most
+    bytes over pages loading it again, among prefixes of COMMON_MIN_PAGES or
+    more pages. Page scripts are never part of it.
+
+    Args:
+        page_segments (dict): page file name -> list of segments (member lists).
+
+    Returns:
+        tuple: The common chunk's members, or None.
+    """
+    page_scripts = set(PAGE_SCRIPTS.values())
+    pages_by_prefix = defaultdict(set)
+    for page, segments in page_segments.items():
+        for segment in segments:
+            for length in range(1, len(segment) + 1):
+                if segment[length - 1] in page_scripts:
+                    break
+                pages_by_prefix[tuple(segment[:length])].add(page)
+
+    best, best_saving = None, 0
+    for prefix, pages in sorted(pages_by_prefix.items()):
+        if len(pages) < COMMON_MIN_PAGES:
+            continue
+        saving = (len(pages) - 1) * sum(os.path.getsize(os.path.join(public_dir, m)) for m in prefix)
+        if saving > best_saving:
+            best, best_saving = prefix, saving
+    return best
+
+def _chunk_label(chunk, pages, common):
+    """Names a bundle after the page it serves, or the page whose script it holds."""
+    if tuple(chunk) == common:
+        return 'common'
+    if len(pages) == 1:
+        return os.path.splitext(next(iter(pages)))[0]
+    for page in sorted(pages):
+        if PAGE_SCRIPTS.get(page) in chunk:
+            return os.path.splitext(page)[0]
+    return 'shared'
+
+def _write_atomic(path, content):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.', suffix='.js')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        default_mode(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def build_chunk(chunk, label, inputs, public_dir=PUBLIC_DIR, bundle_dir=BUNDLE_DIR, fingerprints=None):
+    """
+    Returns the href of a chunk's bundle, building it unless a bundle of the
+    same inputs exists.
+
+    import() specifiers of classic scripts resolve against the script's own
+    URL, so each member's local imports are rewritten for the bundle
+    directory (and to the fingerprinted modules, if any) first.
+
+    Args:
+        chunk (list): Member script paths, in execution order.
+        label (str): Name prefix of a new bundle file.
+        inputs (dict): Input key -> href of the bundles built so far (updated).
+        fingerprints (dict): Source -> fingerprinted path of the assets.
+
+    Returns:
+        tuple: (href, True if the bundle was built now)
+    """
+    output = os.path.relpath(os.path.join(bundle_dir, label + '.js'), public_dir).replace(os.sep, '/')
+    sources = []
+    digest = hashlib.sha256(BUNDLE_VERSION.encode('ascii'))
+    for member in chunk:
+        with open(os.path.join(public_dir, member), 'r', encoding='utf-8') as f:
+            code = rewrite_imports(f.read(), member, output, fingerprints, public_dir)
+        sources.append(code)
+        digest.update(f'\n{member}:'.encode('utf-8') + hashlib.sha256(code.encode('utf-8')).digest())
+    key = digest.hexdigest()
+    href = inputs.get(key)
+    if href and os.path.exists(os.path.join(public_dir, href)):
+        return href, False
+
+    parts = [minify_js(code) for code in sources]
+    # A ';' between files, so one ending without a semicolon cannot merge with the next
+    content = '\n;\n'.join(parts) + '\n'
+    name = f"{label}.{hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]}.js"
+    os.makedirs(bundle_dir, exist_ok=True)
+    _write_atomic(os.path.join(bundle_dir, name), content)
+    href = os.path.relpath(os.path.join(bundle_dir, name), public_dir).replace(os.sep, '/')
+    inputs[key] = href
+    return href, True
+
+def build_bundles(pages, public_dir=PUBLIC_DIR, bundle_dir=BUNDLE_DIR):
+    """
+    Builds the bundles for every script run of the pages and writes the
+    bundle manifest. Bundle files no run uses any more are removed.
+
+    Returns:
+        tuple: (manifest dict, True if the manifest changed)
+    """
+    previous = load_manifest(bundle_dir) or {}
+    page_runs = {}
+    run_segments = {}
+    for page in pages:
+        with open(page, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), 'html.parser')
+        keys = []
+        for _, _, members in script_runs(soup, public_dir):
+            key = _run_key(members)
+            if key not in run_segments:
+                run_segments[key] = split_conflicts(members, public_dir)
+            keys.append(key)
+        page_runs[os.path.basename(page)] = keys
+
+    common = common_chunk({page: [segment for key in keys for segment in run_segments[key]]
+                           for page, keys in page_runs.items()}, public_dir)
+    run_chunks = {}
+    for key, segments in run_segments.items():
+        chunks = []
+        for segment in segments:
+            if common and tuple(segment[:len(common)]) == common:
+                chunks.append(list(common))
+                segment = segment[len(common):]
+            if segment:
+                chunks.append(segment)
+        run_chunks[key] = chunks
+    pages_by_chunk = defaultdict(set)
+    for page, keys in page_runs.items():
+        for key in keys:
+            for chunk in run_chunks[key]:
+                pages_by_chunk[_run_key(chunk)].add(page)
+
+    inputs = dict(previous.get('inputs', {}))
+    fingerprints = load_fingerprints(public_dir)
+    bundles, runs = {}, {}
+    built = 0
+    for key, chunks in sorted(run_chunks.items()):
+        hrefs = []
+        for chunk in chunks:
+            label = _chunk_label(chunk, pages_by_chunk[_run_key(chunk)], common)
+            href, new = build_chunk(chunk, label, inputs, public_dir, bundle_dir, fingerprints)
+            built += new
+            bundles[href] = chunk
+            hrefs.append(href)
+        runs[key] = hrefs
+
+    used = set(bundles)
+    inputs = {key: href for key, href in inputs.items() if href in used}
+    manifest = {'version': BUNDLE_VERSION, 'common': list(common or []),
+                'runs': runs, 'bundles': bundles, 'inputs': inputs}
+    changed = manifest != previous
+    if changed:
+        os.makedirs(bundle_dir, exist_ok=True)
+        with open(manifest_path(bundle_dir), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    for name in os.listdir(bundle_dir) if os.path.isdir(bundle_dir) else []:
+        href = os.path.relpath(os.path.join(bundle_dir, name), public_dir).replace(os.sep, '/')
+        if name.endswith('.js') and href not in used:
+            os.remove(os.path.join(bundle_dir, name))
+    return manifest, changed
+
+# --- Transform ---
+_manifest = None
+
+def bundle_manifest():
+    """Returns the process's bundle manifest (None if none was built)."""
+    global _manifest
+    if _manifest is None:
+        _manifest = load_manifest() or {}
+    return _manifest or None
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the bundle manifest."""
+    return files_version(TRANSFORM_VERSION, [manifest_path()])
+
+def bundle_scripts(soup, filename=None, log=print):
+    """
+    Replaces each run of local scripts with its bundles from the manifest.
+    Runs the manifest does not know are restored to their source scripts.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    manifest = bundle_manifest()
+    if manifest is None:
+        return False
+
+    requests_before = requests_after = 0
+    modified = False
+    for mode, tags, members in script_runs(soup):
+        hrefs = manifest['runs'].get(_run_key(members))
+        wanted = [(href, manifest['bundles'][href]) for href in hrefs] if hrefs \
+            else [(member, None) for member in members]
+        current = [(tag['src'], tag['data-bundle'].split() if tag.get('data-bundle') else None) for tag in tags]
+        requests_before += len(members)
+        requests_after += len(wanted)
+        if current == wanted:
+            continue
+
+        # Each new tag takes the place of one old tag; any extra ones
+        # follow the last of them
+        previous = None
+        for index, (src, bundle) in enumerate(wanted):
+            attrs = {'src': src}
+            if mode == 'defer':
+                attrs['defer'] = ''
+            if bundle:
+                attrs['data-bundle'] = ' '.join(bundle)
+            tag = soup.new_tag('script', attrs=attrs)
+            if index < len(tags):
+                tags[index].replace_with(tag)
+            else:
+                previous.insert_after(tag)
+                previous.insert_after('\n')
+            previous = tag
+        for tag in tags[len(wanted):]:
+            tag.decompose()
+        modified = True
+
+    if modified:
+        log(f"Bundled the scripts of {filename}: {requests_before} request(s) -> {requests_after}")
+    return modified
+
+def main():
+    parser = argparse.ArgumentParser(description='Bundle and minify the local scripts of every page in public/')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    parser.add_argument('--no-pages', action='store_true',
+                        help='Only build the bundles, do not rewrite the <script> tags')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    from html_pipeline import run_pipeline, find_pages
+
+    manifest, changed = build_bundles(find_pages(PUBLIC_DIR))
+    source_size = bundle_size = 0
+    for href, members in sorted(manifest['bundles'].items()):
+        members_size = sum(os.path.getsize(os.path.join(PUBLIC_DIR, m)) for m in members)
+        size = os.path.getsize(os.path.join(PUBLIC_DIR, href))
+        source_size += members_size
+        bundle_size += size
+        print(f"  {href:<45} {len(members):>2} file(s)  {members_size / 1024:>7.1f} KB -> {size / 1024:>6.1f} KB")
+    print(f"{len(manifest['bundles'])} bundle(s), {source_size / 1024:.1f} KB -> {bundle_size / 1024:.1f} KB"
+          + (f"; common chunk: {' '.join(manifest['common'])}" if manifest['common'] else ''))
+
+    if not args.no_pages:
+        print()
+        run_pipeline(PUBLIC_DIR, only=['js_bundles'], workers=args.workers,
+                     use_cache=not (changed or args.no_cache))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
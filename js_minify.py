@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Whitespace and comment minifier for the site's JavaScript.
+
+minify_js() tokenizes just enough of the language (strings, template
+literals with nested substitutions, regular expression literals, comments)
+to drop comments and indentation without touching any literal. Line breaks
+are kept, collapsed to one, so automatic semicolon insertion sees the same
+statements; identifiers are never renamed.
+"""
+
+import re
+
+_WORD_RE = re.compile(r'[\w$]+')
+_WHITESPACE = ' \t\r\n\f\v\ufeff\u00a0'
+# Characters after which a '/' starts a regular expression, not a division.
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^}')
+_REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                   'throw', 'case', 'do', 'else', 'yield', 'await'}
+# Punctuation that never needs a space next to it.
+_SPACE_OPTIONAL = set('{}()[];,:=?<>&|*%^~')
+
+def _string_end(code, index):
+    quote = code[index]
+    index += 1
+    while index < len(code) and code[index] not in (quote, '\n'):
+        index += 2 if code[index] == '\\' else 1
+    return min(index + 1, len(code))
+
+def _template_chunk(code, index):
+    """
+    Scans template literal text from index; returns (end, True) if it stops
+    at a '${' substitution, (end, False) at the closing backtick.
+    """
+    while index < len(code):
+        if code[index] == '\\':
+            index += 2
+        elif code[index] == '`':
+            return index + 1, False
+        elif code.startswith('${', index):
+            return index + 2, True
+        else:
+            index += 1
+    return len(code), False
+
+def _regex_end(code, index):
+    """Returns the end of the regular expression literal at index, or None."""
+    in_class = False
+    pos = index + 1
+    while pos < len(code):
+        char = code[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == '\n':
+            return None
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            flags = _WORD_RE.match(code, pos + 1)
+            return flags.end() if flags else pos + 1
+        pos += 1
+    return None
+
+def minify_js(code):
+    """
+    Removes the comments and redundant whitespace of a script.
+
+    Line breaks are kept (collapsed to one) so automatic semicolon insertion
+    still sees them; /*! ... */ license comments are kept.
+    """
+    out = []
+    gap = ''  # whitespace seen since the last token: '', ' ' or '\n'
+    templates = []  # brace depths at which a template substitution ends
+    depth = 0
+    index, length = 0, len(code)
+
+    def emit(token):
+        nonlocal gap
+        if out and gap == '\n':
+            out.append('\n')
+        elif out and gap and out[-1][-1] not in _SPACE_OPTIONAL and token[0] not in _SPACE_OPTIONAL:
+            out.append(' ')
+        out.append(token)
+        gap = ''
+
+    def skip(text):
+        nonlocal gap
+        gap = '\n' if gap == '\n' or '\n' in text else ' '
+
+    def regex_allowed():
+        if not out:
+            return True
+        last = out[-1]
+        tail = (out[-2][-1:] if len(out) > 1 else '') + last
+        if tail.endswith(('++', '--')):
+            return False
+        return last[-1] in _REGEX_AFTER or last in _REGEX_KEYWORDS
+
+    while index < length:
+        char = code[index]
+        if char in _WHITESPACE:
+            end = index + 1
+            while end < length and code[end] in _WHITESPACE:
+                end += 1
+            skip(code[index:end])
+            index = end
+        elif code.startswith('//', index):
+            end = code.find('\n', index)
+            index = length if end == -1 else end
+            skip(' ')
+        elif code.startswith('/*', index):
+            end = code.find('*/', index + 2)
+            end = length if end == -1 else end + 2
+            if code.startswith('/*!', index):
+                emit(code[index:end])
+            else:
+                skip(code[index:end])
+            index = end
+        elif char in '\'"':
+            end = _string_end(code, index)
+            emit(code[index:end])
+            index = end
+        elif char == '`' or (char == '}' and templates and depth - 1 == templates[-1]):
+            if char == '}':
+                depth -= 1
+                templates.pop()
+            end, substitution = _template_chunk(code, index + 1)
+            if substitution:
+                templates.append(depth)
+                depth += 1
+            emit(code[index:end])
+            index = end
+        elif char == '/' and regex_allowed() and _regex_end(code, index):
+            end = _regex_end(code, index)
+            emit(code[index:end])
+            index = end
+        else:
+            word = _WORD_RE.match(code, index)
+            if word:
+                emit(word.group())
+                index = word.end()
+                continue
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+            emit(char)
+            index += 1
+    return ''.join(out)
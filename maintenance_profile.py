@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling for the page maintenance runs.
+
+A PageProfile records the wall-clock and CPU time of each phase of processing
+one page (read, parse, transform, serialize, write), with transform phases
+tagged by transform name. Workers receive the profile as a `profile` keyword
+argument (see page_runner.run_pages(profile=True)) and return it with their
+result, so profiling works the same with any number of worker processes.
+
+With a cProfile directory, every transform phase also runs under cProfile.
+The per-page dumps are merged into one `<transform>.prof` file per
+transform, which can be opened with `python -m pstats` or snakeviz.
+
+    with profile.phase('parse'):
+        soup = BeautifulSoup(content, 'html.parser')
+"""
+
+import os
+import json
+import time
+import cProfile
+import pstats
+import tempfile
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+PHASES = ('read', 'parse', 'transform', 'serialize', 'write')
+
+# One timed phase. transform is the transform name for 'transform' phases.
+PhaseTiming = namedtuple('PhaseTiming', ['phase', 'transform', 'wall', 'cpu'])
+
+class PageProfile:
+    def __init__(self, cprofile_dir=None):
+        """
+        Args:
+            cprofile_dir (str): If given, run transform phases under
+                cProfile and dump the stats into this directory.
+        """
+        self.cprofile_dir = cprofile_dir
+        self.timings = []
+        self.dumps = []
+
+    @contextmanager
+    def phase(self, phase, transform=None):
+        """Times the enclosed block as one phase."""
+        profiler = cProfile.Profile() if self.cprofile_dir and transform else None
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        # The profiler only covers the block itself, not the timing code
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self.timings.append(PhaseTiming(phase, transform, wall, cpu))
+            if profiler is not None:
+                self._dump(profiler, transform)
+
+    def _dump(self, profiler, transform):
+        os.makedirs(self.cprofile_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.cprofile_dir, prefix=f'.{transform}.', suffix='.prof')
+        os.close(fd)
+        profiler.dump_stats(path)
+        self.dumps.append((transform, path))
+
+def merge_cprofile_dumps(results, cprofile_dir):
+    """
+    Merges the per-page cProfile dumps into one file per transform.
+
+    Returns:
+        dict: Transform name -> path of its merged .prof file.
+    """
+    by_transform = defaultdict(list)
+    for result in results:
+        if result.profile:
+            for transform, path in result.profile.dumps:
+                by_transform[transform].append(path)
+
+    merged = {}
+    for transform, paths in by_transform.items():
+        stats = pstats.Stats(paths[0])
+        for path in paths[1:]:
+            stats.add(path)
+        merged[transform] = os.path.join(cprofile_dir, f'{transform}.prof')
+        stats.dump_stats(merged[transform])
+        for path in paths:
+            os.remove(path)
+    return merged
+
+def build_report(results):
+    """
+    Builds the timing report for a run.
+
+    Args:
+        results (list): PageResult objects from page_runner.run_pages.
+
+    Returns:
+        dict: Per-file phase timings plus totals per phase and per transform.
+    """
+    files = {}
+    phases = defaultdict(lambda: {'wall': 0.0, 'cpu': 0.0})
+    transforms = defaultdict(lambda: {'wall': 0.0, 'cpu': 0.0, 'pages': 0})
+
+    for result in results:
+        if not result.profile:
+            continue
+        entries = []
+        for timing in result.profile.timings:
+            entries.append(timing._asdict())
+            phases[timing.phase]['wall'] += timing.wall
+            phases[timing.phase]['cpu'] += timing.cpu
+            if timing.transform:
+                transforms[timing.transform]['wall'] += timing.wall
+                transforms[timing.transform]['cpu'] += timing.cpu
+                transforms[timing.transform]['pages'] += 1
+        files[result.path] = {'status': result.status, 'seconds': result.seconds, 'phases': entries}
+
+    return {
+        'files': files,
+        'phases': {phase: phases[phase] for phase in PHASES if phase in phases},
+        'transforms': dict(transforms),
+    }
+
+def write_report(report, path):
+    """Writes a report as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def hot_spots(report, top=10):
+    """
+    Returns the most expensive (file, phase) pairs by wall time.
+
+    Returns:
+        list: (wall, cpu, path, label) tuples, most expensive first.
+    """
+    spots = []
+    for path, entry in report['files'].items():
+        for timing in entry['phases']:
+            label = f"{timing['phase']}:{timing['transform']}" if timing['transform'] else timing['phase']
+            spots.append((timing['wall'], timing['cpu'], path, label))
+    spots.sort(reverse=True)
+    return spots[:top]
+
+def print_report(report, top=10, cprofile_files=None):
+    """Prints the phase and transform totals and the top hot spots."""
+    print("\n--- Profile ---")
+    print(f"  {'phase':28} {'wall s':>9} {'cpu s':>9}")
+    for phase, totals in report['phases'].items():
+        print(f"  {phase:28} {totals['wall']:9.3f} {totals['cpu']:9.3f}")
+
+    if report['transforms']:
+        print(f"\n  {'transform':28} {'wall s':>9} {'cpu s':>9} {'ms/page':>9}")
+        ranked = sorted(report['transforms'].items(), key=lambda item: item[1]['wall'], reverse=True)
+        for name, totals in ranked:
+            per_page = totals['wall'] * 1000 / totals['pages'] if totals['pages'] else 0.0
+            print(f"  {name:28} {totals['wall']:9.3f} {totals['cpu']:9.3f} {per_page:9.1f}")
+
+    print(f"\n  Top {top} hot spots:")
+    for wall, cpu, path, label in hot_spots(report, top):
+        print(f"  {wall * 1000:9.1f} ms  {cpu * 1000:9.1f} ms cpu  {label:28} {os.path.basename(path)}")
+
+    for name, path in sorted((cprofile_files or {}).items()):
+        print(f"\n  Top functions in {name} ({path}):")
+        pstats.Stats(path).sort_stats('cumulative').print_stats(5)
@@ -1,5 +1,30 @@
 import os
 import re
+import glob
+import posixpath
+from js_minify import minify_js
+from image_dimensions import site_path
+from fingerprint_assets import is_fingerprinted, source_asset
+from page_cache import files_version
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+MODULES_DIR = os.path.join(PUBLIC_DIR, 'js', 'modules')
+# Bump this whenever the injected preload links change, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+
+# Static imports and re-exports ("import x from 'y'", "import 'y'",
+# "export * from 'y'") and dynamic import('y') calls, matched on minified
+# code so comments never match.
+_STATIC_IMPORT_RE = re.compile(
+    r"""(?:^|[;\n{}])\s*(?:import|export)\b[^'"`;()]*?\bfrom\s*(['"])([^'"\n]+)\1"""
+    r"""|(?:^|[;\n{}])\s*import\s*(['"])([^'"\n]+)\3"""
+)
+_DYNAMIC_IMPORT_RE = re.compile(r"""\bimport\s*\(\s*(['"])([^'"\n]+)\1\s*\)""")
+# The same three forms in unminified source, for rewriting; group 3 is the specifier.
+_IMPORT_SPECIFIER_RE = re.compile(
+    r"""(\b(?:import|export)\b[^'"`;()]*?\bfrom\s*|\bimport\s*|\bimport\s*\(\s*)(['"])([^'"\n]+)\2"""
+)
 
 def fix_js_imports(directory):
     """
@@ -49,7 +74,315 @@ def fix_js_imports(directory):
     else:
         print("\n👍 Scan complete. No incorrect import paths were found.")
 
+def parse_imports(content):
+    """
+    Returns the specifiers a module imports.
+
+    Returns:
+        tuple: (static specifiers, dynamic import() specifiers), in source order.
+    """
+    code = minify_js(content)
+    static = [match.group(2) or match.group(4) for match in _STATIC_IMPORT_RE.finditer(code)]
+    dynamic = [match.group(2) for match in _DYNAMIC_IMPORT_RE.finditer(code)]
+    return static, dynamic
+
+def resolve_specifier(specifier, importer, public_dir=PUBLIC_DIR):
+    """
+    Resolves an import specifier against the importing file.
+
+    Returns:
+        str: The imported file's path relative to public_dir, or None for
+            bare specifiers and remote URLs.
+    """
+    if specifier.startswith('/'):
+        return site_path(specifier)
+    if not specifier.startswith(('./', '../')):
+        return None
+    importer_dir = os.path.dirname(os.path.relpath(importer, public_dir))
+    return os.path.normpath(os.path.join(importer_dir, specifier)).replace(os.sep, '/')
+
+def import_targets(code, importer, public_dir=PUBLIC_DIR):
+    """Returns the local files a script's static and dynamic imports resolve to (paths relative to public/)."""
+    targets = []
+    for match in _IMPORT_SPECIFIER_RE.finditer(code):
+        target = resolve_specifier(match.group(3), os.path.join(public_dir, importer), public_dir)
+        if target and target not in targets and os.path.isfile(os.path.join(public_dir, target)):
+            targets.append(target)
+    return targets
+
+def rewrite_imports(code, importer, output, mapping=None, public_dir=PUBLIC_DIR):
+    """
+    Rewrites the local import specifiers of a script for a copy of it
+    written elsewhere, pointing them at the mapped (e.g. fingerprinted)
+    files. Remote and bare specifiers are left alone.
+
+    Args:
+        code (str): The script's source.
+        importer (str): The script's path, relative to public_dir.
+        output (str): The copy's path, relative to public_dir.
+        mapping (dict): Imported path -> path to import instead.
+
+    Returns:
+        str: The rewritten source.
+    """
+    mapping = mapping or {}
+    output_dir = posixpath.dirname(output)
+    moved = output_dir != posixpath.dirname(importer)
+
+    def replace(match):
+        prefix, quote, specifier = match.groups()
+        target = resolve_specifier(specifier, os.path.join(public_dir, importer), public_dir)
+        if target is None or not os.path.isfile(os.path.join(public_dir, target)):
+            return match.group(0)
+        new_target = mapping.get(target, target)
+        if new_target == target and not moved:
+            return match.group(0)
+        if specifier.startswith('/'):
+            specifier = '/' + new_target
+        else:
+            specifier = posixpath.relpath(new_target, output_dir or '.')
+            if not specifier.startswith('../'):
+                specifier = './' + specifier
+        return f'{prefix}{quote}{specifier}{quote}'
+
+    return _IMPORT_SPECIFIER_RE.sub(replace, code)
+
+def page_module_entries(soup, page_path, public_dir=PUBLIC_DIR):
+    """
+    Returns the modules a page loads directly: the src of its module
+    scripts and the local static imports of its inline module scripts.
+    """
+    entries = []
+    for script in soup.find_all('script', type='module'):
+        if script.get('src'):
+            path = site_path(script['src'])
+        else:
+            static, _ = parse_imports(script.string or '')
+            entries.extend(filter(None, (resolve_specifier(spec, page_path, public_dir) for spec in static)))
+            continue
+        if path:
+            entries.append(path)
+    return entries
+
+class ModuleGraph:
+    """
+    Import graph of the site's local ES modules.
+
+    Every module in public/js/modules is a node, as is every local file
+    reached from one, or from the pages' module scripts and the dynamic
+    import() calls of the classic scripts in public/js.
+
+    Attributes:
+        static (dict): path -> static imports (paths relative to public/).
+        dynamic (dict): path -> dynamic import() targets.
+        missing (dict): path -> specifiers that resolve to no file.
+    """
+
+    def __init__(self, public_dir=PUBLIC_DIR, entries=()):
+        self.public_dir = public_dir
+        self.static = {}
+        self.dynamic = {}
+        self.missing = {}
+        roots = [os.path.relpath(path, public_dir).replace(os.sep, '/')
+                 for path in sorted(glob.glob(os.path.join(public_dir, 'js', '**', '*.js'), recursive=True))]
+        roots = [path for path in roots if not is_fingerprinted(path, public_dir)]
+        for path in list(roots) + list(entries):
+            self._add(path)
+
+    def _add(self, path):
+        pending = [path]
+        while pending:
+            path = pending.pop()
+            if path in self.static:
+                continue
+            file_path = os.path.join(self.public_dir, path)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    static, dynamic = parse_imports(f.read())
+            except OSError:
+                static, dynamic = [], []
+            resolved = {'static': [], 'dynamic': []}
+            for kind, specifiers in (('static', static), ('dynamic', dynamic)):
+                for specifier in specifiers:
+                    target = resolve_specifier(specifier, file_path, self.public_dir)
+                    if target is None:
+                        continue
+                    if not os.path.isfile(os.path.join(self.public_dir, target)):
+                        self.missing.setdefault(path, []).append(specifier)
+                        continue
+                    if target not in resolved[kind]:
+                        resolved[kind].append(target)
+                        pending.append(target)
+            self.static[path] = resolved['static']
+            self.dynamic[path] = resolved['dynamic']
+
+    def closure(self, entries):
+        """Returns every module the entries statically import, directly or not, in discovery order."""
+        for entry in entries:
+            self._add(entry)
+        seen, order = set(entries), []
+        pending = list(entries)
+        while pending:
+            for target in self.static.get(pending.pop(0), []):
+                if target not in seen:
+                    seen.add(target)
+                    order.append(target)
+                    pending.append(target)
+        return order
+
+    def cycles(self):
+        """Returns the import cycles: strongly connected components over the static imports."""
+        index, lowlink, on_stack, stack, cycles = {}, {}, set(), [], []
+        counter = [0]
+
+        def visit(node):
+            # Iterative Tarjan, so deep import chains cannot hit the recursion limit
+            work = [(node, iter(self.static.get(node, [])))]
+            index[node] = lowlink[node] = counter[0]
+            counter[0] += 1
+            stack.append(node)
+            on_stack.add(node)
+            while work:
+                current, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = lowlink[target] = counter[0]
+                        counter[0] += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(self.static.get(target, []))))
+                        break
+                    if target in on_stack:
+                        lowlink[current] = min(lowlink[current], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[current])
+                    if lowlink[current] == index[current]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == current:
+                                break
+                        if len(component) > 1 or current in self.static.get(current, []):
+                            cycles.append(sorted(component))
+
+        for node in sorted(self.static):
+            if node not in index:
+                visit(node)
+        return cycles
+
+    def unreachable(self, entries, directory='js/modules'):
+        """Returns the modules in a directory that no entry imports, statically or dynamically."""
+        prefix = directory.rstrip('/') + '/'
+        reached, pending = set(), list(entries)
+        # The classic scripts outside the directory load modules through import()
+        pending.extend(target for path, targets in self.dynamic.items()
+                       if not path.startswith(prefix) for target in targets)
+        while pending:
+            path = pending.pop()
+            if path in reached:
+                continue
+            reached.add(path)
+            pending.extend(self.static.get(path, []) + self.dynamic.get(path, []))
+        # A fingerprinted copy being reached counts for its source
+        reached |= {source_asset(path, self.public_dir) for path in reached}
+        return sorted(path for path in self.static if path.startswith(prefix) and path not in reached
+                      and not is_fingerprinted(path, self.public_dir))
+
+# Module graph, built once per process by the page transform.
+_graph = None
+
+def module_graph():
+    """Returns the process's ModuleGraph for public/."""
+    global _graph
+    if _graph is None:
+        _graph = ModuleGraph(PUBLIC_DIR)
+    return _graph
+
+def _is_modulepreload(link):
+    rel = link.get('rel') or []
+    return 'modulepreload' in (rel.split() if isinstance(rel, str) else rel)
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the scripts the module graph is built from."""
+    return files_version(TRANSFORM_VERSION, glob.glob(os.path.join(PUBLIC_DIR, 'js', '**', '*.js'), recursive=True))
+
+def add_modulepreload(soup, filename=None, log=print):
+    """
+    Adds <link rel="modulepreload"> to <head> for every module the page's
+    module scripts import, directly or not, so the browser fetches the whole
+    graph up front instead of one import level at a time. Local preload
+    links for modules the page no longer needs are removed.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    if soup.head is None:
+        return False
+    graph = module_graph()
+    entries = page_module_entries(soup, os.path.join(PUBLIC_DIR, filename or ''))
+    wanted = [path for path in graph.closure(entries) if path not in entries]
+
+    existing = {}
+    for link in soup.find_all('link', href=True):
+        if _is_modulepreload(link):
+            path = site_path(link['href'])
+            if path is not None:
+                existing[path] = link
+
+    removed = 0
+    for path, link in existing.items():
+        if path not in wanted:
+            link.decompose()
+            removed += 1
+    added = [path for path in wanted if path not in existing]
+    for path in added:
+        soup.head.append(soup.new_tag('link', attrs={'rel': 'modulepreload', 'href': path}))
+        soup.head.append('\n')
+
+    if added or removed:
+        log(f"Module preloads in {filename}: {len(added)} added, {removed} removed")
+    return bool(added or removed)
+
+def report_module_graph(public_dir=PUBLIC_DIR):
+    """Prints the import cycles, unresolved imports and unreachable modules of the site."""
+    from bs4 import BeautifulSoup
+
+    page_entries = {}
+    for page in sorted(glob.glob(os.path.join(public_dir, '*.html'))):
+        with open(page, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f.read(), 'html.parser')
+        page_entries[os.path.basename(page)] = page_module_entries(soup, page, public_dir)
+    entries = sorted({path for paths in page_entries.values() for path in paths})
+    graph = ModuleGraph(public_dir, entries)
+
+    print(f"\n🔗 Module graph: {len(graph.static)} file(s), "
+          f"{sum(map(len, graph.static.values()))} static import(s), {len(entries)} page entry module(s)")
+    for cycle in graph.cycles():
+        print(f"  - 🔁 Import cycle: {' -> '.join(cycle)}")
+    for path, specifiers in sorted(graph.missing.items()):
+        print(f"  - ❌ Unresolved import(s) in {path}: {', '.join(specifiers)}")
+    for path in graph.unreachable(entries):
+        print(f"  - 💤 Unreachable module: {path}")
+    for page, paths in page_entries.items():
+        closure = [path for path in graph.closure(paths) if path not in paths]
+        if closure:
+            print(f"  - 📦 {page}: preloads {len(closure)} module(s)")
+
 if __name__ == "__main__":
     # The directory where the JS modules are located
     modules_directory = 'public/js/modules'
     fix_js_imports(modules_directory)
+    report_module_graph()
+
+    from html_pipeline import run_pipeline
+    run_pipeline(PUBLIC_DIR, only=['modulepreload'])
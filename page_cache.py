@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Persistent content-hash cache for the page rewriters.
+
+The cache is a small JSON manifest (by default `.page_cache.json` in the page
+directory, which Firebase Hosting never deploys) that records, per tool and
+per page, the content hash and transform version of the last successful run:
+
+    {
+      "<namespace>": {
+        "<page path relative to the manifest>": {
+          "hash": "<sha256 of the page>",
+          "version": "<transform version>",
+          "size": 1234,
+          "mtime_ns": 1700000000000000000,
+          "patches": {"manifest": true, "service_worker": false, ...}
+        }
+      }
+    }
+
+A page is skipped when its content and the transform version both match the
+last run. Size and mtime are only used as a fast path to avoid re-hashing
+pages that have not been touched since they were recorded.
+
+When the cache is given a marker registry (patch_markers.PATCH_MARKERS), each
+entry also stores the page's patch state, detected from the same read that
+hashes the page. patch_state() looks it up across every namespace, so one
+script can tell that another already patched a page without reading it.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+CACHE_FILENAME = '.page_cache.json'
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def files_version(version, paths):
+    """
+    Returns a cache version that also changes with the content of the given
+    files, for transforms whose output depends on a build manifest or
+    output. Missing files count as such.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(f"{os.path.abspath(path)}:{hash_file(path) if os.path.isfile(path) else '-'}\n".encode('utf-8'))
+    return f"{version}+{digest.hexdigest()[:16]}"
+
+def _unchanged(entry, stat):
+    """Checks whether a recorded entry's size and mtime match a stat result."""
+    return bool(entry) and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+class PageCache:
+    def __init__(self, namespace, version, directory='.', cache_file=None, markers=None):
+        """
+        Args:
+            namespace (str): Name of the tool using the cache, so several
+                scripts can share one manifest.
+            version (str): Transform version. Changing it invalidates every
+                entry recorded by this namespace.
+            directory (str): Directory the manifest is stored in.
+            cache_file (str): Explicit manifest path (overrides directory).
+            markers (PatchMarkers): If given, record each page's patch state.
+        """
+        self.namespace = namespace
+        self.markers = markers
+        self.version = str(version)
+        self.cache_file = os.path.abspath(cache_file or os.path.join(directory, CACHE_FILENAME))
+        self.base_dir = os.path.dirname(self.cache_file)
+        self._manifest = self._load()
+        self.entries = self._manifest.setdefault(namespace, {})
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable page cache {self.cache_file}: {e}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def _key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.base_dir).replace(os.sep, '/')
+
+    def _current_hash(self, file_path, entry=None):
+        """Hashes a page, reusing the recorded hash if size and mtime are unchanged."""
+        stat = os.stat(file_path)
+        if _unchanged(entry, stat):
+            return entry['hash'], stat
+        return hash_file(file_path), stat
+
+    def is_fresh(self, file_path):
+        """
+        Checks whether a page is unchanged since the last successful run
+        with the same transform version.
+
+        Returns:
+            bool: True if the page can be skipped.
+        """
+        entry = self.entries.get(self._key(file_path))
+        if not entry or entry.get('version') != self.version:
+            return False
+        try:
+            current_hash, _ = self._current_hash(file_path, entry)
+        except OSError:
+            return False
+        return current_hash == entry.get('hash')
+
+    def record(self, file_path, **extra):
+        """
+        Records a page's current content as successfully processed.
+
+        Args:
+            file_path (str): The page that was processed.
+            **extra: Additional JSON-serializable fields to store with the entry.
+        """
+        key = self._key(file_path)
+        previous = self.entries.get(key)
+        stat = os.stat(file_path)
+        if _unchanged(previous, stat) and (self.markers is None or 'patches' in previous):
+            current_hash, patches = previous['hash'], previous.get('patches')
+        else:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            current_hash = hashlib.sha256(content).hexdigest()
+            patches = self.markers.detect(content) if self.markers else None
+
+        entry = {
+            'hash': current_hash,
+            'version': self.version,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        if patches is not None:
+            entry['patches'] = patches
+        entry.update(extra)
+        self.entries[key] = entry
+
+    def get(self, file_path):
+        """Returns the recorded entry for a page, or None."""
+        return self.entries.get(self._key(file_path))
+
+    def patch_state(self, file_path):
+        """
+        Returns the recorded patch state of a page's current content.
+
+        Entries from every namespace are considered, so a state recorded by
+        one script is visible to the others.
+
+        Returns:
+            dict: Marker name -> bool, or None if no entry matches the page.
+        """
+        key = self._key(file_path)
+        candidates = [entries[key] for entries in self._manifest.values()
+                      if isinstance(entries, dict) and 'patches' in entries.get(key, {})]
+        if not candidates:
+            return None
+        try:
+            stat = os.stat(file_path)
+            for entry in candidates:
+                if _unchanged(entry, stat):
+                    return entry['patches']
+            current_hash = hash_file(file_path)
+        except OSError:
+            return None
+        for entry in candidates:
+            if entry.get('hash') == current_hash:
+                return entry['patches']
+        return None
+
+    def forget(self, file_path):
+        """Drops a page from the cache so it is processed on the next run."""
+        self.entries.pop(self._key(file_path), None)
+
+    def save(self):
+        """Writes the manifest atomically."""
+        # Drop entries for pages that no longer exist
+        for key in [key for key in self.entries if not os.path.exists(os.path.join(self.base_dir, key))]:
+            del self.entries[key]
+
+        fd, temp_path = tempfile.mkstemp(dir=self.base_dir, prefix='.page_cache.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._manifest, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.cache_file)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Shared runner that fans per-page work out across a process pool.
+
+A page worker is a top-level function with the signature:
+
+    worker(file_path, log) -> status
+
+where `log` collects the page's messages and `status` is one of the strings
+in STATUSES (True / False are accepted as 'updated' / 'unchanged'). Workers
+run in separate processes, so their messages are buffered and printed in the
+original page order once each page finishes; the output is the same no
+matter how many workers are used.
+
+When a PageCache is passed, pages whose content and transform version match
+the last successful run are reported as 'cached' without running the worker.
+With skip_if_patched, pages whose recorded patch state (from any script
+sharing the cache) already has that patch are reported as 'cached' too.
+
+With profile=True, workers are also passed a `profile` keyword argument (a
+maintenance_profile.PageProfile) to time their phases; it is returned in
+PageResult.profile.
+"""
+
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from maintenance_profile import PageProfile
+
+STATUSES = ('updated', 'unchanged', 'skipped', 'cached', 'error')
+
+# Result of running a worker on a single page.
+PageResult = namedtuple('PageResult', ['path', 'status', 'messages', 'seconds', 'profile'], defaults=(None,))
+
+def default_workers():
+    """Returns the default worker count: one per CPU."""
+    return os.cpu_count() or 1
+
+def _normalize_status(status):
+    if status is True:
+        return 'updated'
+    if status is False or status is None:
+        return 'unchanged'
+    if status not in STATUSES or status == 'cached':
+        raise ValueError(f"Unknown page status '{status}'")
+    return status
+
+def run_page(worker, file_path, profile=None):
+    """
+    Runs a worker on one page, capturing its messages and any exception.
+
+    Args:
+        profile (tuple): PageProfile arguments to profile the worker, or None.
+
+    Returns:
+        PageResult: The page's result.
+    """
+    messages = []
+    kwargs = {}
+    if profile is not None:
+        kwargs['profile'] = PageProfile(*profile)
+
+    start = time.perf_counter()
+    try:
+        status = _normalize_status(worker(file_path, messages.append, **kwargs))
+    except Exception as e:
+        messages.append(f"ERROR: Could not process {file_path}. Reason: {type(e).__name__}: {e}")
+        status = 'error'
+    return PageResult(str(file_path), status, messages, time.perf_counter() - start, kwargs.get('profile'))
+
+def run_pages(file_paths, worker, workers=None, quiet=False, cache=None, skip_if_patched=None,
+              profile=False, cprofile_dir=None):
+    """
+    Runs a worker over a list of pages, in parallel when workers > 1.
+
+    Args:
+        file_paths (list): Pages to process.
+        worker (callable): worker(file_path, log) -> status. Must be a
+            top-level (picklable) function when workers > 1.
+        workers (int): Number of processes. Defaults to one per CPU;
+            1 runs everything in the current process.
+        quiet (bool): If True, don't print the per-page messages.
+        cache (PageCache): If given, skip pages that are unchanged since the
+            last successful run and record the pages processed by this one.
+        skip_if_patched (str): Marker name (see patch_markers); pages the
+            cache already knows to have this patch are not processed.
+        profile (bool): Pass each worker a PageProfile and return it in
+            PageResult.profile. The worker must accept a `profile` keyword.
+        cprofile_dir (str): With profile, also dump cProfile stats for
+            each transform phase into this directory.
+
+    Returns:
+        list: PageResult for every page, in the same order as file_paths.
+    """
+    file_paths = list(file_paths)
+    fresh, patched = set(), set()
+    if cache:
+        for path in file_paths:
+            if cache.is_fresh(path):
+                fresh.add(path)
+            elif skip_if_patched and (cache.patch_state(path) or {}).get(skip_if_patched):
+                patched.add(path)
+    fresh |= patched
+    dirty = [path for path in file_paths if path not in fresh]
+    workers = max(1, min(workers or default_workers(), len(dirty) or 1))
+    profile = (cprofile_dir,) if profile else None
+
+    if workers == 1:
+        results = map(run_page, repeat(worker), dirty, repeat(profile))
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(dirty) // (workers * 4))
+        results = executor.map(run_page, repeat(worker), dirty, repeat(profile), chunksize=chunksize)
+
+    ordered = []
+    try:
+        # executor.map yields in submission order, so the log stays deterministic
+        for path in file_paths:
+            if path in fresh:
+                if path in patched:
+                    cache.record(path)
+                ordered.append(PageResult(str(path), 'cached', [], 0.0))
+                continue
+
+            result = next(results)
+            if not quiet:
+                for message in result.messages:
+                    print(message)
+            if cache:
+                if result.status == 'error':
+                    cache.forget(path)
+                else:
+                    cache.record(path)
+            ordered.append(result)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+        if cache:
+            cache.save()
+
+    return ordered
+
+def print_summary(results, title="Run Complete"):
+    """Prints the per-file result table and the status totals."""
+    print(f"\n--- {title} ---")
+    for result in results:
+        print(f"  {result.status:9}  {result.seconds * 1000:8.1f} ms  {result.path}")
+
+    counts = Counter(result.status for result in results)
+    print("-" * 40)
+    print(f"Total files:     {len(results)}")
+    for status in STATUSES:
+        print(f"Files {status + ':':11}{counts.get(status, 0)}")
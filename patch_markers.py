@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Shared registry of "already patched?" markers.
+
+Every idempotency check used by the page patch scripts is registered here
+once. The registry compiles all of them into a single combined regex (one
+named group per marker), so one scan over a page reports every patch that
+is already applied:
+
+    >>> PATCH_MARKERS.detect('<link rel="manifest" href="/manifest.json">')
+    {'manifest': True, 'service_worker': False, 'tour': False, 'analytics': False, 'darkmode': False}
+
+The resulting patch state is stored by PageCache next to the page's content
+hash, so later runs (of any script) can tell which patches a page already
+has without reading it again.
+"""
+
+import re
+
+class PatchMarkers:
+    def __init__(self):
+        # name -> (patterns, flags), in registration order
+        self._markers = {}
+        self._compiled = {}
+
+    def register(self, name, patterns, flags=0):
+        """
+        Registers the patterns whose presence means a patch is applied.
+
+        Args:
+            name (str): Patch name, e.g. 'manifest'.
+            patterns (list): str regex patterns; any match marks the patch.
+            flags (int): re flags for these patterns (only re.IGNORECASE,
+                re.MULTILINE and re.DOTALL can be scoped per marker).
+        """
+        self._markers[name] = (list(patterns), flags)
+        self._compiled.clear()
+
+    @property
+    def names(self):
+        return list(self._markers)
+
+    def _group(self, index):
+        return f'm{index}'
+
+    def _scoped(self, patterns, flags):
+        body = '|'.join(f'(?:{pattern})' for pattern in patterns)
+        inline = ''.join(letter for flag, letter in (
+            (re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's')) if flags & flag)
+        return f'(?{inline}:{body})' if inline else f'(?:{body})'
+
+    def _compile(self, for_bytes):
+        key = bool(for_bytes)
+        if key not in self._compiled:
+            combined = []
+            singles = {}
+            for index, (name, (patterns, flags)) in enumerate(self._markers.items()):
+                source = self._scoped(patterns, flags)
+                combined.append(f'(?P<{self._group(index)}>{source})')
+                singles[name] = source.encode('utf-8') if key else source
+            pattern = '|'.join(combined)
+            combined_re = re.compile(pattern.encode('utf-8') if key else pattern)
+            self._compiled[key] = (combined_re, {name: re.compile(source) for name, source in singles.items()})
+        return self._compiled[key]
+
+    def pattern(self, name, for_bytes=False):
+        """Returns the compiled regex for a single marker."""
+        return self._compile(for_bytes)[1][name]
+
+    def detect(self, content):
+        """
+        Reports every registered patch found in the content, in one pass.
+
+        Args:
+            content (str, bytes or mmap): The page content.
+
+        Returns:
+            dict: Marker name -> True if the patch is present.
+        """
+        for_bytes = not isinstance(content, str)
+        combined_re, singles = self._compile(for_bytes)
+        names = self.names
+        state = dict.fromkeys(names, False)
+        remaining = len(names)
+
+        pos = 0
+        while remaining:
+            match = combined_re.search(content, pos)
+            if match is None:
+                break
+            start = match.start()
+            # Only the first alternative that matches is reported for a
+            # position, so check the other missing markers there directly
+            for name in names:
+                if not state[name] and singles[name].match(content, start):
+                    state[name] = True
+                    remaining -= 1
+            pos = start + 1
+
+        return state
+
+# The built-in markers used by the page patch scripts.
+PATCH_MARKERS = PatchMarkers()
+PATCH_MARKERS.register('manifest', [
+    r'<link[^>]*rel=["\']manifest["\'][^>]*>',
+    r'<link[^>]*href=["\'][^"\']*manifest\.json["\'][^>]*>',
+], re.IGNORECASE)
+PATCH_MARKERS.register('service_worker', [
+    r'navigator\.serviceWorker\.register',
+    r'serviceWorker\.register',
+    r'sw\.js',
+    r'service-worker\.js',
+], re.IGNORECASE)
+PATCH_MARKERS.register('tour', [r'shepherd\.min\.js'])
+# Scripts count as loaded as their source, a fingerprinted copy (name.<10 hex>.js,
+# see fingerprint_assets.py) or a bundle listing them in data-bundle (js_bundle.py)
+PATCH_MARKERS.register('analytics', [r'js/simple-analytics(?:\.[0-9a-f]{10})?\.js'])
+PATCH_MARKERS.register('darkmode', [
+    r'<script[^>]*src=["\']js/darkmode(?:\.[0-9a-f]{10})?\.js["\']',
+    r'<script[^>]*data-bundle=["\'][^"\']*\bjs/darkmode\.js\b',
+])
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Precompressed .br/.gz siblings for the text assets in public/.
+
+Every HTML, JS, CSS, JSON, SVG and XML file in public/ (dotfiles and
+dot-directories excluded, as Firebase never deploys them) gets a sibling
+compressed at the maximum level of each encoding: file.js.br (Brotli,
+quality 11) and file.js.gz (gzip, level 9). A host that serves precompressed
+siblings (nginx gzip_static/brotli_static, most CDNs) then never compresses
+on the fly at its default levels. Firebase Hosting compresses by itself and
+would not serve the siblings, so firebase.json keeps them out of the deploy
+(hosting.ignore); for it, the report below is the transfer-size budget.
+
+Files are compressed in a process pool (page_runner.run_pages) and recorded
+in a PageCache, so only files whose content changed are compressed again.
+A sibling that would not be smaller than its file is not written (the
+cache records which siblings a file has), and siblings whose file is gone
+or now below MIN_SIZE are removed.
+
+Brotli needs the `brotli` package (pip install brotli); without it only
+the .gz siblings are written.
+"""
+
+import os
+import gzip
+import argparse
+import tempfile
+from page_runner import run_pages, print_summary
+from page_cache import PageCache
+from html_splice import default_mode
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+TEXT_EXTENSIONS = ('.html', '.js', '.mjs', '.css', '.json', '.webmanifest', '.svg', '.xml', '.txt', '.map')
+# Files smaller than this fit in one packet either way.
+MIN_SIZE = 1024
+# Bump this whenever the compression settings change, so every file is compressed again.
+# The available encodings are part of the cache version automatically.
+BUILD_VERSION = '2'
+# --- End Configuration ---
+
+def _gzip(data):
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+def encodings():
+    """Returns the (sibling extension, compress function) pairs available here."""
+    available = [('.gz', _gzip)]
+    if brotli is not None:
+        available.insert(0, ('.br', _brotli))
+    return available
+
+def build_version():
+    """Returns the cache version for the available encodings."""
+    return f"{BUILD_VERSION}:{'+'.join(extension for extension, _ in encodings())}"
+
+def find_text_assets(directory=PUBLIC_DIR):
+    """Returns the sorted text assets of a directory tree, skipping dotfiles and dot-directories."""
+    assets = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            if not name.startswith('.') and name.lower().endswith(TEXT_EXTENSIONS):
+                file_path = os.path.join(dirpath, name)
+                if os.path.getsize(file_path) >= MIN_SIZE:
+                    assets.append(file_path)
+    return sorted(assets)
+
+def _write_atomic(path, content):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        default_mode(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def compress_file(file_path, log=print):
+    """
+    Page-runner worker: writes the compressed siblings of one file.
+
+    Returns:
+        str: 'updated'
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    for extension, compress in encodings():
+        compressed = compress(data)
+        sibling = file_path + extension
+        if len(compressed) < len(data):
+            _write_atomic(sibling, compressed)
+        elif os.path.exists(sibling):
+            os.remove(sibling)
+    return 'updated'
+
+def remove_orphans(directory=PUBLIC_DIR):
+    """Removes the siblings whose file no longer exists or is below MIN_SIZE; returns how many."""
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            source, extension = os.path.splitext(name)
+            source_path = os.path.join(dirpath, source)
+            if extension in ('.br', '.gz') and source.lower().endswith(TEXT_EXTENSIONS) \
+                    and (not os.path.exists(source_path) or os.path.getsize(source_path) < MIN_SIZE):
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+    return removed
+
+def print_savings(file_paths, directory=PUBLIC_DIR, per_file=True):
+    """Prints each file's size per encoding (unless per_file is False), and the totals."""
+    extensions = [extension for extension, _ in encodings()]
+    totals = dict.fromkeys(['original'] + extensions, 0)
+    if per_file:
+        header = ''.join(f'{extension:>12}' for extension in extensions)
+        print(f"\n{'File':<60}{'original':>12}{header}")
+    for file_path in file_paths:
+        size = os.path.getsize(file_path)
+        totals['original'] += size
+        columns = []
+        for extension in extensions:
+            sibling = file_path + extension
+            compressed = os.path.getsize(sibling) if os.path.exists(sibling) else size
+            totals[extension] += compressed
+            columns.append(f'{compressed / 1024:>8.1f} KB ')
+        if per_file:
+            print(f"{os.path.relpath(file_path, directory):<60}{size / 1024:>9.1f} KB{''.join(columns)}")
+
+    print("-" * 40)
+    print(f"Total original: {totals['original'] / 1048576:.2f} MB")
+    for extension in extensions:
+        saved = totals['original'] - totals[extension]
+        percent = saved * 100 / totals['original'] if totals['original'] else 0
+        print(f"Total {extension:<9} {totals[extension] / 1048576:.2f} MB "
+              f"(saves {saved / 1048576:.2f} MB, {percent:.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Write max-level .br/.gz siblings for the text assets in public/')
+    parser.add_argument('directory', nargs='?', default=PUBLIC_DIR,
+                        help='Directory to compress (default: public)')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Compress every file, even if unchanged since the last run')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Only print the totals, not the per-file table')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"ERROR: Target directory '{args.directory}' not found.")
+        return False
+    if brotli is None:
+        print("NOTE: The 'brotli' package is not installed; writing .gz siblings only.")
+
+    files = find_text_assets(args.directory)
+    print(f"Compressing {len(files)} text asset(s) in '{args.directory}' "
+          f"({', '.join(extension for extension, _ in encodings())})")
+    cache = None if args.no_cache else PageCache('precompress', build_version(), args.directory)
+    if cache:
+        # A file whose siblings were deleted is compressed again even if unchanged
+        for file_path in files:
+            entry = cache.get(file_path)
+            if entry and not all(os.path.exists(file_path + extension) for extension in entry.get('siblings', ())):
+                cache.forget(file_path)
+    results = run_pages(files, compress_file, args.workers, cache=cache)
+    if cache:
+        # Record the siblings written, so one skipped as not smaller is not taken for deleted
+        for result in results:
+            if result.status == 'updated':
+                cache.record(result.path, siblings=[extension for extension, _ in encodings()
+                                                    if os.path.exists(result.path + extension)])
+        cache.save()
+    if not args.quiet:
+        print_summary(results, "Precompression Complete")
+
+    removed = remove_orphans(args.directory)
+    if removed:
+        print(f"Removed {removed} sibling(s) of deleted or small files")
+    done = [result.path for result in results if result.status in ('updated', 'cached')]
+    print_savings(done, args.directory, per_file=not args.quiet)
+    return not any(result.status == 'error' for result in results)
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Columnar price-history store for the priceHistory/{cardId}/daily snapshots.
+
+getCardPriceHistory runs one Firestore range query per card and filters
+variant/condition in a JS loop, and getCollectionPriceAnalytics calls it
+once per card. This store keeps every (card, variant, condition) daily
+series in NumPy arrays, so the history of thousands of cards is a single
+array slice.
+
+Layout (STORE_DIR):
+
+- series.json: the first date, the number of days, the column capacity,
+  and the series, one per column: [card id, variant, condition, currency].
+- market.f32, low.f32: float32 matrices of shape (days, capacity), one row
+  per day from the first date, one column per series, NaN where there was
+  no snapshot. They are opened with np.memmap.
+
+Rows are days, so a new day is appended to the end of each file without
+rewriting it; the column capacity grows by doubling, so new series only
+rewrite the files now and then. Snapshots for days already stored (a
+backfill, a re-run) are written in place.
+
+Snapshots are read from JSON Lines, as exported by firestore_batches.py or
+one priceHistory daily document per line with its card id, as
+collectCardPriceSnapshot writes them:
+
+    {"cardId": "sv1-1", "date": "2025-01-31", "variant": "default",
+     "condition": "NM", "market": 1.25, "low": 0.9, "currency": "USD"}
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(ROOT_DIR, '.price_history')
+
+# Column capacity of a new store
+INITIAL_CAPACITY = 1024
+# getCardPriceHistory's defaults
+DEFAULT_DAYS = 30
+DEFAULT_VARIANT = 'default'
+DEFAULT_CONDITION = 'NM'
+# Bump this whenever the file layout changes; older stores must be rebuilt.
+STORE_VERSION = '1'
+# --- End Configuration ---
+
+SERIES_FILENAME = 'series.json'
+COLUMNS = ('market', 'low')
+DTYPE = np.float32
+
+def to_day(date):
+    """Returns a date ('YYYY-MM-DD', datetime.date or datetime64) as a datetime64[D]."""
+    return np.datetime64(date, 'D')
+
+class PriceHistory:
+    """
+    Daily market/low series per (card id, variant, condition).
+
+    Attributes:
+        start (numpy.datetime64): Date of the first row, or None while empty.
+        days (int): Number of rows (days) stored.
+        capacity (int): Number of columns allocated in the matrices.
+        series (list): [card id, variant, condition, currency] per column.
+        index (dict): (card id, variant, condition) -> column.
+    """
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.start = None
+        self.days = 0
+        self.capacity = 0
+        self.series = []
+        path = os.path.join(directory, SERIES_FILENAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != STORE_VERSION:
+                raise ValueError(f"Price history in '{directory}' is from another version; rebuild it")
+            self.start = to_day(meta['start']) if meta['start'] else None
+            self.days = meta['days']
+            self.capacity = meta['capacity']
+            self.series = meta['series']
+        self.index = {tuple(series[:3]): column for column, series in enumerate(self.series)}
+
+    def _path(self, column):
+        return os.path.join(self.directory, f'{column}.f32')
+
+    def matrix(self, column, mode='r'):
+        """Returns a column's (days, capacity) matrix, memory-mapped."""
+        if not self.days:
+            return np.full((0, self.capacity), np.nan, dtype=DTYPE)
+        return np.memmap(self._path(column), dtype=DTYPE, mode=mode, shape=(self.days, self.capacity))
+
+    def _save_meta(self):
+        path = os.path.join(self.directory, SERIES_FILENAME)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'start': str(self.start) if self.start is not None else None,
+                       'days': self.days, 'capacity': self.capacity, 'series': self.series}, f)
+        os.replace(path + '.tmp', path)
+
+    def _grow(self, start, days, capacity):
+        """
+        Makes room for the given first date, day count and column capacity.
+        Days after the last one are appended; an earlier first date or a
+        larger capacity rewrites the matrices.
+        """
+        shift = int((self.start - start).astype(int)) if self.start is not None else 0
+        if shift or capacity > self.capacity:
+            capacity = max(capacity, self.capacity)
+            for column in COLUMNS:
+                grown = np.full((days, capacity), np.nan, dtype=DTYPE)
+                grown[shift:shift + self.days, :self.capacity] = self.matrix(column)
+                with open(self._path(column) + '.tmp', 'wb') as f:
+                    grown.tofile(f)
+                os.replace(self._path(column) + '.tmp', self._path(column))
+        elif days > self.days:
+            padding = np.full((days - self.days, self.capacity), np.nan, dtype=DTYPE).tobytes()
+            for column in COLUMNS:
+                with open(self._path(column), 'ab') as f:
+                    f.write(padding)
+        self.start, self.days, self.capacity = start, days, capacity
+
+    def append(self, snapshots):
+        """
+        Stores daily snapshots, adding days and series as needed.
+
+        Args:
+            snapshots (iterable): dicts with cardId, date, variant,
+                condition, market, low and currency.
+
+        Returns:
+            int: Number of snapshots stored.
+        """
+        records = [snapshot for snapshot in snapshots if snapshot.get('cardId') and snapshot.get('date')]
+        if not records:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        columns = np.empty(len(records), dtype=np.int64)
+        for position, record in enumerate(records):
+            key = (record['cardId'], record.get('variant') or DEFAULT_VARIANT,
+                   record.get('condition') or DEFAULT_CONDITION)
+            column = self.index.get(key)
+            if column is None:
+                column = self.index[key] = len(self.series)
+                self.series.append(list(key) + [record.get('currency') or 'USD'])
+            columns[position] = column
+        dates = np.array([record['date'][:10] for record in records], dtype='datetime64[D]')
+        values = {column: np.array([np.nan if record.get(column) is None else record[column]
+                                    for record in records], dtype=DTYPE)
+                  for column in COLUMNS}
+
+        start = min(dates.min(), self.start) if self.start is not None else dates.min()
+        end = max(dates.max(), self.start + self.days - 1) if self.start is not None else dates.max()
+        capacity = max(self.capacity, INITIAL_CAPACITY)
+        while capacity < len(self.series):
+            capacity *= 2
+        self._grow(start, int((end - start).astype(int)) + 1, capacity)
+
+        rows = (dates - self.start).astype(np.int64)
+        for column in COLUMNS:
+            matrix = self.matrix(column, mode='r+')
+            matrix[rows, columns] = values[column]
+            matrix.flush()
+        self._save_meta()
+        return len(records)
+
+    def columns_for(self, card_ids, variant=DEFAULT_VARIANT, condition=DEFAULT_CONDITION):
+        """Returns the column of each card's series (-1 for cards without one), as an array."""
+        get = self.index.get
+        return np.array([get((card_id, variant, condition), -1) for card_id in card_ids], dtype=np.int64)
+
+    def dates(self, end=None, days=DEFAULT_DAYS):
+        """Returns the `days` dates ending at `end` (default: the last stored day)."""
+        if end is None:
+            end = self.start + self.days - 1 if self.start is not None else np.datetime64('today', 'D')
+        return to_day(end) - np.arange(days - 1, -1, -1)
+
+    def window(self, columns, dates, column='market'):
+        """
+        Returns the values of the given series on the given (consecutive)
+        dates: a (len(columns), len(dates)) array, NaN where nothing was
+        recorded, including dates outside the store and columns of -1.
+        """
+        out = np.full((len(columns), len(dates)), np.nan, dtype=DTYPE)
+        if self.start is None or not len(dates):
+            return out
+        first = int((dates[0] - self.start).astype(int))
+        lo, hi = max(first, 0), min(first + len(dates), self.days)
+        known = columns >= 0
+        if lo < hi and known.any():
+            # One slice of the day rows, then one gather of the columns
+            out[np.flatnonzero(known), lo - first:hi - first] = \
+                self.matrix(column)[lo:hi][:, columns[known]].T
+        return out
+
+    def history(self, card_ids, days=DEFAULT_DAYS, variant=DEFAULT_VARIANT, condition=DEFAULT_CONDITION,
+                end=None):
+        """
+        Returns the N-day history of many cards at once.
+
+        Returns:
+            tuple: (dates, market, low): the dates (datetime64[D]) and two
+                (len(card_ids), days) arrays, NaN where there is no price.
+        """
+        columns = self.columns_for(card_ids, variant, condition)
+        dates = self.dates(end, days)
+        return dates, self.window(columns, dates, 'market'), self.window(columns, dates, 'low')
+
+    def card_history(self, card_id, days=DEFAULT_DAYS, variant=DEFAULT_VARIANT, condition=DEFAULT_CONDITION,
+                     end=None):
+        """Returns one card's history as getCardPriceHistory's data list."""
+        dates, market, low = self.history([card_id], days, variant, condition, end)
+        column = self.index.get((card_id, variant, condition))
+        currency = self.series[column][3] if column is not None else 'USD'
+        return [
+            {'date': str(date), 'market': None if np.isnan(m) else round(float(m), 2),
+             'low': None if np.isnan(l) else round(float(l), 2), 'currency': currency}
+            for date, m, l in zip(dates, market[0], low[0]) if not (np.isnan(m) and np.isnan(l))
+        ]
+
+def read_snapshots(path):
+    """
+    Yields the snapshots of a JSON Lines file: bare snapshots, or daily
+    documents as exported by firestore_batches.py, whose card ID is taken
+    from the path (priceHistory/{cardId}/daily/{id}).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'path' not in record:
+                yield record
+                continue
+            parts = record['path'].split('/')
+            if len(parts) == 4 and parts[0] == 'priceHistory' and parts[2] == 'daily':
+                yield dict(record.get('data') or {}, cardId=parts[1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar daily price-history store')
+    parser.add_argument('--directory', '-d', default=STORE_DIR, help='Store directory (default: .price_history)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='Append snapshots from JSON Lines files')
+    ingest.add_argument('files', nargs='+')
+    query = commands.add_parser('query', help="Print cards' history, like getCardPriceHistory")
+    query.add_argument('card_ids', nargs='+')
+    query.add_argument('--days', type=int, default=DEFAULT_DAYS)
+    query.add_argument('--variant', default=DEFAULT_VARIANT)
+    query.add_argument('--condition', default=DEFAULT_CONDITION)
+    args = parser.parse_args()
+
+    try:
+        store = PriceHistory(args.directory)
+        if args.command == 'ingest':
+            for path in args.files:
+                count = store.append(read_snapshots(path))
+                print(f"{path}: stored {count} snapshot(s)")
+            print(f"Store: {len(store.series)} series x {store.days} day(s) from {store.start}")
+            return True
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return False
+
+    for card_id in args.card_ids:
+        data = store.card_history(card_id, args.days, args.variant, args.condition)
+        print(json.dumps({'success': True, 'data': data, 'cardId': card_id, 'period': f'{args.days} days',
+                          'variant': args.variant, 'condition': args.condition}, indent=2))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -5,72 +5,78 @@ Checks for existing manifest link and adds it if missing.
 """
 
 import os
-import re
+import sys
+import argparse
 from pathlib import Path
 
-def check_and_add_manifest_link(file_path):
+# The shared page runner and cache live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_runner import run_pages
+from page_cache import PageCache
+from html_splice import insert_snippet
+from patch_markers import PATCH_MARKERS
+
+# Bump this whenever the patch logic or snippet changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '2'
+
+# Matches if the page already has a manifest link (see patch_markers.py)
+MANIFEST_MARKER = PATCH_MARKERS.pattern('manifest', for_bytes=True)
+
+# The manifest link, inserted right before </head>
+MANIFEST_LINK = '    <link rel="manifest" href="/manifest.json">\n'
+
+def choose_manifest_insertion(anchors):
+    """Inserts the manifest link before </head>."""
+    if anchors.head_end is None:
+        return None
+    return anchors.head_end, MANIFEST_LINK
+
+def check_and_add_manifest_link(file_path, log=print):
     """
     Check if HTML file has manifest link and add it if missing.
+    The page is patched in streaming mode (no DOM, atomic rewrite).
     
     Args:
         file_path (str): Path to the HTML file
+        log (callable): Receives progress messages
         
     Returns:
         bool: True if file was modified, False otherwise
+
+    Raises:
+        OSError: If the file cannot be read or written (reported by the page runner)
     """
-    try:
-        # Read the file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Check if manifest link already exists
-        manifest_patterns = [
-            r'<link[^>]*rel=["\']manifest["\'][^>]*>',
-            r'<link[^>]*href=["\'][^"\']*manifest\.json["\'][^>]*>'
-        ]
-        
-        has_manifest = any(re.search(pattern, content, re.IGNORECASE) for pattern in manifest_patterns)
-        
-        if has_manifest:
-            print(f"✅ {file_path} - Manifest link already exists")
-            return False
-        
-        # Find the </head> tag to insert before it
-        head_end_pattern = r'</head>'
-        head_match = re.search(head_end_pattern, content, re.IGNORECASE)
-        
-        if not head_match:
-            print(f"❌ {file_path} - No </head> tag found, skipping")
-            return False
-        
-        # Create the manifest link
-        manifest_link = '    <link rel="manifest" href="/manifest.json">\n'
-        
-        # Insert the manifest link before </head>
-        new_content = content[:head_match.start()] + manifest_link + content[head_match.start():]
-        
-        # Write the modified content back
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        print(f"✅ {file_path} - Added manifest link")
-        return True
-        
-    except Exception as e:
-        print(f"❌ {file_path} - Error: {e}")
+    result = insert_snippet(file_path, choose_manifest_insertion, marker=MANIFEST_MARKER)
+    
+    if result == 'present':
+        log(f"✅ {file_path} - Manifest link already exists")
         return False
+    
+    if result == 'no-anchor':
+        log(f"❌ {file_path} - No </head> tag found, skipping")
+        return False
+    
+    log(f"✅ {file_path} - Added manifest link")
+    return True
 
 def main():
     """
     Main function to process all HTML files in current directory.
     """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    args = parser.parse_args()
+
     print("🔍 Scanning for HTML files in current directory...")
     
     # Get current directory
     current_dir = Path('.')
     
     # Find all HTML files
-    html_files = list(current_dir.glob('*.html'))
+    html_files = sorted(current_dir.glob('*.html'))
     
     if not html_files:
         print("❌ No HTML files found in current directory")
@@ -79,17 +85,18 @@ def main():
     print(f"📁 Found {len(html_files)} HTML files")
     print("-" * 50)
     
-    modified_count = 0
-    
-    # Process each HTML file
-    for html_file in html_files:
-        if check_and_add_manifest_link(html_file):
-            modified_count += 1
+    # Process each HTML file, skipping pages unchanged since the last run
+    cache = None if args.no_cache else PageCache('add_manifest_link', TRANSFORM_VERSION, markers=PATCH_MARKERS)
+    results = run_pages(html_files, check_and_add_manifest_link, args.workers, cache=cache,
+                        skip_if_patched='manifest')
+    modified_count = sum(1 for result in results if result.status == 'updated')
+    cached_count = sum(1 for result in results if result.status == 'cached')
     
     print("-" * 50)
     print(f"✅ Processing complete!")
     print(f"📊 Files modified: {modified_count}")
-    print(f"📊 Files checked: {len(html_files)}")
+    print(f"📊 Files checked: {len(html_files) - cached_count}")
+    print(f"📊 Files unchanged since last run: {cached_count}")
     
     if modified_count > 0:
         print("\n🚀 Next steps:")
@@ -5,58 +5,25 @@ Checks for existing service worker registration and adds it if missing.
 """
 
 import os
-import re
+import sys
+import argparse
 from pathlib import Path
 
-def check_and_add_service_worker_registration(file_path):
-    """
-    Check if HTML file has service worker registration and add it if missing.
-    
-    Args:
-        file_path (str): Path to the HTML file
-        
-    Returns:
-        bool: True if file was modified, False otherwise
-    """
-    try:
-        # Read the file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Check if service worker registration already exists
-        sw_patterns = [
-            r'navigator\.serviceWorker\.register',
-            r'serviceWorker\.register',
-            r'sw\.js',
-            r'service-worker\.js'
-        ]
-        
-        has_sw_registration = any(re.search(pattern, content, re.IGNORECASE) for pattern in sw_patterns)
-        
-        if has_sw_registration:
-            print(f"✅ {file_path} - Service worker registration already exists")
-            return False
-        
-        # Find the </body> tag to insert before it (preferred location)
-        body_end_pattern = r'</body>'
-        body_match = re.search(body_end_pattern, content, re.IGNORECASE)
-        
-        if not body_match:
-            # If no </body> tag, try </html>
-            html_end_pattern = r'</html>'
-            html_match = re.search(html_end_pattern, content, re.IGNORECASE)
-            
-            if not html_match:
-                print(f"❌ {file_path} - No </body> or </html> tag found, skipping")
-                return False
-            
-            insert_point = html_match.start()
-            print(f"⚠️  {file_path} - No </body> tag, inserting before </html>")
-        else:
-            insert_point = body_match.start()
-        
-        # Create the service worker registration script
-        sw_registration_script = '''    <script>
+# The shared page runner and cache live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_runner import run_pages
+from page_cache import PageCache
+from html_splice import insert_snippet
+from patch_markers import PATCH_MARKERS
+
+# Bump this whenever the patch logic or snippet changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '2'
+
+# Matches if the page already registers a service worker (see patch_markers.py)
+SW_MARKER = PATCH_MARKERS.pattern('service_worker', for_bytes=True)
+
+# The service worker registration script
+SW_REGISTRATION_SCRIPT = '''    <script>
         // Service Worker Registration
         if ('serviceWorker' in navigator) {
             window.addEventListener('load', function() {
@@ -71,32 +38,68 @@ def check_and_add_service_worker_registration(file_path):
         }
     </script>
 '''
+
+def check_and_add_service_worker_registration(file_path, log=print):
+    """
+    Check if HTML file has service worker registration and add it if missing.
+    The page is patched in streaming mode (no DOM, atomic rewrite).
+    
+    Args:
+        file_path (str): Path to the HTML file
+        log (callable): Receives progress messages
         
-        # Insert the service worker registration script
-        new_content = content[:insert_point] + sw_registration_script + content[insert_point:]
-        
-        # Write the modified content back
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        print(f"✅ {file_path} - Added service worker registration")
-        return True
-        
-    except Exception as e:
-        print(f"❌ {file_path} - Error: {e}")
+    Returns:
+        bool: True if file was modified, False otherwise
+
+    Raises:
+        OSError: If the file cannot be read or written (reported by the page runner)
+    """
+    insertion_target = []
+
+    def choose_insertion(anchors):
+        # Insert before </body> (preferred location), else before </html>
+        if anchors.body_end is not None:
+            insertion_target.append('body')
+            return anchors.body_end, SW_REGISTRATION_SCRIPT
+        if anchors.html_end is not None:
+            insertion_target.append('html')
+            return anchors.html_end, SW_REGISTRATION_SCRIPT
+        return None
+
+    result = insert_snippet(file_path, choose_insertion, marker=SW_MARKER)
+    
+    if result == 'present':
+        log(f"✅ {file_path} - Service worker registration already exists")
+        return False
+    
+    if result == 'no-anchor':
+        log(f"❌ {file_path} - No </body> or </html> tag found, skipping")
         return False
+    
+    if insertion_target == ['html']:
+        log(f"⚠️  {file_path} - No </body> tag, inserting before </html>")
+    
+    log(f"✅ {file_path} - Added service worker registration")
+    return True
 
 def main():
     """
     Main function to process all HTML files in current directory.
     """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    args = parser.parse_args()
+
     print("🔍 Scanning for HTML files to add service worker registration...")
     
     # Get current directory
     current_dir = Path('.')
     
     # Find all HTML files
-    html_files = list(current_dir.glob('*.html'))
+    html_files = sorted(current_dir.glob('*.html'))
     
     if not html_files:
         print("❌ No HTML files found in current directory")
@@ -105,17 +108,19 @@ def main():
     print(f"📁 Found {len(html_files)} HTML files")
     print("-" * 60)
     
-    modified_count = 0
-    
-    # Process each HTML file
-    for html_file in html_files:
-        if check_and_add_service_worker_registration(html_file):
-            modified_count += 1
+    # Process each HTML file, skipping pages unchanged since the last run
+    cache = None if args.no_cache else PageCache('add_service_worker_registration', TRANSFORM_VERSION,
+                                                 markers=PATCH_MARKERS)
+    results = run_pages(html_files, check_and_add_service_worker_registration, args.workers, cache=cache,
+                        skip_if_patched='service_worker')
+    modified_count = sum(1 for result in results if result.status == 'updated')
+    cached_count = sum(1 for result in results if result.status == 'cached')
     
     print("-" * 60)
     print(f"✅ Processing complete!")
     print(f"📊 Files modified: {modified_count}")
-    print(f"📊 Files checked: {len(html_files)}")
+    print(f"📊 Files checked: {len(html_files) - cached_count}")
+    print(f"📊 Files unchanged since last run: {cached_count}")
     
     if modified_count > 0:
         print("\n🚀 Next steps:")
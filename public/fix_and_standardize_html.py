@@ -1,7 +1,14 @@
 import os
+import sys
 import glob
+import argparse
 from bs4 import BeautifulSoup, Tag
 
+# The shared page runner lives in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_runner import run_pages, print_summary
+from html_writer import SourceSnapshot, write_minimal
+
 # --- 1. DEFINE THE STANDARDIZED HTML BLOCKS ---
 
 # This is the single, correct header that will be placed in every HTML file.
@@ -67,71 +74,95 @@ REGISTER_MODAL_HTML = """
 </div>
 """
 
-def update_html_files():
+def standardize_page(file_path, log=print):
+    """
+    Replaces or adds the standard header and ensures the standard
+    login/register modals are present in a single HTML file.
+
+    Args:
+        file_path (str): Path to the HTML file.
+        log (callable): Receives progress messages.
+
+    Returns:
+        str: 'updated', 'unchanged' if the page was already standardized,
+        or 'skipped' if it is not an HTML document.
+    """
+    log(f"Processing: {file_path}")
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+        # Handle files that might be just fragments without full HTML structure
+        if not content.strip().startswith('<'):
+             log(f"  - Skipping file {file_path} as it does not appear to be a valid HTML document.")
+             return 'skipped'
+        soup = BeautifulSoup(content, 'html.parser')
+        snapshot = SourceSnapshot(soup, content)
+
+    new_header_soup = BeautifulSoup(STANDARDIZED_HEADER_HTML, 'html.parser').header
+    new_login_modal_soup = BeautifulSoup(LOGIN_MODAL_HTML, 'html.parser').div
+    new_register_modal_soup = BeautifulSoup(REGISTER_MODAL_HTML, 'html.parser').div
+
+    # --- 2. UPDATE OR ADD THE HEADER ---
+    existing_header = soup.find('header')
+    if existing_header:
+        existing_header.replace_with(new_header_soup)
+        log(f"  - Replaced existing header.")
+    else:
+        # Find a suitable place to insert the new header
+        insertion_point = soup.find('div', class_='flex-1') or soup.body
+        if insertion_point:
+            insertion_point.insert(0, new_header_soup)
+            log(f"  - Added new header.")
+        else:
+            log(f"  - Warning: Could not find a suitable insertion point for the header.")
+
+    # --- 3. ENSURE MODALS ARE PRESENT AND CORRECT ---
+    body_tag = soup.body
+    if body_tag:
+        # Remove any old versions to prevent duplicates and ensure freshness
+        for modal_id in ['loginModal', 'registerModal']:
+            existing_modal = soup.find('div', id=modal_id)
+            if existing_modal:
+                existing_modal.decompose()
+        
+        # Append the new, standardized modals
+        body_tag.append(new_login_modal_soup)
+        body_tag.append(new_register_modal_soup)
+        log(f"  - Ensured login/register modals are present.")
+    else:
+        log(f"  - Warning: No <body> tag found. Could not add modals.")
+
+    # --- 4. WRITE THE CHANGES BACK ---
+    # Only the replaced header and modals are re-serialized; the rest of
+    # the page keeps its original bytes
+    if not write_minimal(file_path, snapshot):
+        log(f"  - Already standardized, file left untouched.")
+        return 'unchanged'
+    return 'updated'
+
+def update_html_files(workers=None):
     """
     Finds all .html files, replaces or adds a standard header,
     and ensures the standard login/register modals are present.
+
+    Args:
+        workers (int): Number of worker processes (default: one per CPU).
     """
-    html_files = glob.glob('*.html')
+    html_files = sorted(glob.glob('*.html'))
     
     if not html_files:
         print("No HTML files found in the current directory.")
         return
 
     print(f"Found {len(html_files)} HTML files to process...")
-    
-    new_header_soup = BeautifulSoup(STANDARDIZED_HEADER_HTML, 'html.parser').header
-    new_login_modal_soup = BeautifulSoup(LOGIN_MODAL_HTML, 'html.parser').div
-    new_register_modal_soup = BeautifulSoup(REGISTER_MODAL_HTML, 'html.parser').div
 
-    for file_path in html_files:
-        print(f"Processing: {file_path}")
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Handle files that might be just fragments without full HTML structure
-                if not content.strip().startswith('<'):
-                     print(f"  - Skipping file {file_path} as it does not appear to be a valid HTML document.")
-                     continue
-                soup = BeautifulSoup(content, 'html.parser')
-
-            # --- 2. UPDATE OR ADD THE HEADER ---
-            existing_header = soup.find('header')
-            if existing_header:
-                existing_header.replace_with(new_header_soup)
-                print(f"  - Replaced existing header.")
-            else:
-                # Find a suitable place to insert the new header
-                insertion_point = soup.find('div', class_='flex-1') or soup.body
-                if insertion_point:
-                    insertion_point.insert(0, new_header_soup)
-                    print(f"  - Added new header.")
-                else:
-                    print(f"  - Warning: Could not find a suitable insertion point for the header.")
-
-            # --- 3. ENSURE MODALS ARE PRESENT AND CORRECT ---
-            body_tag = soup.body
-            if body_tag:
-                # Remove any old versions to prevent duplicates and ensure freshness
-                for modal_id in ['loginModal', 'registerModal']:
-                    existing_modal = soup.find('div', id=modal_id)
-                    if existing_modal:
-                        existing_modal.decompose()
-                
-                # Append the new, standardized modals
-                body_tag.append(new_login_modal_soup)
-                body_tag.append(new_register_modal_soup)
-                print(f"  - Ensured login/register modals are present.")
-            else:
-                print(f"  - Warning: No <body> tag found. Could not add modals.")
-
-            # --- 4. WRITE THE CHANGES BACK ---
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(soup.prettify())
-
-        except Exception as e:
-            print(f"  - ERROR processing file: {e}")
+    results = run_pages(html_files, standardize_page, workers)
+    print_summary(results, "HTML Standardization Complete")
 
 if __name__ == "__main__":
-    update_html_files()
+    parser = argparse.ArgumentParser(description='Standardize the header and modals of every HTML file in the current directory')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    update_html_files(args.workers)
     print("\nHTML structure update process finished.")
@@ -5,27 +5,38 @@ Standardizes Firebase versions and removes conflicts
 """
 
 import os
-import shutil
+import sys
+import argparse
 from bs4 import BeautifulSoup
 import re
 
-def fix_firebase_conflicts(filepath):
-    """Fix Firebase version conflicts in an HTML file"""
-    print(f"Processing {filepath}...")
-    
-    # Create backup
-    backup_path = f"{filepath}.backup"
-    if not os.path.exists(backup_path):
-        shutil.copy2(filepath, backup_path)
-        print(f"Created backup: {backup_path}")
-    
-    # Read file
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Parse HTML
-    soup = BeautifulSoup(content, 'html.parser')
-    
+# The shared HTML writer and backup store live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from html_writer import SourceSnapshot, write_minimal
+from backup_store import BackupStore, BACKUP_DIRNAME
+
+# Pages whose Firebase scripts are standardized, here and in html_pipeline.py
+TRANSFORM_PAGES = [
+    'app.html',
+    'articles.html',
+    'trades.html',
+    'profile.html',
+    'events.html',
+    'settings.html'
+]
+
+def dedupe_firebase_scripts(soup, filename=None, log=print):
+    """
+    Removes duplicate Firebase modules and pins the rest to one version.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
     # Target Firebase version (use the most common/stable one)
     target_version = "9.6.1"
     target_base_url = "/__/firebase/9.6.1/"
@@ -63,7 +74,7 @@ def fix_firebase_conflicts(filepath):
         # Check if we've already seen this module
         if module in seen_modules:
             # Remove duplicate
-            print(f"  Removing duplicate Firebase {module} script: {src}")
+            log(f"  Removing duplicate Firebase {module} script: {src}")
             script.decompose()
             removed_count += 1
         else:
@@ -74,42 +85,68 @@ def fix_firebase_conflicts(filepath):
                 else:
                     new_src = f"{target_base_url}firebase-{module}-compat.js"
                 
-                print(f"  Updating Firebase {module}: {src} -> {new_src}")
+                log(f"  Updating Firebase {module}: {src} -> {new_src}")
                 script['src'] = new_src
                 updated_count += 1
             
             seen_modules.add(module)
     
     if removed_count > 0 or updated_count > 0:
-        # Write fixed file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-        print(f"  Fixed {filepath} - removed {removed_count}, updated {updated_count}")
+        log(f"  Fixed {filename} - removed {removed_count}, updated {updated_count}")
         return True
-    else:
-        print(f"  No changes needed for {filepath}")
-        return False
+
+    log(f"  No changes needed for {filename}")
+    return False
+
+def fix_firebase_conflicts(filepath, verify=False):
+    """
+    Fix Firebase version conflicts in an HTML file.
+    Back the file up first (main() does this for all files in one run).
+    With verify, the written page is re-parsed to check it (debugging).
+    """
+    print(f"Processing {filepath}...")
+    
+    # Read file
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    
+    # Parse HTML
+    soup = BeautifulSoup(content, 'html.parser')
+    snapshot = SourceSnapshot(soup, content)
+    
+    if dedupe_firebase_scripts(soup, filepath):
+        # Write fixed file; only the edited script tags are re-serialized
+        return write_minimal(filepath, snapshot, verify)
+    return False
 
 def main():
     """Main function to fix all HTML files"""
-    html_files = [
-        'app.html',
-        'articles.html', 
-        'trades.html',
-        'profile.html',
-        'events.html',
-        'settings.html'
-    ]
-    
-    fixed_count = 0
+    parser = argparse.ArgumentParser(description='Standardize the Firebase SDK scripts of the main pages')
+    parser.add_argument('--verify', action='store_true',
+                        help='Re-parse every written page to check the minimal-diff output (debugging)')
+    args = parser.parse_args()
+
+    html_files = TRANSFORM_PAGES
+
+    existing_files = [filename for filename in html_files if os.path.exists(filename)]
     for filename in html_files:
-        if os.path.exists(filename):
-            if fix_firebase_conflicts(filename):
-                fixed_count += 1
-        else:
+        if filename not in existing_files:
             print(f"File not found: {filename}")
+
+    # Create backup (content-addressed, so unchanged files are stored only once)
+    if existing_files:
+        store = BackupStore(BACKUP_DIRNAME)
+        backup_run = store.backup(existing_files, label='fix_firebase_conflicts')
+        print(f"Created backup run {backup_run} in: {store.store_dir}")
+    
+    fixed_count = 0
+    for filename in existing_files:
+        if fix_firebase_conflicts(filename, args.verify):
+            fixed_count += 1
     
     print(f"\nFixed {fixed_count} files")
+    if existing_files:
+        print(f"To undo: python ../backup_store.py restore {backup_run}")
     print("\nAfter applying fixes:")
     print("1. All files should use Firebase 9.6.1 consistently")
     print("2. No duplicate Firebase modules should remain")
@@ -5,16 +5,24 @@ Uses the working implementation from articles.html (or the best available implem
 """
 
 import os
-import re
-import shutil
+import sys
 from pathlib import Path
-from datetime import datetime
+
+# The shared HTML scanner and backup store live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from html_scan import SpanIndex, apply_edits
+from backup_store import BackupStore, BACKUP_DIRNAME
+
+# Element ids and script include that make up the messenger widget
+CONTAINER_ID = 'messenger-widget-container'
+MODAL_ID = 'new-conversation-modal'
+MESSENGER_JS_SRC = 'js/messenger.js'
 
 class MessengerWidgetReplacer:
     def __init__(self, source_file=None, target_directory="."):
         self.source_file = source_file
         self.target_directory = Path(target_directory)
-        self.backup_directory = self.target_directory / "backup_before_messenger_fix"
+        self.backup_store = BackupStore(self.target_directory / BACKUP_DIRNAME)
         
         # Messenger widget components
         self.messenger_container = None
@@ -22,47 +30,44 @@ class MessengerWidgetReplacer:
         self.messenger_js_includes = []
         
     def create_backup(self):
-        """Create backup of all HTML files before modification."""
-        if not self.backup_directory.exists():
-            self.backup_directory.mkdir(parents=True)
-            
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = self.backup_directory / f"backup_{timestamp}"
-        backup_dir.mkdir(parents=True)
-        
-        html_files = list(self.target_directory.glob("*.html"))
-        for html_file in html_files:
-            if html_file.parent != self.backup_directory:  # Don't backup backup files
-                shutil.copy2(html_file, backup_dir / html_file.name)
-                
-        print(f"Created backup in: {backup_dir}")
-        return backup_dir
+        """
+        Back up all HTML files before modification.
+
+        Files are stored once by content hash, so pages unchanged since an
+        earlier backup cost nothing but a manifest entry.
+
+        Returns:
+            str: The backup run id (see backup_store.py restore).
+        """
+        html_files = sorted(self.target_directory.glob("*.html"))
+        run_id = self.backup_store.backup(html_files, label='replace_messenger_widgets')
+        print(f"Created backup run {run_id} in: {self.backup_store.store_dir}")
+        return run_id
         
+    def index_messenger_components(self, html_content):
+        """Scan the page once for every messenger component and </body>."""
+        return SpanIndex(
+            html_content,
+            ids=[CONTAINER_ID, MODAL_ID],
+            script_srcs=[MESSENGER_JS_SRC],
+            end_tags=['body'],
+        )
+
     def extract_messenger_components(self, html_content):
         """Extract messenger widget components from HTML content."""
         components = {}
+        index = self.index_messenger_components(html_content)
         
         # Extract messenger widget container
-        container_pattern = r'<div[^>]*id="messenger-widget-container"[^>]*>.*?</div>\s*(?=<script|</body|</html|<!--)'
-        container_match = re.search(container_pattern, html_content, re.DOTALL | re.IGNORECASE)
-        if container_match:
-            components['container'] = container_match.group(0)
+        if index.span(CONTAINER_ID):
+            components['container'] = index.text(CONTAINER_ID)
             
         # Extract messenger modal
-        modal_pattern = r'<div[^>]*id="new-conversation-modal"[^>]*>.*?</div>\s*(?=<script|</body|</html|<!--)'
-        modal_match = re.search(modal_pattern, html_content, re.DOTALL | re.IGNORECASE)
-        if modal_match:
-            components['modal'] = modal_match.group(0)
+        if index.span(MODAL_ID):
+            components['modal'] = index.text(MODAL_ID)
             
         # Extract messenger JavaScript includes
-        js_patterns = [
-            r'<script[^>]*src="js/messenger\.js"[^>]*></script>',
-        ]
-        
-        js_includes = []
-        for pattern in js_patterns:
-            matches = re.findall(pattern, html_content, re.IGNORECASE)
-            js_includes.extend(matches)
+        js_includes = [html_content[start:end] for start, end in index.scripts[MESSENGER_JS_SRC]]
             
         if js_includes:
             components['javascript'] = js_includes
@@ -96,52 +101,66 @@ class MessengerWidgetReplacer:
         with open(html_file, 'r', encoding='utf-8') as f:
             content = f.read()
             
-        original_content = content
         changes_made = []
+        # All edits are expressed against the original offsets of this one index
+        index = self.index_messenger_components(content)
+        container_span = index.span(CONTAINER_ID)
+        modal_span = index.span(MODAL_ID)
+        body_end = index.end_tags['body'][0] if 'body' in index.end_tags else None
+        edits = []
+        replaced_spans = []
         
         # Replace messenger widget container
+        container_start = None
         if self.messenger_container:
-            container_pattern = r'<div[^>]*id="messenger-widget-container"[^>]*>.*?</div>\s*(?=<script|</body|</html|<!--)'
-            if re.search(container_pattern, content, re.DOTALL | re.IGNORECASE):
-                content = re.sub(container_pattern, self.messenger_container, content, flags=re.DOTALL | re.IGNORECASE)
+            if container_span:
+                edits.append((container_span[0], container_span[1], self.messenger_container))
+                replaced_spans.append(container_span)
+                container_start = container_span[0]
                 changes_made.append("container")
-            else:
+            elif body_end is not None:
                 # Add container before closing body tag if not found
-                body_end_pattern = r'(</body>)'
-                if re.search(body_end_pattern, content, re.IGNORECASE):
-                    content = re.sub(body_end_pattern, f'{self.messenger_container}\n\\1', content, flags=re.IGNORECASE)
-                    changes_made.append("container (added)")
+                edits.append((body_end, body_end, f'{self.messenger_container}\n'))
+                container_start = body_end
+                changes_made.append("container (added)")
+        elif container_span:
+            container_start = container_span[0]
                     
         # Replace messenger modal
         if self.messenger_modal:
-            modal_pattern = r'<div[^>]*id="new-conversation-modal"[^>]*>.*?</div>\s*(?=<script|</body|</html|<!--)'
-            if re.search(modal_pattern, content, re.DOTALL | re.IGNORECASE):
-                content = re.sub(modal_pattern, self.messenger_modal, content, flags=re.DOTALL | re.IGNORECASE)
+            if modal_span:
+                edits.append((modal_span[0], modal_span[1], self.messenger_modal))
+                replaced_spans.append(modal_span)
                 changes_made.append("modal")
-            else:
+            elif self.messenger_container and container_start is not None:
                 # Add modal before messenger container if not found
-                if self.messenger_container and self.messenger_container in content:
-                    content = content.replace(self.messenger_container, f'{self.messenger_modal}\n{self.messenger_container}')
-                    changes_made.append("modal (added)")
+                modal_edit = (container_start, container_start, f'{self.messenger_modal}\n')
+                # Must land before the container when both are inserted at </body>
+                edits.insert(len(edits) - 1 if container_start == body_end else len(edits), modal_edit)
+                changes_made.append("modal (added)")
                     
         # Replace/add messenger JavaScript includes
         if self.messenger_js_includes:
-            # Remove existing messenger.js includes
-            existing_js_pattern = r'<script[^>]*src="js/messenger\.js"[^>]*></script>\s*'
-            content = re.sub(existing_js_pattern, '', content, flags=re.IGNORECASE)
+            # Remove existing messenger.js includes (and the whitespace after them)
+            for start, end in index.scripts[MESSENGER_JS_SRC]:
+                if any(outer_start <= start < outer_end for outer_start, outer_end in replaced_spans):
+                    continue  # Already rewritten as part of a replaced component
+                while end < len(content) and content[end].isspace():
+                    end += 1
+                edits.append((start, end, ''))
             
             # Add new messenger.js include before closing body tag
-            for js_include in self.messenger_js_includes:
-                if js_include not in content:
-                    body_end_pattern = r'(</body>)'
-                    if re.search(body_end_pattern, content, re.IGNORECASE):
-                        content = re.sub(body_end_pattern, f'{js_include}\n\\1', content, flags=re.IGNORECASE)
-                        changes_made.append("javascript")
+            if body_end is not None:
+                for js_include in self.messenger_js_includes:
+                    edits.append((body_end, body_end, f'{js_include}\n'))
+                    changes_made.append("javascript")
                         
+        new_content = apply_edits(content, edits)
+
         # Write back if changes were made
-        if content != original_content:
+        if new_content != content:
             with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(content)
+                f.write(new_content)
             return changes_made
         else:
             return []
@@ -153,7 +172,7 @@ class MessengerWidgetReplacer:
             return False
             
         # Create backup
-        backup_dir = self.create_backup()
+        backup_run = self.create_backup()
         
         # Find all HTML files
         html_files = list(self.target_directory.glob("*.html"))
@@ -165,9 +184,6 @@ class MessengerWidgetReplacer:
         
         results = {}
         for html_file in html_files:
-            if html_file.parent == self.backup_directory:
-                continue  # Skip backup files
-                
             changes = self.replace_messenger_in_file(html_file)
             results[html_file.name] = changes
             
@@ -176,7 +192,8 @@ class MessengerWidgetReplacer:
             else:
                 print(f"  - {html_file.name}: no changes needed")
                 
-        print(f"\nCompleted! Backup created in: {backup_dir}")
+        print(f"\nCompleted! Backup run: {backup_run}")
+        print(f"To undo: python backup_store.py --store {self.backup_store.store_dir} restore {backup_run}")
         return True
 
 def main():
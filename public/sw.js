@@ -1,46 +1,85 @@
 // HatakeSocial PWA Service Worker - Perfect Score Version
-// Version: 2.0.1 (FIXED)
+// Version: 2.1.0
+
+// The app shell, with a content revision for each URL (null for URLs that
+// are content-hashed already). Regenerate with: python sw_precache.py
+// PRECACHE_BEGIN (generated by sw_precache.py, do not edit)
+const PRECACHE_VERSION = '6a9b160614';
+const PRECACHE_MANIFEST = [
+  { url: "/", revision: '987e5107bb' },
+  { url: "/app.html", revision: 'be2732d77e' },
+  { url: "/icons/128.png", revision: '9c083a6515' },
+  { url: "/icons/144.png", revision: '11e014bbb9' },
+  { url: "/icons/152.png", revision: 'db4e0be608' },
+  { url: "/icons/16.png", revision: '8570dc945a' },
+  { url: "/icons/180.png", revision: 'b6212ed228' },
+  { url: "/icons/192.png", revision: '7105d4f51e' },
+  { url: "/icons/256.png", revision: 'a3a4507202' },
+  { url: "/icons/32.png", revision: '0e4034a906' },
+  { url: "/icons/512.png", revision: 'f316e7a448' },
+  { url: "/icons/72.png", revision: 'da2362ef26' },
+  { url: "/icons/android-launchericon-96-96.png", revision: '747954fc30' },
+  { url: "/images/hatakesocial-logo.png", revision: '671f048ac2' },
+  { url: "/index.html", revision: '987e5107bb' },
+  { url: "/js/auth.js", revision: '1b866a7977' },
+  { url: "/js/darkmode.js", revision: '1cc812ef26' },
+  { url: "/js/simple-analytics.js", revision: '3b70b9e3e1' },
+  { url: "/manifest.json", revision: 'fb09438cfd' },
+  { url: "/offline.html", revision: '1aa504bd53' },
+];
+// PRECACHE_END
 
-const CACHE_NAME = 'hatakesocial-v2.0.1';
+const CACHE_NAME = 'hatakesocial-v2.1.0';
+const PRECACHE_NAME = 'hatakesocial-precache';
 const OFFLINE_URL = '/offline.html';
 
-// Critical files that MUST be cached for offline functionality
-const PRECACHE_URLS = [
-  '/',                    // Root URL - CRITICAL for PWABuilder detection
-  '/index.html',          // Main page
-  '/offline.html',        // Offline fallback
-  '/manifest.json',       // PWA manifest
-  '/app.html',           // Main app
-  '/my_collection.html', // Collection page
-  '/deck.html',          // Deck builder
-  '/marketplace.html',   // Marketplace
-  '/css/main.css',       // Main styles
-  '/css/homepage.css',   // Homepage styles
-  '/css/platform.css',  // Platform styles
-  '/js/main.js',         // Main JavaScript
-  '/js/forms.js',        // Forms JavaScript
-  '/images/hatakesocial-logo.png', // Logo
-  '/icons/icon-192x192.png',       // PWA icons
-  '/icons/icon-512x512.png'
-];
+// Precached responses are stored under their URL plus revision, so a new
+// manifest only fetches the entries whose revision changed
+function precacheKey(entry) {
+  const url = new URL(entry.url, self.location.origin);
+  if (entry.revision) url.searchParams.set('__rev', entry.revision);
+  return url.href;
+}
+
+const PRECACHE_KEYS = new Map(
+  PRECACHE_MANIFEST.map(entry => [new URL(entry.url, self.location.origin).href, precacheKey(entry)])
+);
+
+// Entries whose URL changes with their content (fingerprinted or bundled)
+const VERSIONED_URLS = new Set(
+  PRECACHE_MANIFEST.filter(entry => !entry.revision).map(entry => new URL(entry.url, self.location.origin).href)
+);
 
-// Install event - cache critical resources
+async function matchPrecache(url) {
+  const key = PRECACHE_KEYS.get(new URL(url, self.location.origin).href);
+  if (!key) return undefined;
+  const cache = await caches.open(PRECACHE_NAME);
+  return cache.match(key);
+}
+
+// Install event - precache the app shell entries that changed
 self.addEventListener('install', event => {
-  console.log('[SW] Install event');
+  console.log('[SW] Install event, precache version', PRECACHE_VERSION);
 
   event.waitUntil(
     (async () => {
       try {
-        const cache = await caches.open(CACHE_NAME);
-        console.log('[SW] Caching app shell and content');
-
-        // Cache critical files
-        await cache.addAll(PRECACHE_URLS);
+        const cache = await caches.open(PRECACHE_NAME);
+        let fetched = 0;
+
+        await Promise.all(PRECACHE_MANIFEST.map(async entry => {
+          const key = precacheKey(entry);
+          if (await cache.match(key)) return;
+          const response = await fetch(entry.url, { cache: 'reload' });
+          if (!response.ok) throw new Error(`${entry.url}: HTTP ${response.status}`);
+          await cache.put(key, response);
+          fetched++;
+        }));
 
         // Force activation of new service worker
         await self.skipWaiting();
 
-        console.log('[SW] App shell and content cached successfully');
+        console.log(`[SW] App shell cached (${fetched} of ${PRECACHE_MANIFEST.length} entries fetched)`);
       } catch (error) {
         console.error('[SW] Failed to cache app shell:', error);
       }
@@ -59,13 +98,20 @@ self.addEventListener('activate', event => {
         const cacheNames = await caches.keys();
         await Promise.all(
           cacheNames
-            .filter(cacheName => cacheName !== CACHE_NAME)
+            .filter(cacheName => cacheName !== CACHE_NAME && cacheName !== PRECACHE_NAME)
             .map(cacheName => {
               console.log('[SW] Deleting old cache:', cacheName);
               return caches.delete(cacheName);
             })
         );
 
+        // Drop the precached revisions the current manifest no longer lists
+        const precache = await caches.open(PRECACHE_NAME);
+        const keep = new Set(PRECACHE_KEYS.values());
+        for (const request of await precache.keys()) {
+          if (!keep.has(request.url)) await precache.delete(request);
+        }
+
         // Take control of all clients
         await self.clients.claim();
 
@@ -93,6 +139,26 @@ self.addEventListener('fetch', event => {
   event.respondWith(
     (async () => {
       try {
+        // Content-hashed shell entries never change, so they are served
+        // from the precache. Pages and other unversioned entries go to the
+        // network first, so a deploy shows up even when sw.js is unchanged;
+        // their precached copy is the offline fallback.
+        const precached = await matchPrecache(event.request.url);
+        if (precached) {
+          if (VERSIONED_URLS.has(new URL(event.request.url).href)) {
+            return precached;
+          }
+          try {
+            const networkResponse = await fetch(event.request);
+            if (networkResponse.ok) {
+              return networkResponse;
+            }
+          } catch (error) {
+            console.log('[SW] Network failed, serving the precached copy:', event.request.url);
+          }
+          return precached;
+        }
+
         const cache = await caches.open(CACHE_NAME);
 
         // For navigation requests (HTML pages)
@@ -117,7 +183,7 @@ self.addEventListener('fetch', event => {
             }
 
             // Fallback to offline page
-            return await cache.match(OFFLINE_URL);
+            return await matchPrecache(OFFLINE_URL);
           }
         }
 
@@ -152,8 +218,7 @@ self.addEventListener('fetch', event => {
 
         // For failed requests, try to serve offline page for HTML requests
         if (event.request.destination === 'document') {
-          const cache = await caches.open(CACHE_NAME);
-          return await cache.match(OFFLINE_URL);
+          return await matchPrecache(OFFLINE_URL);
         }
 
         // For other resources, let them fail
@@ -197,8 +262,8 @@ self.addEventListener('push', event => {
 
   const options = {
     body: event.data ? event.data.text() : 'New update from HatakeSocial!',
-    icon: '/icons/icon-192x192.png',
-    badge: '/icons/icon-96x96.png',
+    icon: '/icons/192.png',
+    badge: '/icons/android-launchericon-96-96.png',
     vibrate: [100, 50, 100],
     data: {
       dateOfArrival: Date.now(),
@@ -208,12 +273,12 @@ self.addEventListener('push', event => {
       {
         action: 'explore',
         title: 'Open HatakeSocial',
-        icon: '/icons/icon-192x192.png'
+        icon: '/icons/192.png'
       },
       {
         action: 'close',
         title: 'Close',
-        icon: '/icons/icon-192x192.png'
+        icon: '/icons/192.png'
       }
     ]
   };
@@ -1,4 +1,5 @@
 import os
+import copy
 import glob
 from bs4 import BeautifulSoup
 
@@ -23,6 +24,45 @@ STANDARDIZED_HEADER_HTML = """
 </header>
 """
 
+def header_layout(header):
+    """
+    Returns the header's markup with the #user-actions contents left out,
+    since auth.js (and fix_modals_and_buttons.py) fill that container in.
+    """
+    header = copy.copy(header)
+    user_actions = header.find(id='user-actions')
+    if user_actions:
+        user_actions.clear()
+    return str(header)
+
+def replace_header(soup, filename=None, log=print):
+    """
+    Replaces the page's <header> with the standardized version.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    # Find the existing header tag
+    existing_header = soup.find('header')
+    if not existing_header:
+        log(f"Warning: No <header> tag found in {filename}. Skipping.")
+        return False
+
+    new_header = BeautifulSoup(STANDARDIZED_HEADER_HTML, 'html.parser').header
+    if header_layout(existing_header) == header_layout(new_header):
+        log(f"Header already up to date in: {filename}")
+        return False
+
+    # Replace the old header with the new one
+    existing_header.replace_with(new_header)
+    log(f"Successfully updated header in: {filename}")
+    return True
+
 def update_html_files():
     """
     Finds all .html files in the current directory and replaces their <header>
@@ -35,29 +75,16 @@ def update_html_files():
         return
 
     print(f"Found {len(html_files)} HTML files to process...")
-    
-    # Create a BeautifulSoup object for the standardized header for parsing
-    new_header_soup = BeautifulSoup(STANDARDIZED_HEADER_HTML, 'html.parser')
 
     for file_path in html_files:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 soup = BeautifulSoup(f, 'html.parser')
 
-            # Find the existing header tag
-            existing_header = soup.find('header')
-
-            if existing_header:
-                # Replace the old header with the new one
-                existing_header.replace_with(new_header_soup)
-                
+            if replace_header(soup, file_path):
                 # Write the modified content back to the file
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write(str(soup))
-                
-                print(f"Successfully updated header in: {file_path}")
-            else:
-                print(f"Warning: No <header> tag found in {file_path}. Skipping.")
 
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Script-loading optimizer for the pages in public/.
+
+fix_firebase_conflicts only de-duplicates Firebase modules, and most pages
+still load the Firebase SDK, jQuery, Chart.js and their own scripts as
+parser-blocking <script>s. The 'script_loading' pipeline transform:
+
+1. Removes every later <script> whose src (after normalizing './' and a
+   leading '/' for local files) was already loaded earlier on the page,
+   directly, as a fingerprinted copy or in a bundle.
+2. Marks external classic scripts `defer`, which keeps their relative order
+   (so the Firebase SDK still runs before auth.js and the page scripts), or
+   `async` for the self-contained scripts in ASYNC_SCRIPTS.
+
+A script is only deferred if no later inline script may need it while the
+page is still being parsed. Inline scripts whose code all runs from a
+DOMContentLoaded/load listener run after every deferred script, so they do
+not hold anything back; nor do the PARSE_TIME_INLINE snippets, which only
+use CRITICAL_SCRIPTS. Any other inline script keeps every external script
+before it blocking. CRITICAL_SCRIPTS are never deferred.
+
+Each page reports how many blocking scripts it deferred and how many bytes
+of local script that takes off the critical path.
+"""
+
+import os
+import re
+import argparse
+from image_dimensions import site_path
+from fingerprint_assets import source_asset
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Scripts that must run while the page is parsed (src patterns).
+CRITICAL_SCRIPTS = [
+    # The Tailwind Play CDN styles the page as it is parsed
+    r'^https://cdn\.tailwindcss\.com',
+]
+# Inline snippets that only use CRITICAL_SCRIPTS, so they hold nothing else back.
+PARSE_TIME_INLINE = [
+    r'^\s*tailwind\.config\s*=',
+]
+# Scripts nothing depends on, which can run as soon as they arrive (src patterns).
+ASYNC_SCRIPTS = [
+    # Polls for Firebase itself before logging the page view
+    r'(?:^|/)js/simple-analytics\.js$',
+]
+# Bump this whenever the de-duplication or deferral rules change, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+_CRITICAL_RE = [re.compile(pattern) for pattern in CRITICAL_SCRIPTS]
+_PARSE_TIME_RE = [re.compile(pattern) for pattern in PARSE_TIME_INLINE]
+_ASYNC_RE = [re.compile(pattern) for pattern in ASYNC_SCRIPTS]
+_JS_TYPES = ('', 'text/javascript', 'application/javascript', 'module')
+_LISTENER_RE = re.compile(r'''(?:document|window)\s*\.\s*addEventListener\s*\(\s*(['"])(?:DOMContentLoaded|load)\1''')
+_COMMENT_OR_SPACE_RE = re.compile(r'(?:\s+|//[^\n]*|/\*.*?\*/|;)*', re.DOTALL)
+
+def _skip_literal(code, index):
+    """Returns the index just past the string or comment starting at index."""
+    char = code[index]
+    if code.startswith('//', index):
+        end = code.find('\n', index)
+        return len(code) if end == -1 else end
+    if code.startswith('/*', index):
+        end = code.find('*/', index + 2)
+        return len(code) if end == -1 else end + 2
+    index += 1
+    while index < len(code) and code[index] != char:
+        index += 2 if code[index] == '\\' else 1
+    return index + 1
+
+def _matching_paren(code, index):
+    """Returns the index of the ')' closing the '(' at index, or -1."""
+    depth = 0
+    while index < len(code):
+        char = code[index]
+        if char in '"\'`' or code.startswith(('//', '/*'), index):
+            index = _skip_literal(code, index)
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    return -1
+
+def runs_after_parse(code):
+    """
+    Checks whether all of an inline script's code sits in DOMContentLoaded
+    or load listeners, i.e. only runs after every deferred script.
+    """
+    pos = _COMMENT_OR_SPACE_RE.match(code).end()
+    if pos == len(code):
+        return False
+    while pos < len(code):
+        listener = _LISTENER_RE.match(code, pos)
+        if listener is None:
+            return False
+        close = _matching_paren(code, code.index('(', listener.start()))
+        if close == -1:
+            return False
+        pos = _COMMENT_OR_SPACE_RE.match(code, close + 1).end()
+    return True
+
+def _script_key(src):
+    path = site_path(src)
+    return path if path is not None else src.split('#')[0]
+
+def script_sources(script, public_dir=PUBLIC_DIR):
+    """
+    Returns the scripts a <script src> tag loads: the sources listed in a
+    bundle's data-bundle (see js_bundle.py), or its src, with a fingerprinted
+    copy standing for its source. Local scripts are given relative to
+    public/, remote ones as their URL.
+    """
+    if script.get('data-bundle'):
+        return script['data-bundle'].split()
+    key = _script_key(script['src'])
+    return [source_asset(key, public_dir) if site_path(script['src']) is not None else key]
+
+def loads_script(soup, src):
+    """Checks whether a page loads a script, directly, as a fingerprinted copy or in a bundle."""
+    key = _script_key(src)
+    return any(key in script_sources(script) for script in soup.find_all('script', src=True))
+
+def _matches(patterns, src):
+    return any(pattern.search(src) for pattern in patterns)
+
+def _script_type(script):
+    return (script.get('type') or '').strip().lower()
+
+def optimize_scripts(soup, filename=None, log=print):
+    """
+    Removes duplicate script includes and defers the page's blocking scripts.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    seen = set()
+    removed = 0
+    scripts = []
+    for script in soup.find_all('script'):
+        if _script_type(script) not in _JS_TYPES:
+            continue  # JSON, templates, ...
+        if script.get('src'):
+            sources = script_sources(script)
+            if not script.get('data-bundle') and sources[0] in seen:
+                script.decompose()
+                removed += 1
+                continue
+            seen.update(sources)
+        scripts.append(script)
+
+    # Walk backwards: a blocking script can be deferred until an inline
+    # script that may need it during parsing is found
+    deferred = []
+    held_back = False
+    for script in reversed(scripts):
+        src = script.get('src')
+        if not src:
+            code = script.string or ''
+            if _script_type(script) != 'module' and not runs_after_parse(code) \
+                    and not _matches(_PARSE_TIME_RE, code):
+                held_back = True
+            continue
+        if (_script_type(script) == 'module' or script.has_attr('defer') or script.has_attr('async')
+                or _matches(_CRITICAL_RE, src)):
+            continue
+        if held_back:
+            continue
+        if _matches(_ASYNC_RE, src):
+            script['async'] = ''
+        else:
+            script['defer'] = ''
+        deferred.append(src)
+
+    if not removed and not deferred:
+        return False
+
+    local_bytes = 0
+    remote = 0
+    for src in deferred:
+        path = site_path(src)
+        if path is None:
+            remote += 1
+        elif os.path.isfile(os.path.join(PUBLIC_DIR, path)):
+            local_bytes += os.path.getsize(os.path.join(PUBLIC_DIR, path))
+    log(f"{filename}: removed {removed} duplicate script(s), deferred {len(deferred)} blocking script(s) "
+        f"({local_bytes / 1024:.1f} KB local + {remote} remote)")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='De-duplicate and defer the <script> tags of every page in public/')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-check every page, even if unchanged since the last run')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    from html_pipeline import run_pipeline
+    run_pipeline(PUBLIC_DIR, only=['script_loading'], workers=args.workers, use_cache=not args.no_cache)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Service-worker precache manifest generated from the build.
+
+public/sw.js used to cache a hand-maintained URL list, half of which no
+longer exists (so cache.addAll() failed and nothing was precached). This
+script computes the list from public/ after the asset build and injects it
+into the service workers, between the PRECACHE_BEGIN/PRECACHE_END markers:
+
+    const PRECACHE_VERSION = '<hash of the list>';
+    const PRECACHE_MANIFEST = [
+      { url: "/offline.html", revision: '<content hash>' },
+      { url: "/js/auth.3f1c2a9b0d.js", revision: null },
+      ...
+    ];
+
+The list is the app shell:
+
+- SHELL_PAGES, which carry the standardized header and sidebar markup
+  (update_headers.py and fix_sidebarmobile.py inline them into every page),
+  with index.html also precached as '/'. OFFLINE_PAGE is precached with
+  every local file it loads, so the fallback page works offline.
+- SHELL_SCRIPTS (auth.js, darkmode.js) as every shell page loads them: the
+  fingerprinted copy or the bundle that contains them, plus the copy other
+  pages load (fingerprint_assets.py), and the modules they import.
+- The icons in manifest.json and in the shell pages' icon links.
+
+A file the shell references that does not exist is an error, and nothing
+is written, so a broken icon or script path cannot silently drop out of the
+precache.
+
+Fingerprinted and bundle URLs change with their content and get no
+revision; every other entry carries a hash of its content. sw.js keys each
+entry by URL and revision, so an update only fetches the entries that
+changed. It serves the revision-less entries from the cache; pages and
+other unversioned entries are fetched from the network first, with the
+precached copy as the offline fallback, so a deploy is visible even before
+the new service worker is installed. Any change to the list changes the
+service worker's bytes, which is what makes browsers install the new
+version. firebase.json runs this script as a hosting predeploy step, so the
+list cannot go stale.
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+from bs4 import BeautifulSoup
+from image_dimensions import site_path
+from script_loading import script_sources
+from fingerprint_assets import HASH_LENGTH, is_fingerprinted, load_fingerprints
+from modules import ModuleGraph
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Service workers to inject the list into (paths relative to public/)
+SERVICE_WORKERS = ['sw.js', 'sw2.js']
+# Pages precached as the app shell. The first one is also precached as '/'.
+SHELL_PAGES = ['index.html', 'app.html']
+# The navigation fallback, precached with everything it loads
+OFFLINE_PAGE = 'offline.html'
+# Scripts every page needs (sources, relative to public/)
+SHELL_SCRIPTS = ['js/auth.js', 'js/darkmode.js']
+# Other files precached as they are
+SHELL_FILES = ['manifest.json']
+# --- End Configuration ---
+
+BEGIN_MARKER = '// PRECACHE_BEGIN (generated by sw_precache.py, do not edit)'
+END_MARKER = '// PRECACHE_END'
+_BLOCK_RE = re.compile(re.escape(BEGIN_MARKER) + r'.*?' + re.escape(END_MARKER), re.DOTALL)
+_ICON_RELS = {'icon', 'apple-touch-icon', 'shortcut', 'mask-icon', 'manifest'}
+_SUBRESOURCE_ATTRS = (('script', 'src'), ('link', 'href'), ('img', 'src'), ('source', 'src'))
+
+def revision(path, public_dir=PUBLIC_DIR):
+    """Returns the content hash of a file (path relative to public/)."""
+    with open(os.path.join(public_dir, path), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+def _is_versioned(path, public_dir=PUBLIC_DIR):
+    # Fingerprinted copies and bundles have their content hash in the name
+    return is_fingerprinted(path, public_dir) or path.startswith('js/bundles/')
+
+def _parse_page(page, public_dir=PUBLIC_DIR):
+    with open(os.path.join(public_dir, page), 'r', encoding='utf-8') as f:
+        return BeautifulSoup(f.read(), 'html.parser')
+
+def _manifest_icons(public_dir=PUBLIC_DIR):
+    """Returns the icon paths listed in manifest.json, including the shortcuts' icons."""
+    try:
+        with open(os.path.join(public_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return []
+    icons = list(manifest.get('icons', []))
+    for shortcut in manifest.get('shortcuts', []):
+        icons.extend(shortcut.get('icons', []))
+    return [path for path in (site_path(icon.get('src')) for icon in icons) if path]
+
+def page_shell_assets(soup, offline=False):
+    """
+    Returns the local files of a page that belong to the shell: its icon
+    links and the scripts that load a SHELL_SCRIPT, or, for the offline
+    page, every local file it loads.
+    """
+    paths = []
+    for tag_name, attr in _SUBRESOURCE_ATTRS:
+        for tag in soup.find_all(tag_name, attrs={attr: True}):
+            path = site_path(tag[attr])
+            if path is None:
+                continue
+            if offline:
+                paths.append(path)
+            elif tag_name == 'script':
+                if set(script_sources(tag)) & set(SHELL_SCRIPTS):
+                    paths.append(path)
+            elif tag_name == 'link' and _ICON_RELS & set(tag.get('rel', [])):
+                paths.append(path)
+    return paths
+
+def shell_assets(public_dir=PUBLIC_DIR):
+    """
+    Returns the app shell as a dict of URL -> file (relative to public/),
+    and the files it references that do not exist.
+    """
+    files = [OFFLINE_PAGE] + SHELL_PAGES
+    for page in files[:]:
+        if os.path.isfile(os.path.join(public_dir, page)):
+            files.extend(page_shell_assets(_parse_page(page, public_dir), offline=page == OFFLINE_PAGE))
+    fingerprints = load_fingerprints(public_dir)
+    files.extend(fingerprints.get(path, path) for path in SHELL_SCRIPTS)
+    files.extend(SHELL_FILES)
+    files.extend(_manifest_icons(public_dir))
+
+    scripts = [path for path in files if path.endswith('.js')]
+    files.extend(ModuleGraph(public_dir, scripts).closure(scripts))
+
+    assets, missing = {}, []
+    for path in files:
+        if not os.path.isfile(os.path.join(public_dir, path)):
+            if path not in missing:
+                missing.append(path)
+            continue
+        assets.setdefault('/' + path, path)
+    if SHELL_PAGES and '/' + SHELL_PAGES[0] in assets:
+        assets['/'] = SHELL_PAGES[0]
+    return assets, missing
+
+def manifest_entries(assets, public_dir=PUBLIC_DIR):
+    """
+    Returns the precache entries for a URL -> file dict, sorted by URL.
+
+    Returns:
+        list: [{'url': ..., 'revision': ... or None}, ...]
+    """
+    return [
+        {'url': url, 'revision': None if _is_versioned(path, public_dir) else revision(path, public_dir)}
+        for url, path in sorted(assets.items())
+    ]
+
+def manifest_version(entries):
+    """Returns a hash of the entries, which changes whenever any entry does."""
+    return hashlib.sha256(json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+def render_manifest(entries):
+    """Returns the JavaScript block injected into the service workers."""
+    lines = [BEGIN_MARKER, f"const PRECACHE_VERSION = '{manifest_version(entries)}';", 'const PRECACHE_MANIFEST = [']
+    for entry in entries:
+        revision_js = 'null' if entry['revision'] is None else f"'{entry['revision']}'"
+        lines.append(f"  {{ url: {json.dumps(entry['url'])}, revision: {revision_js} }},")
+    lines.extend(['];', END_MARKER])
+    return '\n'.join(lines)
+
+def inject_manifest(sw_path, block):
+    """
+    Replaces the marked block of a service worker.
+
+    Returns:
+        bool: True if the file changed, False if it was up to date.
+
+    Raises:
+        ValueError: If the service worker has no PRECACHE_BEGIN/END block.
+    """
+    with open(sw_path, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+    if not _BLOCK_RE.search(content):
+        raise ValueError(f"{sw_path} has no '{BEGIN_MARKER}' ... '{END_MARKER}' block")
+    updated = _BLOCK_RE.sub(lambda match: block, content, count=1)
+    if updated == content:
+        return False
+    with open(sw_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(updated)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Inject the app-shell precache list into the service workers in public/')
+    parser.add_argument('--list', action='store_true',
+                        help='Print the precache entries and exit without writing')
+    args = parser.parse_args()
+
+    if not os.path.isdir(PUBLIC_DIR):
+        print(f"ERROR: Target directory '{PUBLIC_DIR}' not found.")
+        return False
+
+    assets, missing = shell_assets(PUBLIC_DIR)
+    if missing:
+        for path in missing:
+            print(f"ERROR: Referenced by the shell but missing: {path}")
+        return False
+
+    entries = manifest_entries(assets, PUBLIC_DIR)
+    total = sum(os.path.getsize(os.path.join(PUBLIC_DIR, path)) for path in assets.values())
+    if args.list:
+        for entry in entries:
+            print(f"{entry['url']:<60}{entry['revision'] or '(versioned URL)'}")
+    print(f"Precache: {len(entries)} entries, {total / 1024:.1f} KB (version {manifest_version(entries)})")
+    if args.list:
+        return True
+
+    block = render_manifest(entries)
+    ok = True
+    for sw in SERVICE_WORKERS:
+        sw_path = os.path.join(PUBLIC_DIR, sw)
+        if not os.path.isfile(sw_path):
+            continue
+        try:
+            changed = inject_manifest(sw_path, block)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            ok = False
+            continue
+        print(f"{'UPDATED' if changed else 'Up to date'}: {sw}")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
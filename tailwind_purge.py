@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Purged local Tailwind stylesheet for the pages.
+
+HEAD_TEMPLATE (finalize_and_fix_scripts.py) links the full Tailwind 2.2.19
+build from the CDN, ~3 MB of CSS of which the site uses a tiny fraction.
+This script:
+
+1. Collects every class-like token used by public/*.html, public/js (with
+   its modules) and the maintenance scripts whose templates are injected into
+   the pages (STANDARDIZED_HEADER_HTML, MODALS_HTML, ...). Tokens are taken
+   with Tailwind's own extractor pattern, so variants such as dark:bg-gray-800,
+   lg:hidden and w-1/2 are found in markup and in JS strings alike. The
+   tokens of each file are kept in a PageCache, so a rescan only reads the
+   files that changed.
+2. Keeps the rules of a vendored Tailwind build whose class selectors only
+   use collected tokens (rules without classes, like the preflight, are
+   kept) and writes them to public/css/tailwind.purged.css. The output is
+   only rewritten when the token set or the vendored build changes.
+3. Runs the 'tailwind_css' pipeline transform, which points links to the
+   CDN build at the purged stylesheet.
+
+The vendored build is not in the repository; download it once with:
+
+    mkdir -p vendor && curl -Lo vendor/tailwind.min.css \\
+        https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css
+
+Pages that load the Tailwind Play CDN script (cdn.tailwindcss.com) are left
+alone: it compiles Tailwind 3 in the browser with a per-page config, so a
+2.2.19 stylesheet is not a drop-in replacement for it.
+"""
+
+import os
+import re
+import glob
+import hashlib
+import argparse
+from page_cache import PageCache, hash_file, files_version
+from css_rules import filter_rules
+
+# --- Configuration ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'public')
+
+# Files whose class tokens are kept, relative to the project root.
+SOURCE_GLOBS = [
+    'public/*.html',
+    'public/js/*.js',
+    'public/js/modules/*.js',
+    # The maintenance scripts hold the header, sidebar and modal templates
+    # they inject into the pages
+    '*.py',
+    'public/*.py',
+]
+VENDORED_TAILWIND = os.path.join(ROOT_DIR, 'vendor', 'tailwind.min.css')
+PURGED_CSS = os.path.join(PUBLIC_DIR, 'css', 'tailwind.purged.css')
+# The link href the pages use for the purged stylesheet.
+PURGED_HREF = 'css/tailwind.purged.css'
+# Links to a full Tailwind build that the purged stylesheet replaces.
+TAILWIND_HREF_RE = re.compile(r'tailwindcss@2\.2\.19/dist/tailwind(?:\.min)?\.css$')
+# Bump this whenever the token extraction changes, so every file is rescanned.
+EXTRACTOR_VERSION = '1'
+# Bump this whenever the <link> rewrite changes, so cached pages are re-checked.
+TRANSFORM_VERSION = '1'
+# --- End Configuration ---
+
+# Tailwind's default content extractor: anything between quotes, angle
+# brackets, backticks and whitespace, not ending in ':'.
+_TOKEN_RE = re.compile(r'''[^<>"'`\s]*[^<>"'`\s:]''')
+# A class in a CSS selector, with Tailwind's escapes (\:, \/, \.) allowed.
+_SELECTOR_CLASS_RE = re.compile(r'\.((?:\\.|[\w-])+)')
+_CSS_ESCAPE_RE = re.compile(r'\\(.)')
+
+def extract_tokens(content):
+    """Returns every class-like token in a file's text."""
+    tokens = set(_TOKEN_RE.findall(content))
+    # class="a b" lists and quoted strings are split on whitespace already;
+    # also split dotted / comma-joined forms like classList.add('a','b')
+    for token in list(tokens):
+        if ',' in token or '.' in token:
+            tokens.update(part for part in re.split(r'[,.()]', token) if part)
+    return tokens
+
+def source_files(root_dir=ROOT_DIR):
+    """Returns the sorted list of files scanned for class tokens."""
+    files = set()
+    for pattern in SOURCE_GLOBS:
+        files.update(glob.glob(os.path.join(root_dir, pattern)))
+    return sorted(files)
+
+def collect_tokens(files, cache=None):
+    """
+    Collects the class tokens of a set of files.
+
+    Args:
+        files (list): Files to scan.
+        cache (PageCache): If given, reuse the tokens recorded for files
+            unchanged since the last scan and record the new ones.
+
+    Returns:
+        tuple: (set of tokens, number of files that were actually read)
+    """
+    tokens = set()
+    scanned = 0
+    for file_path in files:
+        if cache and cache.is_fresh(file_path):
+            tokens.update(cache.get(file_path)['tokens'])
+            continue
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            file_tokens = extract_tokens(f.read())
+        scanned += 1
+        tokens |= file_tokens
+        if cache:
+            cache.record(file_path, tokens=sorted(file_tokens))
+    if cache:
+        cache.save()
+    return tokens, scanned
+
+def selector_classes(selector):
+    """Returns the unescaped class names a CSS selector requires."""
+    # Classes inside :not(...) are excluded, not required
+    selector = re.sub(r':not\([^)]*\)', '', selector)
+    return [_CSS_ESCAPE_RE.sub(r'\1', name) for name in _SELECTOR_CLASS_RE.findall(selector)]
+
+def purge_css(css, used):
+    """
+    Keeps the rules of a stylesheet that can match the used class tokens:
+    a selector is kept if every class it requires is used.
+
+    Returns:
+        str: The purged (minified) stylesheet.
+    """
+    return filter_rules(css, lambda selector: all(name in used for name in selector_classes(selector)))
+
+def build_purged_css(tokens, vendored=VENDORED_TAILWIND, output=PURGED_CSS):
+    """
+    Writes the purged stylesheet unless the tokens and the vendored build
+    are the same as for the existing output.
+
+    Returns:
+        tuple: (True if written, size of the vendored build, size of the output)
+    """
+    digest = hashlib.sha256(hash_file(vendored).encode('ascii'))
+    digest.update('\n'.join(sorted(tokens)).encode('utf-8'))
+    stamp = f'/* tailwind_purge {EXTRACTOR_VERSION} {digest.hexdigest()} */\n'
+
+    if os.path.exists(output):
+        with open(output, 'r', encoding='utf-8') as f:
+            if f.readline() == stamp:
+                return False, os.path.getsize(vendored), os.path.getsize(output)
+
+    with open(vendored, 'r', encoding='utf-8') as f:
+        purged = purge_css(f.read(), tokens)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(stamp + purged + '\n')
+    return True, os.path.getsize(vendored), os.path.getsize(output)
+
+def transform_version():
+    """Returns the pipeline cache version: TRANSFORM_VERSION and the purged stylesheet."""
+    return files_version(TRANSFORM_VERSION, [PURGED_CSS])
+
+def use_purged_tailwind(soup, filename=None, log=print):
+    """
+    Points links to the full Tailwind CDN build at the purged stylesheet.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML document.
+        filename (str): The page's file name, used for log messages.
+        log (callable): Receives progress messages.
+
+    Returns:
+        bool: True if the tree was modified, False otherwise.
+    """
+    if not os.path.exists(PURGED_CSS):
+        return False
+    modified = False
+    for link in soup.find_all('link', href=TAILWIND_HREF_RE):
+        link['href'] = PURGED_HREF
+        modified = True
+    if modified:
+        log(f"Switched {filename} to the purged Tailwind stylesheet")
+    return modified
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a purged Tailwind stylesheet and link it from the pages')
+    parser.add_argument('--tailwind', default=VENDORED_TAILWIND,
+                        help='Vendored full Tailwind build (default: vendor/tailwind.min.css)')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Rescan every file, even if unchanged since the last run')
+    parser.add_argument('--no-pages', action='store_true',
+                        help='Only build the stylesheet, do not rewrite the <link> tags')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.tailwind):
+        print(f"ERROR: Vendored Tailwind build '{args.tailwind}' not found (see the module docstring).")
+        return False
+
+    files = source_files()
+    cache = None if args.no_cache else PageCache('tailwind_purge', EXTRACTOR_VERSION, ROOT_DIR)
+    tokens, scanned = collect_tokens(files, cache)
+    print(f"Class index: {len(tokens)} token(s) from {len(files)} file(s), {scanned} rescanned")
+
+    written, full_size, purged_size = build_purged_css(tokens, args.tailwind)
+    state = 'Wrote' if written else 'Up to date:'
+    print(f"{state} {os.path.relpath(PURGED_CSS, ROOT_DIR)} "
+          f"({full_size / 1024:.0f} KB -> {purged_size / 1024:.0f} KB)")
+
+    if not args.no_pages:
+        from html_pipeline import run_pipeline
+        print()
+        # Pages checked before the stylesheet existed were left alone, so
+        # re-check every page when it has just been written
+        run_pipeline(PUBLIC_DIR, only=['tailwind_css'], workers=args.workers,
+                     use_cache=not (written or args.no_cache))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)